@@ -5,6 +5,8 @@ import port
 
 
 parser = argparse.ArgumentParser()
+parser.add_argument('--profile', nargs='?', const='table', choices=port.logbook.PROFILE_FORMATS,
+                    help="Report time, bytes and retries of every outbound call on exit")
 subparsers = parser.add_subparsers(dest='command')
 
 create_parser = subparsers.add_parser('create')
@@ -20,16 +22,53 @@ update_parser.add_argument('-p', '--port-name', required=True)
 update_parser.add_argument('-c', '--cargo', required=True)
 update_parser.add_argument('cargo_manifest_name')
 
+append_parser = subparsers.add_parser('append')
+append_parser.add_argument('-o', '--ocean', required=True)
+append_parser.add_argument('-s', '--sea', required=True)
+append_parser.add_argument('-p', '--port-name', required=True)
+append_parser.add_argument('-c', '--cargo', required=True)
+append_parser.add_argument('cargo_manifest_name')
+
+remove_parser = subparsers.add_parser('remove')
+remove_parser.add_argument('-o', '--ocean', required=True)
+remove_parser.add_argument('-s', '--sea', required=True)
+remove_parser.add_argument('-p', '--port-name', required=True)
+remove_parser.add_argument('-c', '--cargo', required=True)
+remove_parser.add_argument('cargo_manifest_name')
+
+promote_parser = subparsers.add_parser('promote')
+promote_parser.add_argument('-o', '--ocean', required=True)
+promote_parser.add_argument('-s', '--sea', required=True)
+promote_parser.add_argument('-p', '--port-name', required=True)
+promote_parser.add_argument('-c', '--cargo', required=True, help="Cargo id to promote")
+promote_parser.add_argument('-r', '--replaces', help="Cargo id the promoted cargo takes the place of")
+promote_parser.add_argument('cargo_manifest_name')
+
 args = parser.parse_args()
 
+if args.profile:
+    port.logbook.LOGBOOK.report_at_exit(args.profile)
+
 enfra_port = port.Port(
     args.ocean,
     args.sea,
     args.port_name
 )
 
-if args.command == 'create':
-    enfra_port.create_cargo_manifest(args.cargo_manifest_name)
-elif args.command == 'update':
-    cargo_ids = args.cargo.split(',')
-    enfra_port.update_cargo_mainfest(args.cargo_manifest_name, cargo_ids)
\ No newline at end of file
+try:
+    if args.command == 'create':
+        enfra_port.create_cargo_manifest(args.cargo_manifest_name)
+    elif args.command == 'update':
+        cargo_ids = args.cargo.split(',')
+        enfra_port.update_cargo_mainfest(args.cargo_manifest_name, cargo_ids)
+    elif args.command == 'append':
+        print(enfra_port.append_cargo(args.cargo_manifest_name, args.cargo.split(',')))
+    elif args.command == 'remove':
+        print(enfra_port.remove_cargo(args.cargo_manifest_name, args.cargo.split(',')))
+    elif args.command == 'promote':
+        print(enfra_port.promote_cargo(args.cargo_manifest_name, args.cargo, replaces=args.replaces))
+except port.ferry.ReplicationFailed as e:
+    # the manifest is written, only replicas are behind
+    if e.result is not None and args.command in ('append', 'remove', 'promote'):
+        print(e.result)
+    raise e
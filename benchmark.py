@@ -0,0 +1,552 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+import port
+
+
+# DigitalOcean rejects droplet user_data larger than 64 KiB
+_USER_DATA_LIMIT = 64 * 1024
+
+def _cloud_config_list(user_data: str, section: str) -> list[str]:
+    items = []
+    in_section = False
+    for line in user_data.splitlines():
+        if not line.startswith(" "):
+            in_section = line == f"{section}:"
+        elif in_section and line.startswith("  - "):
+            items.append(line[len("  - "):])
+    return items
+
+# Fleet.CLOUD_CONFIG before the marine radio was stored as a binary: every
+# ship installed a Go toolchain and compiled the radio before its first
+# health check, and its cargo loader listed every cargo id
+_GO_RUN_CLOUD_CONFIG = f"""
+#cloud-config
+packages:
+  - supervisor
+  - golang-go
+write_files:
+  - path: /marine_radio.go
+    content: |
+{{marine_radio}}
+  - path: /etc/supervisor/conf.d/marine_radio.conf
+    content: |
+      [supervisord]
+      environment=GOCACHE="/root/.cache/go-build"
+      [program:marine_radio]
+      command=go run /marine_radio.go
+      autostart=true
+      autorestart=true
+      startsecs=0
+{{cargo_loader_write_file}}
+runcmd:
+  - {port.cargo_loader.CARGO_LOADER_SCRIPT_PATH}
+  - service supervisor start
+  - supervisorctl reread
+  - supervisorctl update
+""".strip()
+
+def _go_run_cloud_config(fleet: port.Fleet) -> str:
+    import textwrap
+
+    with open(port._MARINE_RADIO_FILE_PATH) as marine_radio_file:
+        marine_radio = marine_radio_file.read()
+    cargo_loader_script = port.cargo_loader.render_cargo_loader(fleet.cargo_ocean, fleet.cargo_sea, fleet.port.port_name,
+                                                                fleet.cargo_ids())
+    return _GO_RUN_CLOUD_CONFIG.replace("{marine_radio}", textwrap.indent(marine_radio, "      ")).replace(
+        "{cargo_loader_write_file}", port.cargo_loader.render_cargo_loader_write_file(cargo_loader_script))
+
+def _boot_steps(user_data: str) -> dict:
+    packages = _cloud_config_list(user_data, "packages")
+    supervisor_commands = [
+        line.strip()[len("command="):]
+        for line in user_data.splitlines()
+        if line.strip().startswith("command=")
+    ]
+    return {
+        "user_data_bytes": len(user_data.encode()),
+        "user_data_limit_pct": round(100 * len(user_data.encode()) / _USER_DATA_LIMIT, 2),
+        "packages": packages,
+        "runcmd_steps": len(_cloud_config_list(user_data, "runcmd")),
+        "supervisor_commands": supervisor_commands,
+        "compiles_on_boot": any("golang" in package for package in packages)
+                            or any(command.startswith("go ") for command in supervisor_commands),
+    }
+
+def bench_cloud_config(cargo_count: int) -> dict:
+    """
+    user_data of a fleet whose port's manifest lists cargo_count cargo ids,
+    rendered by a real Fleet in an ocean with a replica, against the go run
+    cloud-config it replaced
+    """
+    synthetic_port = port.Port.__new__(port.Port)
+    synthetic_port.ocean = "nyc3"
+    synthetic_port.sea = "bench"
+    synthetic_port.port_name = "bench"
+    synthetic_port.replicas = [port.ferry.Sea("ams3", "bench-ams3", None)]
+    synthetic_port.cargo_manifests = {"web": [str(uuid.uuid4()) for _ in range(cargo_count)]}
+    fleet = port.Fleet(synthetic_port, "web", {**_e2e_port_org(1)["fleets"]["fleet0"], "ocean": "ams3"})
+
+    # the radio's cargo id stands in, rendering doesn't build it
+    user_data = fleet.user_data(marine_radio_cargo_id=port._marine_radio_source_cargo_id())
+
+    return {
+        "cargo_count": cargo_count,
+        "cargo_sea": f"{fleet.cargo_sea}.{fleet.cargo_ocean}",
+        **_boot_steps(user_data),
+        "go_run": _boot_steps(_go_run_cloud_config(fleet)),
+    }
+
+def bench_removed_boot_steps() -> dict:
+    """
+    What the go run cloud-config made each ship do before its first health
+    check: install the Go toolchain (its size here) and compile the radio
+    with an empty build cache
+    """
+    go_root = subprocess.run(["go", "env", "GOROOT"], capture_output=True, text=True, check=True).stdout.strip()
+    toolchain_bytes = sum(
+        os.path.getsize(os.path.join(directory, file_name))
+        for directory, _, file_names in os.walk(go_root)
+        for file_name in file_names
+        if not os.path.islink(os.path.join(directory, file_name))
+    )
+
+    with tempfile.TemporaryDirectory() as build_directory:
+        started_at = time.perf_counter()
+        subprocess.run(["go", "build", "-o", os.path.join(build_directory, "marine_radio"), port._MARINE_RADIO_FILE_PATH],
+                       check=True,
+                       env={**os.environ, "GOCACHE": os.path.join(build_directory, "go-build")})
+        compile_s = time.perf_counter() - started_at
+
+    return {
+        "go_toolchain_mb": round(toolchain_bytes / 1e6, 1),
+        "go_compile_cold_s": round(compile_s, 2),
+    }
+
+_ENTRY_POINTS = ["port.py", "ams.py", "container_yard.py"]
+
+def bench_import_time(entry_point: str, top: int) -> dict:
+    """
+    Runs entry_point --help (argparse exits right after the imports) under
+    python -X importtime and reports the slowest imports by cumulative time
+    """
+    entry_point_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), entry_point)
+    started_at = time.perf_counter()
+    importtime_res = subprocess.run([sys.executable, "-X", "importtime", entry_point_path, "--help"],
+                                    capture_output=True,
+                                    text=True)
+    wall_time = time.perf_counter() - started_at
+
+    imports = []
+    for line in importtime_res.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, imported_package = line[len("import time:"):].split("|")
+        # nested imports are indented two spaces per level
+        depth = (len(imported_package) - len(imported_package.lstrip()) - 1) // 2
+        imports.append({"package": imported_package.strip(), "depth": depth, "cumulative_ms": int(cumulative_us) / 1000})
+    top_level_imports = [
+        {"package": imported["package"], "cumulative_ms": imported["cumulative_ms"]}
+        for imported in imports
+        if imported["depth"] == 0
+    ]
+
+    return {
+        "entry_point": entry_point,
+        "wall_time_ms": round(wall_time * 1000, 1),
+        "import_time_ms": round(sum(imported["cumulative_ms"] for imported in top_level_imports), 1),
+        "slowest_imports": sorted(top_level_imports, key=lambda imported: imported["cumulative_ms"], reverse=True)[:top],
+    }
+
+def _make_synthetic_directory(directory: str, file_count: int, file_size: int):
+    # half random (incompressible), half repetitive text, like typical build output
+    rng = random.Random(0)
+    for i in range(file_count):
+        with open(os.path.join(directory, f"artifact_{i}"), "wb") as artifact_file:
+            if i % 2:
+                artifact_file.write(rng.randbytes(file_size))
+            else:
+                line = f"{i} {rng.random()} build log line\n".encode()
+                artifact_file.write((line * (file_size // len(line) + 1))[:file_size])
+
+def bench_pack(file_count: int, file_size: int, compression_threads: int) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        _make_synthetic_directory(directory, file_count, file_size)
+        input_bytes = file_count * file_size
+
+        started_at = time.perf_counter()
+        tar_gzip_res = subprocess.run(f"tar -cf - -C {directory} . | gzip -6 | wc -c",
+                                      shell=True, capture_output=True, text=True, check=True)
+        tar_gzip_time = time.perf_counter() - started_at
+
+        started_at = time.perf_counter()
+        with open(os.devnull, "wb") as devnull:
+            packed_bytes = port.stevedore.pack_cargo(directory, devnull, compression_threads=compression_threads)
+        packed_cargo_time = time.perf_counter() - started_at
+
+    return {
+        "input_mb": round(input_bytes / 1e6, 1),
+        "compression_threads": compression_threads,
+        "tar_gzip_s": round(tar_gzip_time, 3),
+        "tar_gzip_mb": round(int(tar_gzip_res.stdout) / 1e6, 1),
+        "packed_cargo_s": round(packed_cargo_time, 3),
+        "packed_cargo_mb": round(packed_bytes / 1e6, 1),
+        "speedup": round(tar_gzip_time / packed_cargo_time, 2),
+    }
+
+def bench_chunked(artifact_size: int, edits: int, edit_size: int) -> dict:
+    """
+    Stores a synthetic artifact, then a copy with a few small edits, whole
+    and chunked, against an in process S3 (moto)
+    """
+    import io
+
+    import boto3
+    from moto import mock_aws
+
+    rng = random.Random(1566)
+    artifact = rng.randbytes(artifact_size)
+    edited = bytearray(artifact)
+    for _ in range(edits):
+        at = rng.randrange(artifact_size)
+        # inserts shift everything after them, which fixed size blocks can't dedup
+        edited[at:at] = rng.randbytes(edit_size)
+
+    with mock_aws():
+        s3_client = boto3.client("s3", region_name="us-east-1")
+        s3_client.create_bucket(Bucket="ports")
+
+        res = {"artifact_mb": round(artifact_size / 1e6, 1), "edits": edits, "edit_size": edit_size}
+        for name in ["whole", "chunked"]:
+            uploaded_bytes = 0
+            started_at = time.perf_counter()
+            for cargo in [artifact, bytes(edited)]:
+                uploaded_bytes = len(cargo)
+                if name == "chunked":
+                    hoist_res = port.chunking.hoist_chunked_cargo(s3_client, io.BytesIO(cargo), "ports", "bench/chunks",
+                                                                  f"bench/{uuid.uuid4()}/chunk_index.json")
+                    uploaded_bytes = hoist_res["uploaded_bytes"]
+                else:
+                    port.crane.hoist_cargo(s3_client, io.BytesIO(cargo), "ports", f"bench/{uuid.uuid4()}/cargo")
+            # the second store is the release, what ships fetch is the same delta
+            res[f"{name}_release_mb"] = round(uploaded_bytes / 1e6, 2)
+            res[f"{name}_s"] = round(time.perf_counter() - started_at, 3)
+    return res
+
+class _FakeHttpResponse():
+    def __init__(self, status_code: int, headers: dict, body: bytes=b""):
+        self.status_code = status_code
+        self.reason = "Too Many Requests" if status_code == 429 else "OK"
+        self.headers = headers
+        self._body = body
+
+    def body(self) -> bytes:
+        return self._body
+
+    def text(self, encoding: str=None) -> str:
+        return self._body.decode()
+
+class _FakePipelineResponse():
+    def __init__(self, http_response: _FakeHttpResponse):
+        self.http_response = http_response
+
+class _FakeOperationGroup():
+    def __init__(self, digital_ocean: "FakeDigitalOcean", group_name: str, resources_key: str, resource_key: str):
+        self.digital_ocean = digital_ocean
+        self.group_name = group_name
+        self.resources_key = resources_key
+        self.resource_key = resource_key
+        self.resources = []
+        # project or tag -> resources assigned to it
+        self.assigned = {}
+
+    def _request(self, operation_name: str) -> dict:
+        # a throttled request raises here, before it changes anything
+        return self.digital_ocean.request(f"{self.group_name}.{operation_name}")
+
+    def _respond(self, headers: dict, deserialized, cls):
+        body = json.dumps(deserialized).encode()
+        return cls(_FakePipelineResponse(_FakeHttpResponse(200, headers, body)), deserialized, headers) if cls else deserialized
+
+    def list(self, per_page: int=20, page: int=1, cls=None, tag_name: str=None, **kwargs):
+        headers = self._request("list")
+        resources = [resource for resource in self.resources if tag_name is None or tag_name in resource.get("tags", [])]
+        pages = {"next": f"?page={page + 1}"} if page * per_page < len(resources) else {}
+        return self._respond(headers, {
+            self.resources_key: resources[(page - 1) * per_page:page * per_page],
+            "links": {"pages": pages},
+            "meta": {"total": len(resources)},
+        }, cls)
+
+    def create(self, body: dict, cls=None):
+        headers = self._request("create")
+        resource = {"id": str(uuid.uuid4()), **body}
+        self.resources.append(resource)
+        return self._respond(headers, {self.resource_key: resource}, cls)
+
+    def update(self, resource_id: str, body: dict, cls=None):
+        headers = self._request("update")
+        for resource in self.resources:
+            if resource["id"] == resource_id:
+                resource.update(body)
+        return self._respond(headers, {self.resource_key: {"id": resource_id, **body}}, cls)
+
+    def delete(self, resource_id: str, cls=None):
+        headers = self._request("delete")
+        self.resources = [resource for resource in self.resources if resource["id"] != resource_id]
+        return self._respond(headers, None, cls)
+
+    def assign_resources(self, project_id: str, body: dict, cls=None):
+        headers = self._request("assign_resources")
+        self.assigned.setdefault(project_id, []).extend(body["resources"])
+        return self._respond(headers, {"resources": body["resources"]}, cls)
+
+    def list_resources(self, project_id: str, per_page: int=20, page: int=1, cls=None):
+        headers = self._request("list_resources")
+        resources = [{"urn": urn} for urn in self.assigned.get(project_id, [])]
+        pages = {"next": f"?page={page + 1}"} if page * per_page < len(resources) else {}
+        return self._respond(headers, {
+            "resources": resources[(page - 1) * per_page:page * per_page],
+            "links": {"pages": pages},
+        }, cls)
+
+class FakeDigitalOcean():
+    """
+    In process stand in for the parts of the DigitalOcean API port uses, with
+    a fixed latency per request, real pagination and a per minute rate limit
+    answered with 429s and ratelimit-* headers like the real one
+    """
+    def __init__(self, latency: float=0.05, requests_per_minute: int=port.governor.DIGITALOCEAN_REQUESTS_PER_MINUTE):
+        self.latency = latency
+        self.requests_per_minute = requests_per_minute
+        self.calls = {}
+        self.throttled = 0
+        self.request_times = []
+        self.lock = threading.Lock()
+        self.projects = _FakeOperationGroup(self, "projects", "projects", "project")
+        self.autoscalepools = _FakeOperationGroup(self, "autoscalepools", "autoscale_pools", "autoscale_pool")
+        self.load_balancers = _FakeOperationGroup(self, "load_balancers", "load_balancers", "load_balancer")
+        self.droplets = _FakeOperationGroup(self, "droplets", "droplets", "droplet")
+        self.snapshots = _FakeOperationGroup(self, "snapshots", "snapshots", "snapshot")
+        self.tags = _FakeOperationGroup(self, "tags", "tags", "tag")
+
+    def request(self, operation: str) -> dict:
+        from azure.core.exceptions import HttpResponseError
+
+        with self.lock:
+            now = time.time()
+            self.request_times = [request_time for request_time in self.request_times if now - request_time < 60]
+            reset_at = int((self.request_times[0] if self.request_times else now) + 60)
+            if len(self.request_times) >= self.requests_per_minute:
+                self.throttled += 1
+                raise HttpResponseError(response=_FakeHttpResponse(429, {
+                    "ratelimit-remaining": "0",
+                    "ratelimit-reset": str(reset_at),
+                    "retry-after": str(max(1, int(reset_at - now))),
+                }))
+            self.request_times.append(now)
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+            remaining = self.requests_per_minute - len(self.request_times)
+        time.sleep(self.latency)
+        return {"ratelimit-remaining": str(remaining), "ratelimit-reset": str(reset_at)}
+
+E2E_METRICS = ["wall_s", "api_calls", "s3_calls", "bytes_sent", "bytes_received", "peak_rss_mb"]
+# differences below these are noise, not regressions
+_E2E_METRIC_SLACK = {"wall_s": 0.05, "api_calls": 0, "s3_calls": 0, "bytes_sent": 1024, "bytes_received": 1024, "peak_rss_mb": 5}
+
+def _e2e_port_org(fleets: int) -> dict:
+    return {
+        "ocean": "nyc3",
+        "sea": "bench",
+        "port_name": "bench",
+        "cargo_manifests": {"web": "$CARGO_IDS"},
+        "fleets": {
+            f"fleet{i}": {
+                "crew": "ubuntu-24-04-x64",
+                "ship_type": "s-1vcpu-1gb",
+                "ssh_key_fingerprint": "00:00:00:00:00:00:00:00:00:00:00:00:00:00:00:00",
+                "min_size": 1,
+                "max_size": 3,
+                "reinforcement_strategy": "cpu:0.6",
+                "gangways": [{"pier_end": {"type": "http", "number": 80}, "ship_end": {"type": "http", "number": 8080}}],
+            }
+            for i in range(fleets)
+        },
+    }
+
+def run_e2e_scenario(scenario: str, params: dict) -> dict:
+    """
+    Runs one scenario against FakeDigitalOcean and moto, meant to run in its
+    own process so peak RSS and caches are the scenario's own
+    """
+    import io
+    import resource
+
+    import boto3
+    from moto import mock_aws
+
+    logbook = port.logbook.LOGBOOK
+    with mock_aws():
+        s3_client = logbook.instrument_s3_client(boto3.client("s3", region_name="us-east-1"))
+        s3_client.create_bucket(Bucket="ports")
+        digital_ocean = FakeDigitalOcean(params.get("latency", 0.05), params.get("requests_per_minute", 250))
+        port.Port.pydo_client = port.GovernedClient(digital_ocean)
+
+        def new_port(**kwargs) -> port.Port:
+            port_org = _e2e_port_org(params.get("fleets", 0))
+            return port.Port(port_org["ocean"], port_org["sea"], port_org["port_name"],
+                             cargo_manifests=port_org["cargo_manifests"],
+                             fleet_orgs=port_org["fleets"],
+                             inventory=port.Inventory(port.Port.pydo_client, cache_file_path=os.devnull),
+                             s3_client=s3_client,
+                             **kwargs)
+
+        if scenario == "redeploy":
+            # only the second, nothing to change, deploy is measured
+            new_port()
+            digital_ocean.calls.clear()
+            logbook.operations.clear()
+
+        started_at = time.perf_counter()
+        if scenario in ["deploy", "redeploy"]:
+            new_port()
+        elif scenario == "store":
+            cargo = random.Random(1566).randbytes(params["artifact_mb"] * 1000 * 1000)
+            new_port().store_cargo(io.BytesIO(cargo), io.BytesIO(b"true\n"), chunked=params.get("chunked", False))
+        elif scenario == "manifests":
+            manifest_port = new_port()
+            for _ in range(params["cargo_count"]):
+                manifest_port.append_cargo("web", [str(uuid.uuid4())])
+            manifest_port.get_cargo_manifest("web")
+        else:
+            raise ValueError(f"Unknown scenario {scenario}")
+        wall_s = time.perf_counter() - started_at
+
+    summary = logbook.summary()
+    return {
+        "scenario": scenario,
+        "params": params,
+        "wall_s": round(wall_s, 3),
+        "api_calls": sum(digital_ocean.calls.values()),
+        "throttled": digital_ocean.throttled,
+        "s3_calls": sum(stats["calls"] for operation, stats in summary.items() if operation.startswith("s3.")),
+        "bytes_sent": sum(stats["bytes_sent"] for stats in summary.values()),
+        "bytes_received": sum(stats["bytes_received"] for stats in summary.values()),
+        # kilobytes on linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+def bench_e2e(scenarios: list[tuple[str, dict]]) -> list[dict]:
+    # go's build cache lives under XDG_CACHE_HOME too, keep using the real one
+    go_cache = subprocess.run(["go", "env", "GOCACHE"], capture_output=True, text=True).stdout.strip()
+    results = []
+    for scenario, params in scenarios:
+        # a scratch cache per scenario keeps moto's cargo out of the real cargo
+        # index and scenarios from seeing each other's
+        with tempfile.TemporaryDirectory() as cache_home:
+            res = subprocess.run([sys.executable, __file__, "e2e-scenario", scenario, json.dumps(params)],
+                                 capture_output=True, text=True, check=True,
+                                 env={**os.environ,
+                                      "XDG_CACHE_HOME": cache_home,
+                                      "GOCACHE": go_cache,
+                                      "DIGITALOCEAN_TOKEN": "bench"})
+        results.append(json.loads(res.stdout.splitlines()[-1]))
+        print(json.dumps(results[-1]))
+    return results
+
+def compare_e2e(results: list[dict], baseline: list[dict], threshold: float) -> list[str]:
+    """
+    Returns a line for every metric of every scenario more than threshold
+    (a fraction) worse than in baseline
+    """
+    baseline_by_key = {(res["scenario"], json.dumps(res["params"], sort_keys=True)): res for res in baseline}
+    regressions = []
+    for res in results:
+        base = baseline_by_key.get((res["scenario"], json.dumps(res["params"], sort_keys=True)))
+        if base is None:
+            continue
+        for metric in E2E_METRICS:
+            if res[metric] > base[metric] * (1 + threshold) and res[metric] - base[metric] > _E2E_METRIC_SLACK[metric]:
+                regressions.append(f"{res['scenario']} {json.dumps(res['params'], sort_keys=True)}: "
+                                   f"{metric} {base[metric]} -> {res[metric]}")
+    return regressions
+
+# importable, tests use FakeDigitalOcean
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='command')
+
+    cloud_config_parser = subparsers.add_parser('cloud-config', help="Render size and boot steps of a fleet's cloud-init")
+    cloud_config_parser.add_argument('-n', '--cargo-count', type=int, nargs='+', default=[1, 10, 100])
+    cloud_config_parser.add_argument('--skip-removed-steps', action='store_true', help="Don't time the Go install and compile ships no longer do, they need go")
+
+    import_time_parser = subparsers.add_parser('import-time', help="Startup import cost of the CLI entry points")
+    import_time_parser.add_argument('--top', type=int, default=5)
+    import_time_parser.add_argument('entry_points', nargs='*', default=_ENTRY_POINTS)
+
+    pack_parser = subparsers.add_parser('pack', help="Directory cargo packing against tar | gzip")
+    pack_parser.add_argument('--files', type=int, default=64)
+    pack_parser.add_argument('--file-size', type=int, default=4 * 1024 * 1024)
+    pack_parser.add_argument('--compression-threads', type=int, default=port.stevedore.DEFAULT_COMPRESSION_THREADS)
+
+    chunked_parser = subparsers.add_parser('chunked', help="Bytes and time of a small release stored whole against chunked")
+    chunked_parser.add_argument('--artifact-size', type=int, default=64 * 1024 * 1024)
+    chunked_parser.add_argument('--edits', type=int, default=3)
+    chunked_parser.add_argument('--edit-size', type=int, default=4096)
+
+    e2e_parser = subparsers.add_parser('e2e', help="Deploy, store and manifest scenarios against a fake DigitalOcean and moto S3")
+    e2e_parser.add_argument('--fleets', type=int, nargs='+', default=[1, 10, 40])
+    e2e_parser.add_argument('--artifact-mb', type=int, nargs='+', default=[1, 16, 64])
+    e2e_parser.add_argument('--cargo-count', type=int, nargs='+', default=[10, 100])
+    e2e_parser.add_argument('--latency', type=float, default=0.05, help="Seconds per fake DigitalOcean request")
+    e2e_parser.add_argument('--requests-per-minute', type=int, default=port.governor.DIGITALOCEAN_REQUESTS_PER_MINUTE)
+    e2e_parser.add_argument('-o', '--output', help="Write results to this JSON file")
+    e2e_parser.add_argument('--baseline', type=argparse.FileType('r'), help="Results file to compare against")
+    e2e_parser.add_argument('--threshold', type=float, default=0.2, help="Fraction worse than baseline that counts as a regression")
+
+    e2e_scenario_parser = subparsers.add_parser('e2e-scenario')
+    e2e_scenario_parser.add_argument('scenario')
+    e2e_scenario_parser.add_argument('params', type=json.loads)
+
+    args = parser.parse_args()
+
+    if args.command == 'cloud-config':
+        if not args.skip_removed_steps:
+            print(json.dumps(bench_removed_boot_steps()))
+        for cargo_count in args.cargo_count:
+            print(json.dumps(bench_cloud_config(cargo_count)))
+    elif args.command == 'pack':
+        print(json.dumps(bench_pack(args.files, args.file_size, args.compression_threads)))
+    elif args.command == 'chunked':
+        print(json.dumps(bench_chunked(args.artifact_size, args.edits, args.edit_size)))
+    elif args.command == 'import-time':
+        for entry_point in args.entry_points:
+            print(json.dumps(bench_import_time(entry_point, args.top)))
+    elif args.command == 'e2e':
+        api = {"latency": args.latency, "requests_per_minute": args.requests_per_minute}
+        scenarios = [(scenario, {**api, "fleets": fleets}) for scenario in ["deploy", "redeploy"] for fleets in args.fleets]
+        scenarios += [("store", {**api, "artifact_mb": artifact_mb, "chunked": chunked})
+                      for artifact_mb in args.artifact_mb for chunked in [False, True]]
+        scenarios += [("manifests", {**api, "cargo_count": cargo_count}) for cargo_count in args.cargo_count]
+        results = bench_e2e(scenarios)
+
+        if args.output:
+            with open(args.output, "w") as output_file:
+                json.dump(results, output_file, indent=2)
+        if args.baseline:
+            regressions = compare_e2e(results, json.load(args.baseline), args.threshold)
+            for regression in regressions:
+                print(f"REGRESSION {regression}")
+            if regressions:
+                sys.exit(1)
+            print("No regressions")
+    elif args.command == 'e2e-scenario':
+        print(json.dumps(run_e2e_scenario(args.scenario, args.params)))
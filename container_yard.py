@@ -1,12 +1,14 @@
 import argparse
-import io
+import contextlib
 import os
-import uuid
+import tempfile
 
 import port
 
 
 parser = argparse.ArgumentParser()
+parser.add_argument('--profile', nargs='?', const='table', choices=port.logbook.PROFILE_FORMATS,
+                    help="Report time, bytes and retries of every outbound call on exit")
 
 subparsers = parser.add_subparsers(dest='command')
 
@@ -24,25 +26,79 @@ store_parser.add_argument('-s', '--sea', required=True)
 store_parser.add_argument('-p', '--port-name', required=True)
 store_parser.add_argument('-c', '--cargo', required=True, type=file_path_or_dir_path_arg_type)
 store_parser.add_argument('-k', '--pad-lock-key', required=True, type=argparse.FileType('rb'), help="Script on how to unlock cargo")
+store_parser.add_argument('--part-size', type=int, default=port.crane.DEFAULT_PART_SIZE, help="Bytes per multipart upload part")
+store_parser.add_argument('--concurrency', type=int, default=port.crane.DEFAULT_CONCURRENCY, help="Parts uploaded at once")
+store_parser.add_argument('--content-addressed', action='store_true', help="Use a hash of the cargo as its id and skip cargo already in the yard")
+store_parser.add_argument('--chunked', action='store_true', help="Store as content defined chunks, uploading only chunks not already in the yard. "
+                                                                 "See benchmark.py chunked")
+store_parser.add_argument('--warm-cdn', action='store_true', help="Fetch the stored cargo through the CDN so scale outs hit its cache")
+store_parser.add_argument('--compression-threads', type=int, default=port.stevedore.DEFAULT_COMPRESSION_THREADS, help="Threads compressing directory cargo")
+
+gc_parser = subparsers.add_parser('gc', help="Delete cargo no cargo manifest references")
+gc_parser.add_argument('-o', '--ocean', required=True)
+gc_parser.add_argument('-s', '--sea', required=True)
+gc_parser.add_argument('-p', '--port-name', required=True)
+gc_parser.add_argument('--grace-period', type=float, default=port.scrapyard.DEFAULT_GRACE_PERIOD / 3600, help="Hours cargo is kept after it was stored")
+gc_parser.add_argument('--keep-last', type=int, default=port.scrapyard.DEFAULT_KEEP_LAST, help="Most recently stored cargo always kept")
+gc_parser.add_argument('--dry-run', action='store_true', help="Report what would be deleted without deleting it")
 
 args = parser.parse_args()
 
+if args.profile:
+    port.logbook.LOGBOOK.report_at_exit(args.profile)
+
 if args.command == 'store':
-    cargo_id = str(uuid.uuid4())
-
-    if args.cargo["type"] == "file":
-        enfra_port = port.Port(
-            args.ocean,
-            args.sea,
-            args.port_name
-        )
-
-        cargo_file_path = args.cargo["file_path"]
-        with open(cargo_file_path, "rb") as cargo_file:
-            enfra_port.store_cargo(
-                cargo_file_path,
-                cargo_file,
-                args.pad_lock_key
+    enfra_port = port.Port(
+        args.ocean,
+        args.sea,
+        args.port_name
+    )
+
+    with contextlib.ExitStack() as cargo_stack:
+        if args.cargo["type"] == "file":
+            cargo = cargo_stack.enter_context(open(args.cargo["file_path"], "rb"))
+        elif args.content_addressed:
+            # hashing needs seekable cargo, so the packed directory is spooled
+            # to a temporary file, packing is deterministic so the id only
+            # changes when the directory does
+            cargo = cargo_stack.enter_context(tempfile.TemporaryFile())
+            port.stevedore.pack_cargo(args.cargo["directory"],
+                                      cargo,
+                                      compression_threads=args.compression_threads)
+            cargo.seek(0)
+        else:
+            # packed straight into the upload, a tar.gz the pad lock key can unpack with tar -xzf cargo
+            cargo = cargo_stack.enter_context(port.stevedore.PackedCargo(args.cargo["directory"],
+                                                                         compression_threads=args.compression_threads))
+
+        try:
+            cargo_id = enfra_port.store_cargo(
+                cargo,
+                args.pad_lock_key,
+                part_size=args.part_size,
+                concurrency=args.concurrency,
+                content_addressed=args.content_addressed,
+                cargo_index=port.CargoIndex() if args.content_addressed else None,
+                chunked=args.chunked,
+                warm_cdn=args.warm_cdn
             )
-    elif args.cargo["type"] == "directory":
-        raise NotImplementedError("Haven't setup load directory as cargo")
\ No newline at end of file
+        except port.ferry.ReplicationFailed as e:
+            # the cargo is stored, only replicas are behind, storing it again would duplicate it
+            print(e.result)
+            raise e
+        print(cargo_id)
+elif args.command == 'gc':
+    enfra_port = port.Port(
+        args.ocean,
+        args.sea,
+        args.port_name
+    )
+    collection = enfra_port.collect_garbage(grace_period=args.grace_period * 3600,
+                                            keep_last=args.keep_last,
+                                            dry_run=args.dry_run,
+                                            cargo_index=port.CargoIndex())
+    verb = "Would delete" if args.dry_run else "Deleted"
+    print(f"{verb} {len(collection['cargo_ids'])} cargo and {len(collection['chunks'])} chunks, "
+          f"{len(collection['keys'])} objects, reclaiming {collection['bytes'] / 1e6:.1f} MB")
+    for cargo_id in collection["cargo_ids"]:
+        print(f"- cargo {cargo_id}")
\ No newline at end of file
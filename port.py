@@ -5,6 +5,8 @@ import port
 
 
 parser = argparse.ArgumentParser()
+parser.add_argument('--profile', nargs='?', const='table', choices=port.logbook.PROFILE_FORMATS,
+                    help="Report time, bytes and retries of every outbound call on exit")
 subparsers = parser.add_subparsers(dest='command')
 
 create_parser = subparsers.add_parser('create')
@@ -12,6 +14,33 @@ create_parser.add_argument('-o', '--ocean', required=True)
 create_parser.add_argument('-s', '--sea', required=True)
 create_parser.add_argument('port_name')
 
+deploy_parser = subparsers.add_parser('deploy')
+deploy_parser.add_argument('--plan', action='store_true', help="Print the changes without making them")
+deploy_parser.add_argument('--prune', action='store_true', help="Delete fleets no longer in the port org")
+deploy_parser.add_argument('-j', '--concurrency', type=int, default=port.Port.DEFAULT_FLEET_CONCURRENCY)
+deploy_parser.add_argument('port_org', type=argparse.FileType('r'))
+
+rollout_parser = subparsers.add_parser('rollout', help="Deploy, then load the new cargo onto running ships in place")
+rollout_parser.add_argument('-f', '--fleet', action='append', help="Fleet to roll out, every fleet by default")
+rollout_parser.add_argument('-b', '--batch-size', type=int, default=port.rollout.DEFAULT_BATCH_SIZE, help="Ships rolled at once")
+rollout_parser.add_argument('--drain-seconds', type=float, default=port.rollout.DEFAULT_DRAIN_SECONDS)
+rollout_parser.add_argument('--health-timeout', type=float, default=port.rollout.DEFAULT_HEALTH_TIMEOUT)
+rollout_parser.add_argument('port_org', type=argparse.FileType('r'))
+
+simulate_parser = subparsers.add_parser('simulate', help="Replay a request rate trace against a fleet's autoscale pool offline")
+simulate_parser.add_argument('-f', '--fleet', required=True)
+simulate_parser.add_argument('--strategy', action='append', help="Reinforcement strategy to try, the fleet's by default")
+simulate_parser.add_argument('--trace', type=argparse.FileType('r'), help="CSV of <seconds>,<requests per second>, a synthetic day by default")
+simulate_parser.add_argument('--base-rate', type=float, default=200, help="Synthetic night time requests per second")
+simulate_parser.add_argument('--peak-rate', type=float, default=1000, help="Synthetic mid day requests per second")
+simulate_parser.add_argument('--spikes', type=int, default=3)
+simulate_parser.add_argument('--spike-rate', type=float, default=2000)
+simulate_parser.add_argument('--ship-capacity', type=float, default=port.sea_trials.DEFAULT_SHIP_CAPACITY, help="Requests per second a ship serves at full CPU")
+simulate_parser.add_argument('--idle-memory', type=float, default=port.sea_trials.DEFAULT_IDLE_MEMORY_UTILIZATION)
+simulate_parser.add_argument('--boot-seconds', type=float, default=port.sea_trials.DEFAULT_DROPLET_BOOT_SECONDS)
+simulate_parser.add_argument('--cargo-loading-seconds', type=float, default=0, help="cloud-init cargo loading time, about 0 for baked fleets")
+simulate_parser.add_argument('port_org', type=argparse.FileType('r'))
+
 configure_parser = subparsers.add_parser('configure')
 configure_parser.add_argument('-r', '--region', required=True)
 configure_parser.add_argument('-s', '--sea', required=True)
@@ -26,6 +55,9 @@ configure_add_ship_parser.add_argument('fleet')
 
 args = parser.parse_args()
 
+if args.profile:
+    port.logbook.LOGBOOK.report_at_exit(args.profile)
+
 if args.command == 'create':
     try:
         port.Port(args.ocean, args.sea, args.port_name)
@@ -43,6 +75,44 @@ if args.command == 'create':
 
         port.Port.construct_port(args.port_name, s3_client, pydo_client)
         print("Port created")
+elif args.command == 'deploy':
+    port.Port.load_from_port_org(json.load(args.port_org),
+                                 fleet_concurrency=args.concurrency,
+                                 plan_only=args.plan,
+                                 prune=args.prune)
+elif args.command == 'rollout':
+    # deploy first so ships the autoscale pools create from now on load the same cargo
+    enfra_port = port.Port.load_from_port_org(json.load(args.port_org))
+    for fleet_name in args.fleet or enfra_port.fleets:
+        print(f"Rolling out fleet {fleet_name}")
+        enfra_port.fleets[fleet_name].roll_out(batch_size=args.batch_size,
+                                               drain_seconds=args.drain_seconds,
+                                               health_timeout=args.health_timeout)
+elif args.command == 'simulate':
+    # offline, only the port org is read
+    fleet_org = json.load(args.port_org)["fleets"][args.fleet]
+    if args.trace:
+        trace = port.sea_trials.load_trace(args.trace)
+    else:
+        trace = port.sea_trials.synthetic_trace(base_rate=args.base_rate,
+                                                peak_rate=args.peak_rate,
+                                                spikes=args.spikes,
+                                                spike_rate=args.spike_rate)
+    ship = port.sea_trials.Ship(capacity=args.ship_capacity,
+                                idle_memory_utilization=args.idle_memory,
+                                boot_seconds=args.boot_seconds,
+                                cargo_loading_seconds=args.cargo_loading_seconds)
+
+    print(f"{'strategy':<24} {'p50 queue s':>11} {'p99 queue s':>11} {'over capacity s':>15} {'droplet hours':>13} {'most ships':>10}")
+    for strategy in args.strategy or [fleet_org["reinforcement_strategy"]]:
+        pool_config = {
+            "min_instances": fleet_org["min_size"],
+            "max_instances": fleet_org["max_size"],
+            **port.reinforcement_strategy_to_do_config(strategy)
+        }
+        res = port.sea_trials.simulate(pool_config, trace, ship)
+        print(f"{strategy:<24} {res['p50_queueing_s']:>11} {res['p99_queueing_s']:>11} {res['over_capacity_s']:>15} "
+              f"{res['droplet_hours']:>13} {res['most_ships']:>10}")
 elif args.command == 'configure':
     if getattr(args, 'configure-action') == 'add-fleet':
         pydo_client = utils.create_pydo_client()
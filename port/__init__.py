@@ -1,22 +1,54 @@
+from __future__ import annotations
+
+import hashlib
 import io
 import json
 import os
-import subprocess
-import textwrap
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
 import uuid
+from typing import TYPE_CHECKING
 
-import pydo
 from botocore.exceptions import ClientError
 
-from port import utils
+from port import cargo_loader, cdn, chunking, crane, ferry, logbook, rollout, scrapyard, sea_trials, shipyard, stevedore, utils
+from port.cargo_index import CargoIndex
+from port.governor import GovernedClient
+from port.inventory import Inventory, list_all
+from port.reconcile import Change, Plan, differences
+
+if TYPE_CHECKING:
+    import boto3
+    import pydo
 
 
 _DIGITALOCEAN_ENDPOINT_URL_FORMAT = "https://{sea}.{ocean}.digitaloceanspaces.com"
+# on the port's autoscale pools (their droplet template) and baked snapshots, prune only deletes what has it
+_PORT_TAG_FORMAT = "port:{port_name}"
+
+# (sea, ocean, manifest key) -> (ETag, cargo ids), shared by every Port in the process
+_cargo_manifest_cache = {}
+_cargo_manifest_cache_lock = threading.Lock()
+
+def _create_s3_client(ocean: str, sea: str, port_authority_access_key: dict=None) -> boto3.client:
+    endpoint_url = _DIGITALOCEAN_ENDPOINT_URL_FORMAT.format(ocean=ocean, sea=sea)
+    if port_authority_access_key == None:
+        return utils.create_s3_client_from_dot_env(ocean, endpoint_url)
+    return utils.create_s3_client(ocean,
+                                  endpoint_url,
+                                  port_authority_access_key["key_id"],
+                                  port_authority_access_key["key_secret"])
 
 class Port():
-    pydo_client: pydo.Client = utils.create_pydo_client()
+    # built on first use so importing port doesn't need DigitalOcean credentials
+    pydo_client: pydo.Client = utils.LazyClient(lambda: GovernedClient(utils.create_pydo_client()))
 
-    CARGO_LOADING_TEMPLATE = "curl https://{sea}.{ocean}.cdn.digitaloceanspaces.com/ports/{port}/container_yard/{cargo_id} -o /cargo_bay/{cargo_id}"
+    DEFAULT_FLEET_CONCURRENCY = 4
+    DEFAULT_MANIFEST_CONFLICT_RETRIES = 5
 
     def __init__(self,
                  ocean: str, # region name
@@ -24,45 +56,72 @@ class Port():
                  port_name: str,
                  port_authority_access_key: dict=None,
                  cargo_manifests: dict={},
-                 fleet_orgs: dict={}):
+                 fleet_orgs: dict={},
+                 inventory: Inventory=None,
+                 fleet_concurrency: int=DEFAULT_FLEET_CONCURRENCY,
+                 plan_only: bool=False,
+                 prune: bool=False,
+                 s3_client: boto3.client=None,
+                 replicas: list[dict]=None,
+                 replica_s3_clients: dict={}):
+        """
+        Plans the changes needed for the port org's desired state (see
+        reconcile) and applies them unless plan_only, in which case the plan
+        is printed and nothing is changed. With prune, fleets removed from the
+        port org are deleted.
+
+        replicas are {"ocean", "sea"} of Spaces in other oceans that stored
+        cargo and cargo manifests are copied to, fleets in those oceans load
+        from them. They're stored with the port, without replicas the ones
+        it was last deployed with are used. replica_s3_clients overrides
+        their S3 clients by ocean.
+        """
         self.ocean = ocean
         self.sea = sea
         self.port_name = port_name
+        self.port_tag = _PORT_TAG_FORMAT.format(port_name=port_name)
 
-        if port_authority_access_key == None:
-            self.s3_client = utils.create_s3_client_from_dot_env(
-                ocean,
-                _DIGITALOCEAN_ENDPOINT_URL_FORMAT.format(
-                    ocean=ocean,
-                    sea=sea
-                )
-            )
+        if s3_client is not None:
+            self.s3_client = s3_client
         else:
-            self.s3_client = utils.create_s3_client(
-                ocean,
-                _DIGITALOCEAN_ENDPOINT_URL_FORMAT.format(
-                    ocean=ocean,
-                    sea=sea
-                ),
-                port_authority_access_key["key_id"],
-                port_authority_access_key["key_secret"]
-            )
+            self.s3_client = _create_s3_client(ocean, sea, port_authority_access_key)
+
+        stored_replicas = self.get_replicas()
+        if replicas is None:
+            replicas = stored_replicas
+        replicas = [{"ocean": replica["ocean"], "sea": replica["sea"]} for replica in replicas]
+        self.replicas = [
+            ferry.Sea(replica["ocean"],
+                          replica["sea"],
+                          replica_s3_clients.get(replica["ocean"])
+                          or _create_s3_client(replica["ocean"], replica["sea"], port_authority_access_key))
+            for replica in replicas
+        ]
+
+        if inventory is None:
+            utils.load_dot_env()
+            inventory = Inventory(Port.pydo_client, ttl=float(os.environ.get("PORT_INVENTORY_TTL") or 0))
+        # shared with every fleet so each resource type is only listed once per run
+        self.inventory = inventory
 
-        pl_res = Port.pydo_client.projects.list()
-        projects_by_name = [project for project in pl_res["projects"] if project["name"] == port_name]
+        self.marine_radio_cargo_id = None
+        self.marine_radio_lock = threading.Lock()
+
+        changes = []
+
+        projects_by_name = self.inventory.named("projects", port_name)
         if len(projects_by_name) == 0:
-            project_create_res = Port.pydo_client.projects.create(
-                body={
-                    "name": port_name,
-                    "purpose": "Service or API",
-                }
-            )
-            self.project = project_create_res["project"]
+            self.project = None
+            changes.append(Change("create", "projects", port_name, self.create_project))
         elif len(projects_by_name) == 1:
             self.project = projects_by_name[0]
         elif len(projects_by_name) > 1:
             raise RuntimeError(f"Multiple projects with name: {port_name}")
 
+        # storing cargo and changing manifests later copy to the replicas stored here
+        if replicas != stored_replicas:
+            changes.append(Change("update", "replicas", port_name, lambda: self.update_replicas(replicas)))
+
         self.cargo_manifests = {}
         for cargo_manifest_name in cargo_manifests:
             cargo_ids = cargo_manifests[cargo_manifest_name]
@@ -70,16 +129,114 @@ class Port():
                 try:
                     self.cargo_manifests[cargo_manifest_name] = self.get_cargo_manifest(cargo_manifest_name)
                 except LookupError:
-                    self.update_cargo_mainfest(cargo_manifest_name, [])
                     self.cargo_manifests[cargo_manifest_name] = []
+                    changes.append(Change("create", "cargo_manifests", cargo_manifest_name,
+                                          lambda cargo_manifest_name=cargo_manifest_name: self.update_cargo_mainfest(cargo_manifest_name, [])))
             else:
                 # TODO: handle this path
                 raise NotImplementedError("Currently not supporting cargo manifests with hard coded cargo ids in port org json")
 
         self.fleets = {}
         for fleet_name in fleet_orgs:
-            fleet_org = fleet_orgs[fleet_name]
-            self.fleets[fleet_name] = Fleet(self, fleet_name, fleet_org)
+            self.fleets[fleet_name] = Fleet(self, fleet_name, fleet_orgs[fleet_name])
+            changes += self.fleets[fleet_name].plan_changes()
+
+        if prune:
+            changes += self.plan_prune()
+
+        self.plan = Plan(changes)
+        if plan_only:
+            print(self.plan)
+        elif self.plan:
+            self.plan.apply(fleet_concurrency)
+
+    def create_project(self):
+        project_create_res = Port.pydo_client.projects.create(
+            body={
+                "name": self.port_name,
+                "purpose": "Service or API",
+            }
+        )
+        self.project = project_create_res["project"]
+        self.inventory.add("projects", self.project)
+
+    def plan_prune(self) -> list[Change]:
+        """
+        Plans deleting this port's autoscale pools and load balancers whose
+        fleet is no longer in the port org, and baked snapshots no fleet boots
+        from anymore. Names alone don't tell ports apart (port web's fleet
+        api-x and port web-api's fleet x are both web-api-x), so only
+        resources provably the port's are deleted: pools and snapshots with
+        the port tag and load balancers in the port's project.
+        """
+        fleet_call_signs = {fleet.fleet_call_sign for fleet in self.fleets.values()}
+        changes = []
+
+        for resources in self.inventory.by_name("autoscale_pools").values():
+            for resource in resources:
+                if self.port_tag in resource.get("droplet_template", {}).get("tags", []) and resource["name"] not in fleet_call_signs:
+                    changes.append(Change("delete", "autoscale_pools", resource["name"],
+                                          lambda resource=resource: Port.pydo_client.autoscalepools.delete(resource["id"])))
+
+        # every load balancer the port creates is assigned to its project
+        project_urns = set()
+        if self.project is not None:
+            project_urns = {
+                project_resource["urn"]
+                for project_resource in list_all(Port.pydo_client, "project_resources", self.project["id"])
+            }
+        for resources in self.inventory.by_name("load_balancers").values():
+            for resource in resources:
+                if f"do:loadbalancer:{resource['id']}" in project_urns and resource["name"] not in fleet_call_signs:
+                    changes.append(Change("delete", "load_balancers", resource["name"],
+                                          lambda resource=resource: Port.pydo_client.load_balancers.delete(resource["id"])))
+
+        # baked snapshots are named <fleet call sign>-<bake key>, only the current ones are kept
+        snapshot_names = {fleet.snapshot_name for fleet in self.fleets.values()}
+        baked_snapshot_name_pattern = re.compile(r".+-[0-9a-f]{16}")
+        for snapshots in self.inventory.by_name("snapshots").values():
+            for snapshot in snapshots:
+                if (self.port_tag in (snapshot.get("tags") or [])
+                        and baked_snapshot_name_pattern.fullmatch(snapshot["name"])
+                        and snapshot["name"] not in snapshot_names):
+                    changes.append(Change("delete", "snapshots", snapshot["name"],
+                                          lambda snapshot=snapshot: Port.pydo_client.snapshots.delete(snapshot["id"]),
+                                          # only once pools have moved on to their new snapshot
+                                          depends_on=[("autoscale_pools", fleet_call_sign) for fleet_call_sign in fleet_call_signs]))
+        return changes
+
+    def tag_resources(self, resources: list[dict]):
+        """
+        Tags resources ({"resource_id", "resource_type"}) with the port tag
+        """
+        from azure.core.exceptions import HttpResponseError
+
+        try:
+            Port.pydo_client.tags.create(body={"name": self.port_tag})
+        except HttpResponseError as e:
+            # the tag is only made once per account
+            if e.status_code not in (409, 422):
+                raise e
+        Port.pydo_client.tags.assign_resources(self.port_tag, body={"resources": resources})
+
+    def get_replicas(self) -> list[dict]:
+        """
+        Replicas ({"ocean", "sea"}) the port was last deployed with
+        """
+        try:
+            replicas_json_s3_res = self.s3_client.get_object(Bucket='ports',
+                                                             Key=f'{self.port_name}/replicas.json')
+            return json.load(replicas_json_s3_res['Body'])
+        except ClientError as e:
+            if e.response['Error']['Code'] == "NoSuchKey":
+                return []
+            raise e
+
+    def update_replicas(self, replicas: list[dict]):
+        self.s3_client.put_object(Bucket='ports',
+                                  Key=f'{self.port_name}/replicas.json',
+                                  Body=json.dumps(replicas),
+                                  ContentType="application/json")
 
     def get_port_authority_config(self,
                                   port_name: str) -> dict:
@@ -100,47 +257,437 @@ class Port():
 
     def store_cargo(self,
                     cargo: io.BufferedIOBase,
-                    pad_lock_key_file: io.BufferedIOBase) -> str:
+                    pad_lock_key_file: io.BufferedIOBase,
+                    part_size: int=crane.DEFAULT_PART_SIZE,
+                    concurrency: int=crane.DEFAULT_CONCURRENCY,
+                    content_addressed: bool=False,
+                    cargo_index: CargoIndex=None,
+                    chunked: bool=False,
+                    warm_cdn: bool=False) -> str:
         """
+        Streams cargo into the container yard, see crane.hoist_cargo. Every
+        object is written once under its cargo id (or chunk hash) with
+        immutable cache headers, so the CDN can serve it from its edges.
+        Compressible seekable cargo also gets a gzipped variant ships load
+        instead. With warm_cdn the objects ships load are fetched through the
+        CDN once stored.
+
+        With chunked the cargo is stored as content defined chunks shared with
+        all other chunked cargo in the yard, see chunking.hoist_chunked_cargo.
+        Only chunks the yard doesn't have are uploaded and ships only fetch
+        chunks they don't have.
+
+        With content_addressed the cargo id is a hash of the cargo and pad lock
+        key (cargo must be seekable). Cargo already in the yard, either in the
+        local cargo_index or found with cargo_exists, isn't uploaded again.
+
+        Stored cargo is copied to every replica before returning, see
+        replicate_cargo. If a replica fails the cargo is still stored, the
+        raised ferry.ReplicationFailed has its cargo id as result.
+
         Returns cargo id
         """
-        cargo_id = str(uuid.uuid4())
+        if not content_addressed:
+            cargo_id = str(uuid.uuid4())
+        else:
+            pad_lock_key = pad_lock_key_file.read()
+            pad_lock_key_file = io.BytesIO(pad_lock_key)
+            cargo_id = crane.weigh_cargo(cargo, pad_lock_key)
 
-        self.s3_client.put_object(Body=cargo.read(),
-                                  Bucket=f'ports',
-                                  Key=f'{self.port_name}/container_yard/{cargo_id}/cargo')
+            yard = f"{self.sea}.{self.ocean}/{self.port_name}"
+            if cargo_index is not None and (yard, cargo_id) in cargo_index:
+                self.replicate_cargo(cargo_id, cargo_index=cargo_index)
+                return cargo_id
+            stored_at = self.cargo_stored_at(cargo_id)
+            if stored_at is not None:
+                if cargo_index is not None:
+                    cargo_index.add(yard, cargo_id, stored_at)
+                self.replicate_cargo(cargo_id, cargo_index=cargo_index)
+                return cargo_id
 
+        if chunked:
+            hoist_res = chunking.hoist_chunked_cargo(
+                self.s3_client,
+                cargo,
+                'ports',
+                f'{self.port_name}/container_yard/{cargo_loader.CHUNK_DIRECTORY}',
+                f'{self.port_name}/container_yard/{cargo_id}/{chunking.CHUNK_INDEX_FILE_NAME}',
+                concurrency=concurrency,
+                chunk_put_kwargs=cdn.yard_object_headers(cargo_loader.CHUNK_DIRECTORY),
+                chunk_index_put_kwargs=cdn.yard_object_headers(chunking.CHUNK_INDEX_FILE_NAME)
+            )
+            # paths in the container yard
+            loaded_paths = [f"{cargo_id}/{chunking.CHUNK_INDEX_FILE_NAME}"] + [
+                f"{cargo_loader.CHUNK_DIRECTORY}/{chunk['sha256']}" for chunk in hoist_res["chunks"]
+            ]
+            stored_paths = list(loaded_paths)
+        else:
+            precompress = cargo.seekable() and cdn.is_compressible(cargo)
+            hoist_res = crane.hoist_cargo(self.s3_client,
+                                          cargo,
+                                          'ports',
+                                          f'{self.port_name}/container_yard/{cargo_id}/cargo',
+                                          part_size=part_size,
+                                          concurrency=concurrency,
+                                          **cdn.yard_object_headers("cargo"))
+            loaded_paths = [f"{cargo_id}/cargo"]
+            stored_paths = list(loaded_paths)
+            if precompress:
+                cargo.seek(0)
+                with cdn.GzipCompressedCargo(cargo) as compressed_cargo:
+                    crane.hoist_cargo(self.s3_client,
+                                      compressed_cargo,
+                                      'ports',
+                                      f'{self.port_name}/container_yard/{cargo_id}/{cdn.PRECOMPRESSED_CARGO_FILE_NAME}',
+                                      part_size=part_size,
+                                      concurrency=concurrency,
+                                      **cdn.yard_object_headers(cdn.PRECOMPRESSED_CARGO_FILE_NAME))
+                loaded_paths = [f"{cargo_id}/{cdn.PRECOMPRESSED_CARGO_FILE_NAME}"]
+                stored_paths += loaded_paths
+
+        # sha256sum -c format, checked by the cargo loader on each ship
+        self.s3_client.put_object(Body=f"{hoist_res['sha256']}  cargo\n",
+                                  Bucket='ports',
+                                  Key=f'{self.port_name}/container_yard/{cargo_id}/cargo.sha256',
+                                  **cdn.yard_object_headers("cargo.sha256"))
+
+        # written last, cargo_exists takes it to mean the rest of the cargo is in the yard
         self.s3_client.put_object(Body=pad_lock_key_file.read(),
                                   Bucket='ports',
-                                  Key=f'{self.port_name}/container_yard/{cargo_id}/pad_lock_key.sh')
+                                  Key=f'{self.port_name}/container_yard/{cargo_id}/pad_lock_key.sh',
+                                  **cdn.yard_object_headers("pad_lock_key.sh"))
+
+        if content_addressed and cargo_index is not None:
+            cargo_index.add(yard, cargo_id)
+
+        self.replicate_cargo(cargo_id, [
+            [f"{self.port_name}/container_yard/{path}" for path in dict.fromkeys(stored_paths + [f"{cargo_id}/cargo.sha256"])],
+            [f"{self.port_name}/container_yard/{cargo_id}/pad_lock_key.sh"]
+        ], cargo_index=cargo_index if content_addressed else None)
+
+        if warm_cdn:
+            cargo_yard_url = cargo_loader.CARGO_YARD_CDN_URL_FORMAT.format(sea=self.sea, ocean=self.ocean, port=self.port_name)
+            urls = [
+                f"{cargo_yard_url}/{path}"
+                for path in [f"{cargo_id}/cargo.sha256", f"{cargo_id}/pad_lock_key.sh"] + loaded_paths
+            ]
+            cold_urls = [url for url, status in cdn.warm_up(urls).items() if status != 200]
+            if cold_urls:
+                print(f"CDN warm-up failed for {len(cold_urls)} of {len(urls)} objects, first: {cold_urls[0]}", file=sys.stderr)
 
         return cargo_id
 
+    def stow_marine_radio(self, cargo_index: CargoIndex=None) -> str:
+        """
+        Builds marine_radio.go once locally and stores the binary as content
+        addressed cargo, so ships fetch it instead of compiling it on boot.
+        Its pad lock key installs it to /usr/local/bin/marine_radio.
+
+        Returns cargo id
+        """
+        with self.marine_radio_lock:
+            if self.marine_radio_cargo_id is None:
+                self._build_and_store_marine_radio(cargo_index)
+
+        return self.marine_radio_cargo_id
+
+    def _build_marine_radio(self, build_dir: str) -> str:
+        marine_radio_binary_path = os.path.join(build_dir, "marine_radio")
+        utils.build_static_go_binary(_MARINE_RADIO_FILE_PATH, marine_radio_binary_path)
+        return marine_radio_binary_path
+
+    def _build_and_store_marine_radio(self, cargo_index: CargoIndex=None):
+        with tempfile.TemporaryDirectory() as build_dir:
+            with open(self._build_marine_radio(build_dir), "rb") as marine_radio_binary:
+                self.marine_radio_cargo_id = self.store_cargo(marine_radio_binary,
+                                                              io.BytesIO(_MARINE_RADIO_PAD_LOCK_KEY),
+                                                              content_addressed=True,
+                                                              cargo_index=cargo_index)
+
     def cargo_exists(self, cargo_id: str):
+        return self.cargo_stored_at(cargo_id) is not None
+
+    def cargo_stored_at(self, cargo_id: str) -> float:
+        """
+        When cargo was stored (unix time), None if it isn't in the yard
+        """
+        # pad_lock_key.sh is stored after the cargo so its presence means the cargo is complete
         try:
-            self.s3_client.head_object(Bucket='enfra',
-                                       Key=f'ports/{self.port_name}/container_yard/{cargo_id}/pad_lock_key.sh')
-            return True
+            head_res = self.s3_client.head_object(Bucket='ports',
+                                                  Key=f'{self.port_name}/container_yard/{cargo_id}/pad_lock_key.sh')
+            return head_res["LastModified"].timestamp()
         except ClientError as e:
             if e.response['Error']['Code'] == "404":
-                return False
+                return None
             raise e
 
+    def nearest_sea(self, ocean: str) -> tuple[str, str]:
+        """
+        (ocean, sea) ships in ocean load cargo from, the port's replica there
+        if it has one, otherwise its own Spaces
+        """
+        for replica in self.replicas:
+            if replica.ocean == ocean:
+                return replica.ocean, replica.sea
+        return self.ocean, self.sea
+
+    def cargo_keys(self, cargo_id: str) -> list[list[str]]:
+        """
+        Keys of stored cargo in the order they have to be written,
+        [[objects and chunks it loads], [pad_lock_key.sh]]
+        """
+        cargo_prefix = f'{self.port_name}/container_yard/{cargo_id}/'
+        marker_key = f'{cargo_prefix}pad_lock_key.sh'
+        keys = []
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket='ports', Prefix=cargo_prefix):
+            for stored_object in page.get("Contents", []):
+                key = stored_object["Key"]
+                if key.endswith(f"/{chunking.CHUNK_INDEX_FILE_NAME}"):
+                    chunk_index = json.load(self.s3_client.get_object(Bucket='ports', Key=key)["Body"])
+                    keys += [
+                        f'{self.port_name}/container_yard/{cargo_loader.CHUNK_DIRECTORY}/{chunk["sha256"]}'
+                        for chunk in chunk_index["chunks"]
+                    ]
+                if key != marker_key:
+                    keys.append(key)
+        return [list(dict.fromkeys(keys)), [marker_key]]
+
+    def replicate_cargo(self, cargo_id: str, key_batches: list[list[str]]=None, cargo_index: CargoIndex=None):
+        """
+        Copies stored cargo (its cargo_keys unless key_batches are given) to
+        every replica that doesn't have it yet, see ferry.replicate. Replicas
+        cargo_index has the cargo in are skipped. Raises ferry.ReplicationFailed
+        with the errors of every replica that failed once all were tried.
+        """
+        replicas = [
+            replica for replica in self.replicas
+            if cargo_index is None or (f"{replica.sea}.{replica.ocean}/{self.port_name}", cargo_id) not in cargo_index
+        ]
+        if not replicas:
+            return
+
+        if key_batches is None:
+            key_batches = self.cargo_keys(cargo_id)
+        replication = ferry.replicate(self.home_sea(), replicas, 'ports', key_batches, done_key=key_batches[-1][-1])
+        if cargo_index is not None:
+            for replica in replicas:
+                if replication[replica.ocean]["error"] is None:
+                    cargo_index.add(f"{replica.sea}.{replica.ocean}/{self.port_name}", cargo_id)
+        self._report_replication(f"cargo {cargo_id}", replication, cargo_id)
+
+    def home_sea(self) -> ferry.Sea:
+        return ferry.Sea(self.ocean, self.sea, self.s3_client)
+
+    def _report_replication(self, what: str, replication: dict, result):
+        errors = []
+        for ocean, ocean_result in replication.items():
+            if ocean_result["error"] is not None:
+                status = f"failed after {ocean_result['lag_s']:.2f}s: {ocean_result['error']}"
+                errors.append(ocean_result["error"])
+            else:
+                status = (f"{ocean_result['copied']} copied, {ocean_result['skipped']} skipped, "
+                          f"{ocean_result['bytes'] / 1e6:.1f} MB, caught up in {ocean_result['lag_s']:.2f}s")
+            # stderr, stdout is left for the cargo id
+            print(f"replica {ocean}: {what} {status}", file=sys.stderr)
+        if errors:
+            replication_failed = ferry.ReplicationFailed(f"Replicating {what} failed to {len(errors)} of {len(replication)} oceans", errors)
+            # the write itself succeeded, callers still get what it returned
+            replication_failed.result = result
+            raise replication_failed
+
+    def cargo_manifest_names(self) -> list[str]:
+        names = []
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket='ports', Prefix=f'{self.port_name}/cargo_manifests/'):
+            for stored_object in page.get("Contents", []):
+                if stored_object["Key"].endswith("/manifest.json"):
+                    names.append(stored_object["Key"].split("/")[-2])
+        return names
+
+    def collect_garbage(self,
+                        grace_period: float=scrapyard.DEFAULT_GRACE_PERIOD,
+                        keep_last: int=scrapyard.DEFAULT_KEEP_LAST,
+                        dry_run: bool=False,
+                        cargo_index: CargoIndex=None) -> dict:
+        """
+        Deletes cargo (and chunks) in the container yard no cargo manifest of
+        the port references, see scrapyard.plan_collection. Cargo the port's
+        live autoscale pools load without a manifest (their marine radio,
+        whichever runner built it) is kept too. Collected cargo is deleted
+        from the replicas as well. With dry_run nothing is written or deleted.
+
+        cargo_index only loses the collected cargo on this machine, other
+        machines' indexes stop trusting it after CargoIndex's ttl, which is
+        shorter than grace_period.
+
+        Returns the collection, {"cargo_ids", "chunks", "keys", "bytes"}
+        """
+        if grace_period < CargoIndex.DEFAULT_TTL:
+            print(f"Grace period is shorter than the cargo index ttl ({CargoIndex.DEFAULT_TTL}s), "
+                  f"other machines may re-store collected content addressed cargo without uploading it", file=sys.stderr)
+        yard_prefix = f'{self.port_name}/container_yard'
+        cargo, chunks = scrapyard.survey_yard(self.s3_client, 'ports', yard_prefix)
+
+        referenced_cargo_ids = self.cargo_ids_in_pools(cargo)
+        for cargo_manifest_name in self.cargo_manifest_names():
+            referenced_cargo_ids.update(self.get_cargo_manifest(cargo_manifest_name))
+        collection = scrapyard.plan_collection(
+            cargo,
+            chunks,
+            referenced_cargo_ids,
+            lambda kept_cargo: scrapyard.referenced_chunks(self.s3_client, 'ports', yard_prefix, kept_cargo),
+            grace_period=grace_period,
+            keep_last=keep_last
+        )
+        if dry_run:
+            return collection
+
+        # replicas hold copies of the same keys
+        for sea in [self.home_sea()] + self.replicas:
+            scrapyard.delete_keys(sea.s3_client, 'ports', collection["keys"])
+            if cargo_index is not None:
+                for cargo_id in collection["cargo_ids"]:
+                    cargo_index.discard(f"{sea.sea}.{sea.ocean}/{self.port_name}", cargo_id)
+        return collection
+
+    def cargo_ids_in_pools(self, cargo_ids) -> set[str]:
+        """
+        The cargo_ids the user_data of the port's live autoscale pools lists,
+        they're loaded on every scale out
+        """
+        pools_user_data = [
+            pool["droplet_template"].get("user_data") or ""
+            for pool in list_all(Port.pydo_client, "autoscale_pools")
+            if self.port_tag in pool.get("droplet_template", {}).get("tags", [])
+        ]
+        return {cargo_id for cargo_id in cargo_ids if any(cargo_id in user_data for user_data in pools_user_data)}
+
     def get_cargo_manifest(self, cargo_manifest_name: str):
+        return list(self._get_cargo_manifest_with_etag(cargo_manifest_name)[1])
+
+    def _get_cargo_manifest_with_etag(self, cargo_manifest_name: str) -> tuple[str, list[str]]:
+        """
+        Manifests are cached by ETag for the life of the process, a cached
+        manifest is only downloaded again if it changed
+        """
+        cargo_manifest_key = f'{self.port_name}/cargo_manifests/{cargo_manifest_name}/manifest.json'
+        cache_key = (self.sea, self.ocean, cargo_manifest_key)
+        with _cargo_manifest_cache_lock:
+            cached = _cargo_manifest_cache.get(cache_key)
+
         try:
-            config_json_s3_res = self.s3_client.get_object(Bucket='ports',
-                                                           Key=f'{self.port_name}/cargo_manifests/{cargo_manifest_name}/manifest.json')
-            return json.load(config_json_s3_res['Body'])
+            if cached is None:
+                config_json_s3_res = self.s3_client.get_object(Bucket='ports',
+                                                               Key=cargo_manifest_key)
+            else:
+                config_json_s3_res = self.s3_client.get_object(Bucket='ports',
+                                                               Key=cargo_manifest_key,
+                                                               IfNoneMatch=cached[0])
         except ClientError as e:
+            if e.response['Error']['Code'] in ("304", "NotModified"):
+                return cached
             if e.response['Error']['Code'] == "NoSuchKey":
+                with _cargo_manifest_cache_lock:
+                    _cargo_manifest_cache.pop(cache_key, None)
                 raise LookupError(f"Cargo manifest {cargo_manifest_name} does not exist")
             else:
                 raise e
 
+        etag_and_cargo_ids = (config_json_s3_res['ETag'], json.load(config_json_s3_res['Body']))
+        with _cargo_manifest_cache_lock:
+            _cargo_manifest_cache[cache_key] = etag_and_cargo_ids
+        return etag_and_cargo_ids
+
+    def modify_cargo_manifest(self,
+                              cargo_manifest_name: str,
+                              modify,
+                              conflict_retries: int=DEFAULT_MANIFEST_CONFLICT_RETRIES) -> list[str]:
+        """
+        Read-modify-write of a cargo manifest. modify gets the current cargo
+        ids (an empty list for a new manifest) and returns the new ones. The
+        write only succeeds if nobody else wrote the manifest since it was
+        read, otherwise it's re-read and modify is applied again. Cargo the
+        write adds is copied to replicas before the manifest is.
+
+        Returns the cargo ids written
+        """
+        cargo_manifest_key = f'{self.port_name}/cargo_manifests/{cargo_manifest_name}/manifest.json'
+        cache_key = (self.sea, self.ocean, cargo_manifest_key)
+        for attempt in range(conflict_retries + 1):
+            try:
+                etag, cargo_ids = self._get_cargo_manifest_with_etag(cargo_manifest_name)
+                condition = {"IfMatch": etag}
+            except LookupError:
+                cargo_ids = []
+                condition = {"IfNoneMatch": "*"}
+
+            new_cargo_ids = modify(list(cargo_ids))
+            body = json.dumps(new_cargo_ids)
+            try:
+                put_res = self.s3_client.put_object(Body=body,
+                                                    Bucket='ports',
+                                                    Key=cargo_manifest_key,
+                                                    ContentType=cdn.MANIFEST_CONTENT_TYPE,
+                                                    CacheControl=cdn.MANIFEST_CACHE_CONTROL,
+                                                    **condition)
+            except ClientError as e:
+                if e.response['Error']['Code'] in ("PreconditionFailed", "ConditionalRequestConflict") and attempt < conflict_retries:
+                    time.sleep(random.uniform(0, 0.1 * 2 ** attempt))
+                    continue
+                raise e
+
+            with _cargo_manifest_cache_lock:
+                _cargo_manifest_cache[cache_key] = (put_res['ETag'], new_cargo_ids)
+            # replicas get the manifest as it is when it's copied, after the
+            # cargo it adds so a replica's manifest never lists cargo it lacks
+            if self.replicas:
+                for cargo_id in new_cargo_ids:
+                    if cargo_id in cargo_ids or self.cargo_stored_at(cargo_id) is None:
+                        continue
+                    try:
+                        self.replicate_cargo(cargo_id)
+                    except ferry.ReplicationFailed as e:
+                        e.result = new_cargo_ids
+                        raise e
+                self._report_replication(f"cargo manifest {cargo_manifest_name}",
+                                         ferry.replicate(self.home_sea(), self.replicas, 'ports',
+                                                         [[cargo_manifest_key]], overwrite=True),
+                                         new_cargo_ids)
+            return new_cargo_ids
+
     def update_cargo_mainfest(self, cargo_manifest_name: str, cargo_ids: list[str]):
-        self.s3_client.put_object(Body=json.dumps(cargo_ids),
-                                  Bucket=f'ports',
-                                  Key=f'{self.port_name}/cargo_manifests/{cargo_manifest_name}/manifest.json')
+        self.modify_cargo_manifest(cargo_manifest_name, lambda _: list(cargo_ids))
+
+    def append_cargo(self, cargo_manifest_name: str, cargo_ids: list[str]) -> list[str]:
+        """
+        Adds cargo ids not already in the manifest to its end
+        """
+        return self.modify_cargo_manifest(
+            cargo_manifest_name,
+            lambda current: current + [cargo_id for cargo_id in dict.fromkeys(cargo_ids) if cargo_id not in current]
+        )
+
+    def remove_cargo(self, cargo_manifest_name: str, cargo_ids: list[str]) -> list[str]:
+        return self.modify_cargo_manifest(
+            cargo_manifest_name,
+            lambda current: [cargo_id for cargo_id in current if cargo_id not in cargo_ids]
+        )
+
+    def promote_cargo(self, cargo_manifest_name: str, cargo_id: str, replaces: str=None) -> list[str]:
+        """
+        Puts cargo_id in place of replaces, or at the end of the manifest if
+        replaces isn't in it
+        """
+        def promote(current: list[str]) -> list[str]:
+            current = [current_cargo_id for current_cargo_id in current if current_cargo_id != cargo_id]
+            if replaces in current:
+                current[current.index(replaces)] = cargo_id
+            else:
+                current.append(cargo_id)
+            return current
+
+        return self.modify_cargo_manifest(cargo_manifest_name, promote)
 
     def create_cargo_manifest(self, cargo_manifest_name: str):
         self.authority_config = self.get_port_authority_config(self.port_name)
@@ -151,151 +698,375 @@ class Port():
         self.update_port_authority_config()
 
     @classmethod
-    def load_from_port_org(cls, port_org: dict):
+    def load_from_port_org(cls,
+                           port_org: dict,
+                           fleet_concurrency: int=DEFAULT_FLEET_CONCURRENCY,
+                           plan_only: bool=False,
+                           prune: bool=False):
         return Port(
             port_org["ocean"],
             port_org["sea"],
             port_org["port_name"],
             cargo_manifests=port_org["cargo_manifests"],
-            fleet_orgs=port_org["fleets"]
+            fleet_orgs=port_org["fleets"],
+            fleet_concurrency=fleet_concurrency,
+            replicas=port_org.get("replicas", []),
+            plan_only=plan_only,
+            prune=prune
         )
 
 _MARINE_RADIO_FILE_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "marine_radio.go"))
+# second line of a pool's user_data, planning compares it instead of rendering user_data
+_USER_DATA_KEY_FORMAT = "# user_data key {user_data_key}"
 _MARINE_RADIO_FREQUENCY = 1566
+_MARINE_RADIO_BINARY_PATH = "/usr/local/bin/marine_radio"
+_MARINE_RADIO_PAD_LOCK_KEY = f"install -m 0755 cargo {_MARINE_RADIO_BINARY_PATH}\n".encode()
 
-class Fleet():
-    with open(_MARINE_RADIO_FILE_PATH) as ship_radio_file:
-        MARINE_RADIO = ship_radio_file.read()
+_REINFORCEMENT_RESOURCE_TYPES = {
+    "cpu": "target_cpu_utilization",
+    "memory": "target_memory_utilization",
+}
 
+def reinforcement_strategy_to_do_config(reinforcement_strategy: str):
+    """
+    Translates "<resource>:<threshold>" (cpu or memory, threshold in (0, 1])
+    into autoscale pool config. Both resources can be targeted at once with
+    "cpu:0.6,memory:0.8", the pool scales on whichever needs more ships.
+    """
+    do_config = {}
+    for resource_strategy in reinforcement_strategy.split(','):
+        resource_type, _, resource_threshold = resource_strategy.strip().partition(':')
+        if resource_type not in _REINFORCEMENT_RESOURCE_TYPES or resource_type in do_config:
+            raise ValueError(f"Can't parse {reinforcement_strategy} as a reinforcement strategy")
+        try:
+            threshold = float(resource_threshold)
+        except ValueError:
+            raise ValueError(f"Can't parse {reinforcement_strategy} as a reinforcement strategy")
+        if not 0 < threshold <= 1:
+            raise ValueError(f"Reinforcement threshold {threshold} of {resource_type} must be in (0, 1]")
+        do_config[resource_type] = threshold
+    return {_REINFORCEMENT_RESOURCE_TYPES[resource_type]: threshold for resource_type, threshold in do_config.items()}
+
+def gangway_to_forwarding_rule(gangway: dict):
+    if "purser" in gangway:
+        ssl_cert_config = {"tls_passthrough": True, "certificate_id": gangway["purser"]}
+    else:
+        ssl_cert_config = {"tls_passthrough": False}
+
+    return {
+        "entry_protocol": gangway["pier_end"]["type"],
+        "entry_port": gangway["pier_end"]["number"],
+        "target_protocol": gangway["ship_end"]["type"],
+        "target_port": gangway["ship_end"]["number"],
+        **ssl_cert_config
+    }
+
+def _marine_radio_source_cargo_id() -> str:
+    with open(_MARINE_RADIO_FILE_PATH, "rb") as marine_radio_file:
+        return f"marine_radio.go-{hashlib.sha256(marine_radio_file.read()).hexdigest()}"
+
+class Fleet():
     CLOUD_CONFIG = f"""
 #cloud-config
 packages:
   - supervisor
-  - golang-go
 write_files:
-  - path: /marine_radio.go
-    content: |
-{textwrap.indent(MARINE_RADIO, '      ')}
   - path: /etc/supervisor/conf.d/marine_radio.conf
     content: |
-      [supervisord]
-      environment=GOCACHE="/root/.cache/go-build"
       [program:marine_radio]
-      command=go run /marine_radio.go
+      command={_MARINE_RADIO_BINARY_PATH}
       autostart=true
       autorestart=true
       startsecs=0
+{{cargo_loader_write_file}}
 runcmd:
-  - mkdir /cargo_bay
-  - {{load_cargo_into_cargo_bay}}
+  - {cargo_loader.CARGO_LOADER_SCRIPT_PATH}
   - service supervisor start
   - supervisorctl reread
   - supervisorctl update
 """.strip()
+
     def __init__(self, port: Port, fleet_name: str, fleet_org: dict):
         self.port = port
         self.fleet_name = fleet_name
+        self.fleet_org = fleet_org
         self.fleet_call_sign = f"{port.port_name}-{fleet_name}"
+        # ships load cargo from the port's replica in the fleet's ocean if it has one
+        self.ocean = fleet_org.get("ocean", port.ocean)
+        self.cargo_ocean, self.cargo_sea = port.nearest_sea(self.ocean)
 
-        aspl_res = Port.pydo_client.autoscalepools.list()
-        asps_by_name = [asp for asp in aspl_res["autoscale_pools"] if asp["name"] == self.fleet_call_sign]
-        if len(asps_by_name) == 0:
-            # TODO: handle memory resource and perform better value validation
-            def reinforcement_strategy_to_do_config(reinforcement_strategy: str):
-                reinforcement_strategy_parts = reinforcement_strategy.split(':')
-                resource_type = reinforcement_strategy_parts[0]
-                resource_threshold = reinforcement_strategy_parts[1]
-                if resource_type == 'cpu':
-                    return {"target_cpu_utilization": float(resource_threshold)}
-                raise ValueError(f"Can't parse {reinforcement_strategy} as a reinforcement strategy")
-            
-            if fleet_org["ssh_key_fingerprint"] == "$LOCAL":
-                fleet_org["ssh_key_fingerprint"] = utils.get_local_machine_ssh_key_fingerprint()
-
-            load_cargo_into_cargo_bay_commands = []
-            for cargo_manifest_name in port.cargo_manifests:
-                cargo_ids = port.cargo_manifests[cargo_manifest_name]
-                for cargo_id in cargo_ids:
-                    # TODO: make CARGO_LOADING_TEMPLATE also unlock/unzip cargo
-                    load_cargo_into_cargo_bay_commands += Port.CARGO_LOADING_TEMPLATE.format(
-                        ocean=self.port.ocean,
-                        sea=self.port.sea,
-                        port=self.port.port_name,
-                        cargo_id=cargo_id
-                    )
-            # download cargo into cargo bay in sequence
-            load_all_cargo_into_cargo_bay_command = " && ".join(load_cargo_into_cargo_bay_commands)
-
-            autoscalepool_create_res = Port.pydo_client.autoscalepools.create(
-                body={
-                    "name": self.fleet_call_sign,
-                    "config": {
-                        "min_instances": fleet_org["min_size"],
-                        "max_instances": fleet_org["max_size"],
-                        **reinforcement_strategy_to_do_config(fleet_org["reinforcement_strategy"])
-                    },
-                    "droplet_template": {
-                        "name": self.fleet_call_sign,
-                        "region": port.ocean,
-                        "image": fleet_org["crew"],
-                        "size": fleet_org["ship_type"],
-                        "ssh_keys": [fleet_org["ssh_key_fingerprint"]],
-                        "user_data": Fleet.CLOUD_CONFIG.replace("{load_cargo_into_cargo_bay}", load_all_cargo_into_cargo_bay_command),
-                        "tags": [self.fleet_call_sign]
-                    }
-                }
+        if fleet_org["ssh_key_fingerprint"] == "$LOCAL":
+            fleet_org["ssh_key_fingerprint"] = utils.get_local_machine_ssh_key_fingerprint()
+
+        # baked fleets boot from a snapshot with their cargo already loaded
+        self.snapshot_name = self.bake_snapshot_name() if fleet_org.get("bake", False) else None
+
+    def cargo_ids(self) -> list[str]:
+        """
+        Every cargo id the port's cargo manifests list right now
+        """
+        cargo_ids = []
+        for cargo_manifest_name in self.port.cargo_manifests:
+            for cargo_id in self.port.cargo_manifests[cargo_manifest_name]:
+                if cargo_id not in cargo_ids:
+                    cargo_ids.append(cargo_id)
+        return cargo_ids
+
+    def render_cargo_loader(self, cargo_ids: list[str]=[], marine_radio_cargo_id: str=None) -> str:
+        """
+        The fleet's cargo loader, it loads the marine radio and cargo_ids and
+        reads the port's cargo manifests for the rest when it runs. Stores
+        the marine radio unless its cargo id is given.
+        """
+        # the marine radio is loaded alongside the rest of the cargo
+        marine_radio_cargo_id = marine_radio_cargo_id or self.port.stow_marine_radio(CargoIndex())
+        return cargo_loader.render_cargo_loader(
+            self.cargo_ocean,
+            self.cargo_sea,
+            self.port.port_name,
+            [marine_radio_cargo_id] + [cargo_id for cargo_id in cargo_ids if cargo_id != marine_radio_cargo_id],
+            list(self.port.cargo_manifests),
+            parallelism=self.fleet_org.get("cargo_loading_parallelism", cargo_loader.DEFAULT_LOADING_PARALLELISM)
+        )
+
+    def cloud_config(self, cargo_ids: list[str]=[], marine_radio_cargo_id: str=None) -> str:
+        """
+        Fleet.CLOUD_CONFIG with the fleet's cargo loader, see render_cargo_loader
+        """
+        cargo_loader_script = self.render_cargo_loader(cargo_ids, marine_radio_cargo_id=marine_radio_cargo_id)
+        return Fleet.CLOUD_CONFIG.replace("{cargo_loader_write_file}",
+                                          cargo_loader.render_cargo_loader_write_file(cargo_loader_script))
+
+    def bake_snapshot_name(self) -> str:
+        """
+        Name of the fleet's baked snapshot, keyed by a hash of everything baked
+        into it, the crew image, the cloud-config and the cargo ids its
+        manifests list. An unchanged fleet keeps using the snapshot it already
+        has.
+        """
+        cloud_config = self.cloud_config(marine_radio_cargo_id=_marine_radio_source_cargo_id())
+        bake_key = hashlib.sha256(json.dumps([self.fleet_org["crew"], cloud_config, self.cargo_ids()]).encode()).hexdigest()
+        return f"{self.fleet_call_sign}-{bake_key[:16]}"
+
+    def bake(self):
+        """
+        Bakes the fleet's snapshot on a builder droplet, see shipyard.bake_snapshot
+        """
+        fleet_org = self.fleet_org
+        # the builder is told the cargo ids, the CDN may still serve the manifests from before this deploy
+        cloud_config = self.cloud_config(self.cargo_ids())
+        shipyard.bake_snapshot(Port.pydo_client, {
+            "name": f"{self.snapshot_name}-builder",
+            "region": self.ocean,
+            "image": fleet_org["crew"],
+            "size": fleet_org["ship_type"],
+            "ssh_keys": [fleet_org["ssh_key_fingerprint"]],
+            # not the fleet call sign, the load balancer and rollouts mustn't pick it up
+            "tags": [f"{self.fleet_call_sign}-builder"],
+            "user_data": shipyard.render_bake_cloud_config(cloud_config, cargo_loader.CARGO_LOADER_SCRIPT_PATH)
+        }, self.snapshot_name)
+        self.port.inventory.invalidate("snapshots")
+        # snapshots can't be tagged as they're taken
+        self.port.tag_resources([
+            {"resource_id": snapshot["id"], "resource_type": "image"}
+            for snapshot in self.port.inventory.named("snapshots", self.snapshot_name)
+        ])
+        self.port.inventory.invalidate("snapshots")
+
+    def user_data(self, marine_radio_cargo_id: str=None) -> str:
+        """
+        user_data of the fleet's ships, stores the marine radio unless its
+        cargo id is given
+        """
+        if self.snapshot_name is not None:
+            return shipyard.render_baked_cloud_config(self.render_cargo_loader(marine_radio_cargo_id=marine_radio_cargo_id))
+        return self.cloud_config(marine_radio_cargo_id=marine_radio_cargo_id)
+
+    def user_data_key(self) -> str:
+        """
+        Hash of the fleet's user_data with the radio's source standing in
+        for its cargo id, so it changes with anything else rendered into
+        user_data but planning doesn't build the radio
+        """
+        user_data = self.user_data(marine_radio_cargo_id=_marine_radio_source_cargo_id())
+        return hashlib.sha256(user_data.encode()).hexdigest()[:16]
+
+    def autoscale_pool_body(self, with_user_data: bool=True) -> dict:
+        """
+        Desired autoscale pool. Rendering user_data stores the marine radio,
+        so planning leaves it out and compares user_data_key instead.
+        """
+        fleet_org = self.fleet_org
+        droplet_template = {
+            "name": self.fleet_call_sign,
+            "region": self.ocean,
+            "image": fleet_org["crew"],
+            "size": fleet_org["ship_type"],
+            "ssh_keys": [fleet_org["ssh_key_fingerprint"]],
+            "tags": [self.fleet_call_sign, self.port.port_tag]
+        }
+        if self.snapshot_name is not None:
+            snapshots = self.port.inventory.named("snapshots", self.snapshot_name)
+            # until it's baked (only while planning) the snapshot is known by name
+            droplet_template["image"] = int(snapshots[0]["id"]) if snapshots else self.snapshot_name
+
+        # ships read the cargo manifests on boot, so cargo changes don't change user_data
+        if with_user_data:
+            droplet_template["user_data"] = self.user_data().replace(
+                "#cloud-config\n",
+                f"#cloud-config\n{_USER_DATA_KEY_FORMAT.format(user_data_key=self.user_data_key())}\n",
+                1
             )
+
+        return {
+            "name": self.fleet_call_sign,
+            "config": {
+                "min_instances": fleet_org["min_size"],
+                "max_instances": fleet_org["max_size"],
+                **reinforcement_strategy_to_do_config(fleet_org["reinforcement_strategy"])
+            },
+            "droplet_template": droplet_template
+        }
+
+    def load_balancer_body(self) -> dict:
+        return {
+            "name": self.fleet_call_sign,
+            "region": self.ocean,
+            "forwarding_rules": list(map(gangway_to_forwarding_rule, self.fleet_org["gangways"])),
+            "tag": self.fleet_call_sign,
+            "health_check": {
+                "protocol": "http",
+                "port": _MARINE_RADIO_FREQUENCY,
+                "path": "/",
+                "check_interval_seconds": 5,
+                "response_timeout_seconds": 5,
+                "unhealthy_threshold": 2,
+                "healthy_threshold": 3
+            }
+        }
+
+    def plan_changes(self) -> list[Change]:
+        changes = []
+
+        autoscale_pool_depends_on = []
+        if self.snapshot_name is not None:
+            if len(self.port.inventory.named("snapshots", self.snapshot_name)) == 0:
+                changes.append(Change("create", "snapshots", self.snapshot_name,
+                                      self.bake,
+                                      fleet_name=self.fleet_name))
+            autoscale_pool_depends_on = [("snapshots", self.snapshot_name)]
+
+        asps_by_name = self.port.inventory.named("autoscale_pools", self.fleet_call_sign)
+        if len(asps_by_name) == 0:
+            changes.append(Change("create", "autoscale_pools", self.fleet_call_sign,
+                                  self.create_autoscale_pool,
+                                  depends_on=autoscale_pool_depends_on,
+                                  fleet_name=self.fleet_name))
             # TODO: look into assigning autoscaling pool to a project.
             # Based on DigitalOcean UI it seems like autoscale pools can't be assigned to groups.
+        elif len(asps_by_name) == 1:
+            asp = asps_by_name[0]
+            asp_body = self.autoscale_pool_body(with_user_data=False)
+            asp_differences = differences(asp_body, asp)
+            # differences skips keys one side lacks, switching strategies adds one target and drops another
+            for target in _REINFORCEMENT_RESOURCE_TYPES.values():
+                desired_target = asp_body["config"].get(target)
+                actual_target = asp.get("config", {}).get(target) or None
+                if desired_target != actual_target:
+                    asp_differences[f"config.{target}"] = (actual_target, desired_target)
+            # pools from before user_data was keyed have no key and are updated too
+            actual_user_data = asp.get("droplet_template", {}).get("user_data")
+            if actual_user_data is not None:
+                actual_user_data_key = None
+                user_data_key_line = _USER_DATA_KEY_FORMAT.format(user_data_key="")
+                for line in actual_user_data.splitlines()[:2]:
+                    if line.startswith(user_data_key_line):
+                        actual_user_data_key = line[len(user_data_key_line):]
+                if actual_user_data_key != self.user_data_key():
+                    asp_differences["droplet_template.user_data"] = (actual_user_data_key, self.user_data_key())
+            if asp_differences:
+                changes.append(Change("update", "autoscale_pools", self.fleet_call_sign,
+                                      lambda: self.update_autoscale_pool(asp["id"]),
+                                      depends_on=autoscale_pool_depends_on,
+                                      differences=asp_differences,
+                                      fleet_name=self.fleet_name))
         elif len(asps_by_name) > 1:
-            raise RuntimeError(f"Multiple autoscale pools with name: {fleet_name}")
-
-        lbl_res = Port.pydo_client.load_balancers.list()
-        lbs_by_name = [lb for lb in lbl_res["load_balancers"] if lb["name"] == self.fleet_call_sign]
+            raise RuntimeError(f"Multiple autoscale pools with name: {self.fleet_name}")
 
+        lbs_by_name = self.port.inventory.named("load_balancers", self.fleet_call_sign)
         if len(lbs_by_name) == 0:
-            def gangway_to_forwarding_rule(gangway: dict):
-                if "purser" in gangway:
-                    ssl_cert_config = {"tls_passthrough": True, "certificate_id": gangway["purser"]}
-                else:
-                    ssl_cert_config = {"tls_passthrough": False}
-
-                return {
-                    "entry_protocol": gangway["pier_end"]["type"],
-                    "entry_port": gangway["pier_end"]["number"],
-                    "target_protocol": gangway["ship_end"]["type"],
-                    "target_port": gangway["ship_end"]["number"],
-                    **ssl_cert_config
-                }
-
-            loadbalancer_create_res = Port.pydo_client.load_balancers.create(
-                body={
-                    "name": self.fleet_call_sign,
-                    "region": port.ocean,
-                    "forwarding_rules": list(map(gangway_to_forwarding_rule, fleet_org["gangways"])),
-                    "tag": self.fleet_call_sign,
-                    "health_check": {
-                        "protocol": "http",
-                        "port": _MARINE_RADIO_FREQUENCY,
-                        "path": "/",
-                        "check_interval_seconds": 5,
-                        "response_timeout_seconds": 5,
-                        "unhealthy_threshold": 2,
-                        "healthy_threshold": 3
-                    }
-                }
-            )
-
-            loadbalancer_pool_id = loadbalancer_create_res["load_balancer"]["id"]
-            Port.pydo_client.projects.assign_resources(
-                port.project["id"],
-                body={
-                    "resources": [f"do:loadbalancer:{loadbalancer_pool_id}"]
-                }
-            )
+            changes.append(Change("create", "load_balancers", self.fleet_call_sign,
+                                  self.create_load_balancer,
+                                  # the load balancer is assigned to the port's project
+                                  depends_on=[("projects", self.port.port_name)],
+                                  fleet_name=self.fleet_name))
+        elif len(lbs_by_name) == 1:
+            lb = lbs_by_name[0]
+            lb_differences = differences(self.load_balancer_body(), lb)
+            if lb_differences:
+                changes.append(Change("update", "load_balancers", self.fleet_call_sign,
+                                      lambda: self.update_load_balancer(lb["id"]),
+                                      differences=lb_differences,
+                                      fleet_name=self.fleet_name))
         elif len(lbs_by_name) > 1:
-            raise RuntimeError(f"Multiple load balancers with name: {fleet_name}")
+            raise RuntimeError(f"Multiple load balancers with name: {self.fleet_name}")
+
+        return changes
+
+    def create_autoscale_pool(self):
+        autoscalepool_create_res = Port.pydo_client.autoscalepools.create(body=self.autoscale_pool_body())
+        self.port.inventory.add("autoscale_pools", autoscalepool_create_res["autoscale_pool"])
+
+    def update_autoscale_pool(self, autoscale_pool_id: str):
+        Port.pydo_client.autoscalepools.update(autoscale_pool_id, body=self.autoscale_pool_body())
+        self.port.inventory.invalidate("autoscale_pools")
+
+    def create_load_balancer(self):
+        loadbalancer_create_res = Port.pydo_client.load_balancers.create(body=self.load_balancer_body())
+        self.port.inventory.add("load_balancers", loadbalancer_create_res["load_balancer"])
+
+        loadbalancer_pool_id = loadbalancer_create_res["load_balancer"]["id"]
+        Port.pydo_client.projects.assign_resources(
+            self.port.project["id"],
+            body={
+                "resources": [f"do:loadbalancer:{loadbalancer_pool_id}"]
+            }
+        )
+
+    def update_load_balancer(self, load_balancer_id: str):
+        Port.pydo_client.load_balancers.update(load_balancer_id, body=self.load_balancer_body())
+        self.port.inventory.invalidate("load_balancers")
+
+    def ships(self) -> list[dict]:
+        # the autoscale pool tags every droplet it creates with the fleet call sign
+        return list_all(Port.pydo_client, "droplets", tag_name=self.fleet_call_sign)
+
+    def roll_out(self,
+                 executor=None,
+                 batch_size: int=rollout.DEFAULT_BATCH_SIZE,
+                 drain_seconds: float=rollout.DEFAULT_DRAIN_SECONDS,
+                 health_timeout: float=rollout.DEFAULT_HEALTH_TIMEOUT):
+        """
+        Loads the fleet's current cargo onto its running ships in place, see
+        rollout.Rollout. executor runs commands on ships, ssh by default.
+        The fleet org's optional health_check command must pass on a ship
+        before it takes traffic again, and the next batch only starts once
+        the load balancer's health check could have passed it again.
+        """
+        # the cargo ids are listed too, the CDN may still serve the manifests from before this deploy
+        cargo_loader_script = self.render_cargo_loader(self.cargo_ids())
+        health_check = self.load_balancer_body()["health_check"]
+        fleet_rollout = rollout.Rollout(executor or rollout.SSHExecutor(),
+                                        cargo_loader_script,
+                                        _MARINE_RADIO_FREQUENCY,
+                                        health_check_command=self.fleet_org.get("health_check"),
+                                        batch_size=batch_size,
+                                        drain_seconds=drain_seconds,
+                                        health_timeout=health_timeout,
+                                        rejoin_seconds=health_check["healthy_threshold"] * health_check["check_interval_seconds"])
+        fleet_rollout.roll(self.ships())
 
 class Container():
     def __init__(self, items: list[str]):
-        subprocess.run([f"tar -czvf container.tar.gz {' '.join(items)}"] + items, shell=True)
\ No newline at end of file
+        with open("container.tar.gz", "wb") as container_file:
+            stevedore.pack_cargo(".", container_file, items=items)
\ No newline at end of file
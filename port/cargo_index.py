@@ -0,0 +1,64 @@
+import json
+import os
+import time
+
+
+_CARGO_INDEX_FILE_PATH = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+    "port",
+    "cargo_index.json"
+)
+class CargoIndex():
+    """
+    Local record of content addressed cargo ids already known to be in a
+    container yard, so re-storing them doesn't need a HEAD request.
+
+    Each cargo id is kept with when its cargo was stored and only trusted for
+    ttl seconds after, older cargo may have been garbage collected by another
+    machine and is checked again.
+    """
+    # well under scrapyard's grace period, garbage collection (run from any
+    # machine) never deletes cargo stored more recently than that
+    DEFAULT_TTL = 24 * 60 * 60
+
+    def __init__(self, file_path: str=_CARGO_INDEX_FILE_PATH, ttl: float=DEFAULT_TTL):
+        self.file_path = file_path
+        self.ttl = ttl
+        try:
+            with open(file_path) as cargo_index_file:
+                self.yards = json.load(cargo_index_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.yards = {}
+        # indexes from before cargo was kept with when it was stored list cargo ids, they're checked again
+        self.yards = {
+            yard: cargo_ids if isinstance(cargo_ids, dict) else dict.fromkeys(cargo_ids, 0)
+            for yard, cargo_ids in self.yards.items()
+        }
+
+    def __contains__(self, yard_and_cargo_id: tuple[str, str]) -> bool:
+        yard, cargo_id = yard_and_cargo_id
+        stored_at = self.yards.get(yard, {}).get(cargo_id)
+        return stored_at is not None and time.time() - stored_at < self.ttl
+
+    def add(self, yard: str, cargo_id: str, stored_at: float=None):
+        """
+        Records cargo_id as in yard, stored at stored_at (unix time, now by default)
+        """
+        stored_at = time.time() if stored_at is None else stored_at
+        if self.yards.get(yard, {}).get(cargo_id) == stored_at:
+            return
+        self.yards.setdefault(yard, {})[cargo_id] = stored_at
+        self.save()
+
+    def discard(self, yard: str, cargo_id: str):
+        if cargo_id not in self.yards.get(yard, {}):
+            return
+        del self.yards[yard][cargo_id]
+        self.save()
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
+        tmp_file_path = f"{self.file_path}.tmp"
+        with open(tmp_file_path, "w") as cargo_index_file:
+            json.dump(self.yards, cargo_index_file)
+        os.replace(tmp_file_path, self.file_path)
@@ -0,0 +1,138 @@
+import shlex
+import textwrap
+
+from port import cdn, chunking
+
+
+CARGO_YARD_CDN_URL_FORMAT = "https://{sea}.{ocean}.cdn.digitaloceanspaces.com/ports/{port}/container_yard"
+CARGO_MANIFESTS_CDN_URL_FORMAT = "https://{sea}.{ocean}.cdn.digitaloceanspaces.com/ports/{port}/cargo_manifests"
+DEFAULT_LOADING_PARALLELISM = 4
+DEFAULT_LOADING_RETRIES = 5
+
+CARGO_LOADER_SCRIPT_PATH = "/cargo_loader.sh"
+
+# chunked cargo (see chunking.hoist_chunked_cargo) shares chunks yard wide
+CHUNK_DIRECTORY = "chunks"
+
+# Invoked with no arguments it resolves the cargo manifests to cargo ids and
+# fans out over them with xargs, which calls the script back with a single
+# cargo id to load. Chunked cargo fans out again, calling the script back with
+# --chunk and a single chunk to fetch. Cargo loaded once isn't loaded again, so
+# the script can run again on every boot and rollout.
+_CARGO_LOADER_TEMPLATE = """
+#!/bin/sh
+set -eu
+CARGO_YARD_URL={cargo_yard_url}
+CARGO_MANIFESTS_URL={cargo_manifests_url}
+# kept across cargo, so a ship only fetches chunks it hasn't seen before
+CHUNK_LOCKER=/cargo_bay/.chunks
+
+fetch_chunk() {{
+    cd "$CHUNK_LOCKER"
+    [ -f "$1" ] && return
+    curl -fsS --retry {retries} --retry-all-errors -o "$1.$$" "$CARGO_YARD_URL/{chunk_directory}/$1"
+    echo "$1  $1.$$" | sha256sum -c --status || {{ echo "chunk $1 failed checksum" >&2; rm -f "$1.$$"; return 1; }}
+    mv "$1.$$" "$1"
+}}
+
+load_chunked_cargo() {{
+    python3 -c 'import json, sys; print("\\n".join(chunk["sha256"] for chunk in json.load(open(sys.argv[1]))["chunks"]))' \\
+        {chunk_index_file_name} > chunks
+    sort -u chunks | xargs -r -d '\\n' -n 1 -P {parallelism} sh "$0" --chunk
+    (cd "$CHUNK_LOCKER" && xargs -r -d '\\n' cat) < chunks > cargo
+}}
+
+load_cargo() {{
+    cargo_hold="/cargo_bay/$1"
+    [ -f "$cargo_hold/.loaded" ] && return
+    mkdir -p "$cargo_hold"
+    cd "$cargo_hold"
+    curl -fsS --retry {retries} --retry-all-errors -o cargo.sha256 "$CARGO_YARD_URL/$1/cargo.sha256"
+    curl -fsS --retry {retries} --retry-all-errors -o pad_lock_key.sh "$CARGO_YARD_URL/$1/pad_lock_key.sh"
+    # no --retry-all-errors, a 404 is how whole cargo says it has no chunk index
+    if curl -fsS --retry {retries} -o {chunk_index_file_name} "$CARGO_YARD_URL/$1/{chunk_index_file_name}" 2>/dev/null; then
+        load_chunked_cargo
+        sha256sum -c --status cargo.sha256 || {{ echo "cargo $1 failed checksum" >&2; return 1; }}
+        sh pad_lock_key.sh && touch .loaded
+        return
+    fi
+    # compressible cargo has a gzipped variant, whole cargo is the fallback
+    if curl -fsS --retry {retries} -o {precompressed_cargo_file_name} "$CARGO_YARD_URL/$1/{precompressed_cargo_file_name}" 2>/dev/null \\
+        && gunzip -c {precompressed_cargo_file_name} > cargo && sha256sum -c --status cargo.sha256; then
+        rm -f {precompressed_cargo_file_name}
+        sh pad_lock_key.sh && touch .loaded
+        return
+    fi
+    rm -f {precompressed_cargo_file_name}
+    # resume partial downloads left by a previous attempt
+    curl -fsS --retry {retries} --retry-all-errors -C - -o cargo "$CARGO_YARD_URL/$1/cargo" || true
+    if ! sha256sum -c --status cargo.sha256; then
+        rm -f cargo
+        curl -fsS --retry {retries} --retry-all-errors -o cargo "$CARGO_YARD_URL/$1/cargo"
+        sha256sum -c --status cargo.sha256 || {{ echo "cargo $1 failed checksum" >&2; return 1; }}
+    fi
+    sh pad_lock_key.sh && touch .loaded
+}}
+
+if [ "$#" -eq 2 ] && [ "$1" = "--chunk" ]; then
+    fetch_chunk "$2"
+    exit
+fi
+
+if [ "$#" -eq 1 ]; then
+    load_cargo "$1"
+    exit
+fi
+
+mkdir -p /cargo_bay "$CHUNK_LOCKER"
+printf '%s\\n' {cargo_ids} > /cargo_bay/cargo_ids
+# manifests are read when the ship boots, so it always loads the live cargo
+for cargo_manifest in {cargo_manifest_names}; do
+    curl -fsS --retry {retries} --retry-all-errors -o "/cargo_bay/$cargo_manifest.json" "$CARGO_MANIFESTS_URL/$cargo_manifest/manifest.json"
+    python3 -c 'import json, sys; print("\\n".join(json.load(open(sys.argv[1]))))' "/cargo_bay/$cargo_manifest.json" >> /cargo_bay/cargo_ids
+done
+awk 'NF && !seen[$0]++' /cargo_bay/cargo_ids | xargs -r -d '\\n' -n 1 -P {parallelism} sh "$0"
+""".lstrip()
+
+def render_cargo_loader(ocean: str,
+                        sea: str,
+                        port_name: str,
+                        cargo_ids: list[str],
+                        cargo_manifest_names: list[str]=[],
+                        parallelism: int=DEFAULT_LOADING_PARALLELISM,
+                        retries: int=DEFAULT_LOADING_RETRIES) -> str:
+    """
+    Renders a shell script that downloads cargo_ids and the cargo the named
+    cargo manifests list when it runs into /cargo_bay, with at most
+    parallelism downloads at once. Each is checked against the checksum
+    recorded by Port.store_cargo and unlocked with its pad lock key. Chunked
+    cargo is put together from the chunks the ship doesn't have yet.
+
+    The script's size doesn't depend on how much cargo the manifests list.
+    """
+    if parallelism < 1:
+        raise ValueError("parallelism must be at least 1")
+
+    cargo_yard_url = CARGO_YARD_CDN_URL_FORMAT.format(sea=sea, ocean=ocean, port=port_name)
+    cargo_manifests_url = CARGO_MANIFESTS_CDN_URL_FORMAT.format(sea=sea, ocean=ocean, port=port_name)
+    return _CARGO_LOADER_TEMPLATE.format(
+        cargo_yard_url=shlex.quote(cargo_yard_url),
+        cargo_manifests_url=shlex.quote(cargo_manifests_url),
+        retries=retries,
+        chunk_directory=CHUNK_DIRECTORY,
+        chunk_index_file_name=chunking.CHUNK_INDEX_FILE_NAME,
+        precompressed_cargo_file_name=cdn.PRECOMPRESSED_CARGO_FILE_NAME,
+        parallelism=parallelism,
+        cargo_ids=" ".join(shlex.quote(cargo_id) for cargo_id in cargo_ids) or "''",
+        cargo_manifest_names=" ".join(shlex.quote(name) for name in cargo_manifest_names),
+    )
+
+def render_cargo_loader_write_file(cargo_loader: str) -> str:
+    """
+    Renders a cloud-config write_files entry for the cargo loader script
+    """
+    return f"""
+  - path: {CARGO_LOADER_SCRIPT_PATH}
+    permissions: '0755'
+    content: |
+{textwrap.indent(cargo_loader, '      ')}""".lstrip("\n")
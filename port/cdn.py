@@ -0,0 +1,107 @@
+import io
+import urllib.error
+import urllib.request
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from port.logbook import LOGBOOK
+
+
+# everything under container_yard/ is written once under its cargo id (or
+# chunk hash) and never changes, so the CDN and ships can keep it for a year
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# cargo manifests change in place and ships read them on boot, so the CDN
+# only keeps them for a minute
+MANIFEST_CACHE_CONTROL = "public, max-age=60"
+MANIFEST_CONTENT_TYPE = "application/json"
+
+PRECOMPRESSED_CARGO_FILE_NAME = "cargo.gz"
+# cargo is precompressed when a sample of it shrinks below this ratio
+DEFAULT_COMPRESSIBLE_RATIO = 0.9
+DEFAULT_COMPRESSIBLE_SAMPLE_SIZE = 1024 * 1024
+DEFAULT_COMPRESS_LEVEL = 6
+DEFAULT_WARM_UP_CONCURRENCY = 8
+
+_CONTENT_TYPES = {
+    "cargo": "application/octet-stream",
+    "cargo.gz": "application/gzip",
+    "cargo.sha256": "text/plain; charset=utf-8",
+    "pad_lock_key.sh": "text/x-shellscript; charset=utf-8",
+    "chunk_index.json": "application/json",
+}
+
+def yard_object_headers(file_name: str) -> dict:
+    """
+    put_object kwargs for a container yard object, chunks and unknown files
+    are plain bytes
+    """
+    return {
+        "ContentType": _CONTENT_TYPES.get(file_name, "application/octet-stream"),
+        "CacheControl": IMMUTABLE_CACHE_CONTROL,
+    }
+
+def is_compressible(cargo: io.BufferedIOBase,
+                    sample_size: int=DEFAULT_COMPRESSIBLE_SAMPLE_SIZE,
+                    ratio: float=DEFAULT_COMPRESSIBLE_RATIO) -> bool:
+    """
+    Compresses a sample from the start of seekable cargo, already compressed
+    cargo (tar.gz, images, binaries packed with upx) barely shrinks
+    """
+    sample = cargo.read(sample_size)
+    cargo.seek(0)
+    if not sample:
+        return False
+    return len(zlib.compress(sample, 1)) < len(sample) * ratio
+
+class GzipCompressedCargo(io.RawIOBase):
+    """
+    Readable gzip stream of cargo compressed as it's read, for uploading a
+    precompressed variant without writing it to disk
+    """
+    def __init__(self, cargo: io.BufferedIOBase, compresslevel: int=DEFAULT_COMPRESS_LEVEL, read_size: int=1024 * 1024):
+        super().__init__()
+        self.cargo = cargo
+        self.read_size = read_size
+        # wbits 31 writes a gzip header and trailer, gunzip reads it as is
+        self._compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, 31)
+        self._current = b""
+        self._done = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._current and not self._done:
+            data = self.cargo.read(self.read_size)
+            if data:
+                self._current = self._compressor.compress(data)
+            else:
+                self._current = self._compressor.flush()
+                self._done = True
+
+        size = min(len(buffer), len(self._current))
+        buffer[:size] = self._current[:size]
+        self._current = self._current[size:]
+        return size
+
+def warm_up(urls: list[str], concurrency: int=DEFAULT_WARM_UP_CONCURRENCY) -> dict:
+    """
+    Fetches urls through the CDN so the first ships to load them hit the edge
+    cache instead of the origin. Only warms the edge this machine reaches.
+
+    Returns {url: HTTP status} (None when the request failed to send)
+    """
+    def fetch(url: str):
+        with LOGBOOK.timed("cdn.warm-up") as logbook_entry:
+            try:
+                with urllib.request.urlopen(url, timeout=60) as res:
+                    while data := res.read(1024 * 1024):
+                        logbook_entry.bytes_received += len(data)
+                    return res.status
+            except urllib.error.HTTPError as e:
+                return e.code
+            except urllib.error.URLError:
+                return None
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return dict(zip(urls, executor.map(fetch, urls)))
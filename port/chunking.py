@@ -0,0 +1,168 @@
+import functools
+import hashlib
+import io
+import json
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+DEFAULT_MIN_CHUNK_SIZE = 256 * 1024
+DEFAULT_AVG_CHUNK_SIZE = 1024 * 1024
+DEFAULT_MAX_CHUNK_SIZE = 4 * 1024 * 1024
+DEFAULT_CONCURRENCY = 8
+
+CHUNK_INDEX_FILE_NAME = "chunk_index.json"
+
+# positions hashed at once while looking for a cut point
+_CUT_BLOCK_SIZE = 256 * 1024
+# fixed seed, chunk boundaries (and so chunk dedup) depend on this table never changing
+_gear_random = random.Random(1566)
+_GEAR = [_gear_random.getrandbits(64) for _ in range(256)]
+
+def _masks(avg_size: int) -> tuple[int, int]:
+    # normalized chunking: harder to cut before avg_size, easier after,
+    # which keeps chunk sizes close to avg_size
+    bits = avg_size.bit_length() - 1
+    return (1 << (bits + 1)) - 1 << (64 - bits - 1), (1 << (bits - 1)) - 1 << (64 - bits + 1)
+
+@functools.cache
+def _gear_array():
+    import numpy
+
+    return numpy.array(_GEAR, dtype=numpy.uint64)
+
+def _gear_hashes(data, start: int, stop: int, first: int):
+    """
+    Gear hash at every position in [start, stop) of data (a uint8 array),
+    hashing from first on. The hash at i is sum(gear[data[i - k]] << k) over
+    the 64 bytes before it, so it's computed for a whole block at once in
+    log2(64) shift and add steps instead of byte by byte.
+    """
+    # bytes more than 64 back are shifted out of the hash
+    window_start = max(first, start - 63)
+    hashes = _gear_array()[data[window_start:stop]]
+    span = 1
+    while span < 64:
+        hashes[span:] += hashes[:-span] << span
+        span *= 2
+    return hashes[start - window_start:]
+
+def _cut_point(data: bytes, min_size: int, avg_size: int, max_size: int) -> int:
+    """
+    FastCDC style gear hash cut point in data, len(data) if there's none
+    """
+    import numpy
+
+    size = len(data)
+    if size <= min_size:
+        return size
+    end = min(size, max_size)
+    normal = min(end, avg_size)
+    mask_small, mask_large = _masks(avg_size)
+
+    data = numpy.frombuffer(data, dtype=numpy.uint8)
+    # hashed a block at a time, most cuts come well before max_size
+    for region_start, region_end, mask in [(min_size, normal, mask_small), (normal, end, mask_large)]:
+        for block_start in range(region_start, region_end, _CUT_BLOCK_SIZE):
+            block_end = min(region_end, block_start + _CUT_BLOCK_SIZE)
+            cuts = numpy.flatnonzero(_gear_hashes(data, block_start, block_end, min_size) & numpy.uint64(mask) == 0)
+            if len(cuts):
+                return block_start + int(cuts[0]) + 1
+    return end
+
+def chunk_cargo(cargo: io.BufferedIOBase,
+                min_size: int=DEFAULT_MIN_CHUNK_SIZE,
+                avg_size: int=DEFAULT_AVG_CHUNK_SIZE,
+                max_size: int=DEFAULT_MAX_CHUNK_SIZE):
+    """
+    Yields content defined chunks of cargo. An edit only changes the chunks
+    around it, the rest cut the same way and dedup against earlier cargo.
+    """
+    buffer = b""
+    eof = False
+    while True:
+        while not eof and len(buffer) < max_size:
+            read = cargo.read(max_size)
+            if not read:
+                eof = True
+            buffer += read
+        if not buffer:
+            return
+        cut = _cut_point(buffer, min_size, avg_size, max_size)
+        yield buffer[:cut]
+        buffer = buffer[cut:]
+
+def chunk_key(chunk_prefix: str, chunk_sha256: str) -> str:
+    return f"{chunk_prefix}/{chunk_sha256}"
+
+def stored_chunks(s3_client, bucket: str, chunk_prefix: str) -> set[str]:
+    """
+    sha256 of every chunk already in the yard, one paginated listing
+    """
+    chunk_sha256s = set()
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=f"{chunk_prefix}/"):
+        for stored_object in page.get("Contents", []):
+            chunk_sha256s.add(stored_object["Key"].rsplit("/", 1)[1])
+    return chunk_sha256s
+
+def hoist_chunked_cargo(s3_client,
+                        cargo: io.BufferedIOBase,
+                        bucket: str,
+                        chunk_prefix: str,
+                        chunk_index_key: str,
+                        concurrency: int=DEFAULT_CONCURRENCY,
+                        chunk_put_kwargs: dict={},
+                        chunk_index_put_kwargs: dict={},
+                        **chunk_kwargs) -> dict:
+    """
+    Splits cargo into content defined chunks and uploads only the chunks
+    not already under chunk_prefix, up to concurrency at a time. Then writes
+    the chunk index listing the cargo's chunks in order. chunk_put_kwargs and
+    chunk_index_put_kwargs (ContentType, CacheControl...) are passed to put_object.
+
+    Returns the chunk index plus "uploaded_bytes" and "uploaded_chunks"
+    """
+    already_stored = stored_chunks(s3_client, bucket, chunk_prefix)
+
+    cargo_hash = hashlib.sha256()
+    chunks = []
+    uploaded = {"bytes": 0, "chunks": 0}
+    uploaded_lock = threading.Lock()
+    # bounds chunks read but not yet uploaded
+    chunk_slots = threading.BoundedSemaphore(concurrency)
+
+    def upload_chunk(chunk_sha256: str, chunk: bytes):
+        try:
+            s3_client.put_object(Body=chunk, Bucket=bucket, Key=chunk_key(chunk_prefix, chunk_sha256),
+                                 **chunk_put_kwargs)
+            with uploaded_lock:
+                uploaded["bytes"] += len(chunk)
+                uploaded["chunks"] += 1
+        finally:
+            chunk_slots.release()
+
+    futures = []
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for chunk in chunk_cargo(cargo, **chunk_kwargs):
+            cargo_hash.update(chunk)
+            chunk_sha256 = hashlib.sha256(chunk).hexdigest()
+            chunks.append({"sha256": chunk_sha256, "size": len(chunk)})
+            if chunk_sha256 in already_stored:
+                continue
+            # the same chunk can repeat within one cargo
+            already_stored.add(chunk_sha256)
+            chunk_slots.acquire()
+            futures.append(executor.submit(upload_chunk, chunk_sha256, chunk))
+    for future in futures:
+        future.result()
+
+    chunk_index = {
+        "size": sum(chunk["size"] for chunk in chunks),
+        "sha256": cargo_hash.hexdigest(),
+        "chunks": chunks,
+    }
+    s3_client.put_object(Body=json.dumps(chunk_index), Bucket=bucket, Key=chunk_index_key, **chunk_index_put_kwargs)
+
+    return {**chunk_index, "uploaded_bytes": uploaded["bytes"], "uploaded_chunks": uploaded["chunks"]}
@@ -0,0 +1,131 @@
+import hashlib
+import io
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+
+# S3 rejects multipart parts smaller than 5 MiB (except the last one)
+MIN_PART_SIZE = 5 * 1024 * 1024
+DEFAULT_PART_SIZE = 16 * 1024 * 1024
+DEFAULT_CONCURRENCY = 4
+DEFAULT_PART_RETRIES = 3
+DEFAULT_PART_RETRY_BACKOFF = 1
+
+def _read_part(cargo: io.BufferedIOBase, part_size: int) -> bytes:
+    # file objects like pipes and sockets may return short reads
+    chunks = []
+    remaining = part_size
+    while remaining > 0:
+        chunk = cargo.read(remaining)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+def weigh_cargo(cargo: io.BufferedIOBase,
+                pad_lock_key: bytes,
+                chunk_size: int=DEFAULT_PART_SIZE) -> str:
+    """
+    Streams cargo through sha256 and returns a content addressed cargo id.
+    The pad lock key is part of the id since it changes how cargo is unlocked.
+    Cargo is rewound to where it started.
+    """
+    start = cargo.tell()
+    cargo_hash = hashlib.sha256()
+    while chunk := cargo.read(chunk_size):
+        cargo_hash.update(chunk)
+    cargo.seek(start)
+
+    cargo_hash.update(b"\0pad_lock_key\0")
+    cargo_hash.update(pad_lock_key)
+    return f"sha256-{cargo_hash.hexdigest()}"
+
+def hoist_cargo(s3_client,
+                cargo: io.BufferedIOBase,
+                bucket: str,
+                key: str,
+                part_size: int=DEFAULT_PART_SIZE,
+                concurrency: int=DEFAULT_CONCURRENCY,
+                part_retries: int=DEFAULT_PART_RETRIES,
+                part_retry_backoff: float=DEFAULT_PART_RETRY_BACKOFF,
+                **put_kwargs) -> dict:
+    """
+    Streams cargo into S3 in parts of part_size bytes, uploading up to
+    concurrency parts at once. Peak memory is bounded by roughly
+    (concurrency + 1) * part_size bytes of cargo, the parts in flight plus
+    the one read ahead. Cargo that fits in a single part is sent with
+    put_object. Extra put_kwargs (ContentType, CacheControl...) are passed to
+    put_object/create_multipart_upload.
+
+    A failed part is retried up to part_retries times, after a jittered
+    delay of up to part_retry_backoff * 2 ** attempt seconds. These retries
+    come on top of the client's own, they ride out failures that outlast them.
+
+    Returns {"size": total bytes, "parts": number of parts, "sha256": hex digest}
+    """
+    if part_size < MIN_PART_SIZE:
+        raise ValueError(f"part_size must be at least {MIN_PART_SIZE} bytes")
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+
+    cargo_hash = hashlib.sha256()
+    first_part = _read_part(cargo, part_size)
+    cargo_hash.update(first_part)
+    if len(first_part) < part_size:
+        s3_client.put_object(Body=first_part, Bucket=bucket, Key=key, **put_kwargs)
+        return {"size": len(first_part), "parts": 1, "sha256": cargo_hash.hexdigest()}
+
+    upload_id = s3_client.create_multipart_upload(Bucket=bucket, Key=key, **put_kwargs)["UploadId"]
+
+    def upload_part(part_number: int, body: bytes):
+        for attempt in range(part_retries + 1):
+            try:
+                upload_part_res = s3_client.upload_part(Body=body,
+                                                        Bucket=bucket,
+                                                        Key=key,
+                                                        PartNumber=part_number,
+                                                        UploadId=upload_id)
+                return {"PartNumber": part_number, "ETag": upload_part_res["ETag"]}
+            except ClientError:
+                if attempt == part_retries:
+                    raise
+                # full jitter keeps parts that failed together from retrying together
+                time.sleep(random.uniform(0, part_retry_backoff * 2 ** attempt))
+
+    # bounds parts that are read but not yet uploaded
+    part_slots = threading.BoundedSemaphore(concurrency)
+    futures = []
+    size = 0
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            part_number = 1
+            body = first_part
+            while body:
+                part_slots.acquire()
+                # stop reading as soon as any part has failed for good
+                if any(future.done() and future.exception() for future in futures):
+                    part_slots.release()
+                    break
+                future = executor.submit(upload_part, part_number, body)
+                future.add_done_callback(lambda _: part_slots.release())
+                futures.append(future)
+                size += len(body)
+                part_number += 1
+                body = _read_part(cargo, part_size)
+                cargo_hash.update(body)
+
+        parts = [future.result() for future in futures]
+        s3_client.complete_multipart_upload(Bucket=bucket,
+                                            Key=key,
+                                            UploadId=upload_id,
+                                            MultipartUpload={"Parts": parts})
+    except BaseException:
+        s3_client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        raise
+
+    return {"size": size, "parts": len(parts), "sha256": cargo_hash.hexdigest()}
@@ -0,0 +1,136 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+from port import crane
+from port.logbook import LOGBOOK
+
+
+DEFAULT_CONCURRENCY = 8
+# copy_object only takes sources up to 5 GiB, bigger objects are streamed
+MAX_COPY_OBJECT_SIZE = 5 * 1024 * 1024 * 1024
+
+# get_object response fields put back on the replica's copy
+_COPIED_HEADERS = ["ContentType", "CacheControl", "ContentEncoding"]
+
+class Sea():
+    """
+    Spaces (sea) in an ocean (region) with an S3 client for its endpoint, the
+    port's own or one of its replicas. The endpoint host names the sea, so
+    bucket is the first part of the path, not the Spaces bucket.
+    """
+    def __init__(self, ocean: str, sea: str, s3_client):
+        self.ocean = ocean
+        self.sea = sea
+        self.s3_client = s3_client
+
+class ReplicationFailed(ExceptionGroup):
+    """
+    Raised once the source write succeeded but replicas didn't catch up,
+    result is what the write returned (e.g. the stored cargo id)
+    """
+    result = None
+
+def _replica_size(replica: Sea, bucket: str, key: str) -> int:
+    try:
+        return replica.s3_client.head_object(Bucket=bucket, Key=key)["ContentLength"]
+    except ClientError as e:
+        if e.response['Error']['Code'] in ("404", "NoSuchKey"):
+            return None
+        raise e
+
+def ferry_keys(source: Sea,
+               replica: Sea,
+               bucket: str,
+               keys: list[str],
+               overwrite: bool=False,
+               concurrency: int=DEFAULT_CONCURRENCY) -> dict:
+    """
+    Copies keys from the source bucket to the replica, up to concurrency at
+    once. Unless overwrite, keys the replica already has with the same size
+    are skipped. Within the same ocean copy_object copies server side from
+    the source sea (the Spaces bucket, with bucket as the key's first path
+    part), Spaces can't copy across oceans. If the replica can't reach the
+    source that way the object is streamed through this machine instead
+    (and is from then on).
+
+    Returns {"copied", "skipped", "bytes"}
+    """
+    server_side_copy = replica.ocean == source.ocean
+    copied = []
+    skipped = []
+
+    def ferry_key(key: str):
+        nonlocal server_side_copy
+        head_res = source.s3_client.head_object(Bucket=bucket, Key=key)
+        if not overwrite and _replica_size(replica, bucket, key) == head_res["ContentLength"]:
+            skipped.append(key)
+            return
+
+        with LOGBOOK.timed("ferry.copy") as logbook_entry:
+            if server_side_copy and head_res["ContentLength"] <= MAX_COPY_OBJECT_SIZE:
+                try:
+                    replica.s3_client.copy_object(Bucket=bucket,
+                                                  Key=key,
+                                                  CopySource={"Bucket": source.sea, "Key": f"{bucket}/{key}"},
+                                                  MetadataDirective="COPY")
+                    copied.append(head_res["ContentLength"])
+                    return
+                except ClientError:
+                    server_side_copy = False
+
+            get_res = source.s3_client.get_object(Bucket=bucket, Key=key)
+            hoist_res = crane.hoist_cargo(replica.s3_client,
+                                          get_res["Body"],
+                                          bucket,
+                                          key,
+                                          **{header: get_res[header] for header in _COPIED_HEADERS if get_res.get(header)})
+            logbook_entry.bytes_received += hoist_res["size"]
+            logbook_entry.bytes_sent += hoist_res["size"]
+            copied.append(hoist_res["size"])
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(ferry_key, keys))
+
+    return {"copied": len(copied), "skipped": len(skipped), "bytes": sum(copied)}
+
+def replicate(source: Sea,
+              replicas: list[Sea],
+              bucket: str,
+              key_batches: list[list[str]],
+              done_key: str=None,
+              overwrite: bool=False,
+              concurrency: int=DEFAULT_CONCURRENCY) -> dict:
+    """
+    Ferries key_batches to every replica in parallel, each batch only once
+    the one before it is copied, so a marker written last at the source is
+    written last at the replica too. A replica that already has done_key is
+    skipped.
+
+    Returns {replica ocean: {"copied", "skipped", "bytes", "lag_s", "error"}}
+    where lag_s is how long the replica took to catch up and error is the
+    exception it failed with (None if it didn't)
+    """
+    started_at = time.monotonic()
+
+    def replicate_to(replica: Sea) -> dict:
+        result = {"copied": 0, "skipped": 0, "bytes": 0, "lag_s": 0, "error": None}
+        try:
+            if done_key is not None and _replica_size(replica, bucket, done_key) is not None:
+                result["skipped"] = sum(len(keys) for keys in key_batches)
+            else:
+                for keys in key_batches:
+                    ferry_res = ferry_keys(source, replica, bucket, keys,
+                                           overwrite=overwrite,
+                                           concurrency=concurrency)
+                    for field in ["copied", "skipped", "bytes"]:
+                        result[field] += ferry_res[field]
+        except Exception as e:
+            e.add_note(f"While replicating to {replica.sea}.{replica.ocean}")
+            result["error"] = e
+        result["lag_s"] = time.monotonic() - started_at
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, len(replicas))) as executor:
+        return dict(zip([replica.ocean for replica in replicas], executor.map(replicate_to, replicas)))
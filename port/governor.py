@@ -0,0 +1,221 @@
+import json
+import random
+import threading
+import time
+
+from port.inventory import RESOURCE_TYPES, list_all
+from port.logbook import LOGBOOK
+
+
+# DigitalOcean allows 250 requests per minute per token
+DIGITALOCEAN_REQUESTS_PER_MINUTE = 250
+
+DEFAULT_MAX_RETRIES = 6
+DEFAULT_BACKOFF_BASE = 0.5
+DEFAULT_BACKOFF_CAP = 30
+
+_RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+# resource type -> key of the resource in create responses
+_CREATED_RESOURCE_KEYS = {
+    "projects": "project",
+    "autoscale_pools": "autoscale_pool",
+    "load_balancers": "load_balancer",
+    "droplets": "droplet",
+}
+
+class TokenBucket():
+    """
+    Thread safe token bucket refilled at rate tokens per second, up to capacity.
+
+    The rate adapts: slow_down halves it after the API pushes back and
+    speed_up creeps it back towards max_rate after each success.
+    """
+    def __init__(self, rate: float, capacity: float, min_rate: float=None):
+        self.rate = rate
+        self.max_rate = rate
+        self.min_rate = rate / 16 if min_rate is None else min_rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.refilled_at = time.monotonic()
+        self.paused_until = 0
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+
+    def acquire(self, tokens: float=1):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                else:
+                    self._refill(now)
+                    if self.tokens >= tokens:
+                        self.tokens -= tokens
+                        return
+                    wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def slow_down(self):
+        with self.lock:
+            self._refill(time.monotonic())
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def speed_up(self):
+        with self.lock:
+            self._refill(time.monotonic())
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 50)
+
+    def pause_until(self, monotonic_time: float):
+        with self.lock:
+            self.paused_until = max(self.paused_until, monotonic_time)
+
+    def observe(self, remaining: int=None, reset_at: float=None):
+        """
+        Lines the bucket up with the quota the API reports, reset_at is unix time
+        """
+        with self.lock:
+            if remaining is not None:
+                self._refill(time.monotonic())
+                self.tokens = min(self.tokens, remaining)
+        if remaining == 0 and reset_at is not None:
+            self.pause_until(time.monotonic() + max(0, reset_at - time.time()))
+
+def _int_header(headers, name: str):
+    try:
+        return int(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+class _GovernedOperationGroup():
+    def __init__(self, operation_group_name: str, operation_group, governed_client: "GovernedClient"):
+        self._operation_group_name = operation_group_name
+        self._operation_group = operation_group
+        self._governed_client = governed_client
+
+    def __getattr__(self, operation_name: str):
+        operation = getattr(self._operation_group, operation_name)
+        if not callable(operation):
+            return operation
+
+        def governed_operation(*args, **kwargs):
+            return self._governed_client.call(self._operation_group_name, operation_name, operation, *args, **kwargs)
+        return governed_operation
+
+class GovernedClient():
+    """
+    Wraps a pydo client so every call (client.<group>.<operation>(...)):
+    - waits for a token from a bucket shared by all threads using the client,
+      kept in line with DigitalOcean's ratelimit-* response headers
+    - retries 429s, 5xxs and connection errors with jittered exponential
+      backoff, slowing the bucket down instead of failing
+    - before retrying a create that may have reached the API, looks the
+      resource up by name so a retry never makes a duplicate
+
+    The wrapped client should have its own retries turned off (retry_total=0).
+    """
+    def __init__(self,
+                 pydo_client,
+                 requests_per_minute: float=DIGITALOCEAN_REQUESTS_PER_MINUTE,
+                 max_retries: int=DEFAULT_MAX_RETRIES,
+                 backoff_base: float=DEFAULT_BACKOFF_BASE,
+                 backoff_cap: float=DEFAULT_BACKOFF_CAP):
+        self._pydo_client = pydo_client
+        # allow short bursts of a tenth of the per minute quota
+        self._bucket = TokenBucket(requests_per_minute / 60, max(1, requests_per_minute / 10))
+        self._max_retries = max_retries
+        self._backoff_base = backoff_base
+        self._backoff_cap = backoff_cap
+
+    def __getattr__(self, operation_group_name: str):
+        return _GovernedOperationGroup(operation_group_name,
+                                       getattr(self._pydo_client, operation_group_name),
+                                       self)
+
+    def call(self, operation_group_name: str, operation_name: str, operation, *args, **kwargs):
+        # timed across retries and rate limit waits, which is what the caller sees
+        with LOGBOOK.timed(f"pydo.{operation_group_name}.{operation_name}") as logbook_entry:
+            return self._call(logbook_entry, operation_group_name, operation_name, operation, *args, **kwargs)
+
+    def _call(self, logbook_entry, operation_group_name: str, operation_name: str, operation, *args, **kwargs):
+        from azure.core.exceptions import HttpResponseError, ServiceRequestError, ServiceResponseError
+
+        def with_headers(pipeline_response, deserialized, headers):
+            try:
+                logbook_entry.bytes_received += len(pipeline_response.http_response.body() or b"")
+            except AttributeError:
+                pass
+            return deserialized, headers
+
+        if kwargs.get("body") is not None:
+            logbook_entry.bytes_sent = len(json.dumps(kwargs["body"]).encode())
+
+        for attempt in range(self._max_retries + 1):
+            logbook_entry.retries = attempt
+            self._bucket.acquire()
+            try:
+                deserialized, headers = operation(*args, cls=with_headers, **kwargs)
+            except HttpResponseError as e:
+                status_code = e.status_code
+                if status_code not in _RETRYABLE_STATUS_CODES or attempt == self._max_retries:
+                    raise
+                response_headers = e.response.headers if e.response is not None else {}
+                delay = self._backoff(attempt)
+                if status_code == 429:
+                    self._bucket.slow_down()
+                    reset_at = _int_header(response_headers, "ratelimit-reset")
+                    retry_after = _int_header(response_headers, "retry-after")
+                    if retry_after is not None:
+                        delay = max(delay, retry_after)
+                    elif reset_at is not None:
+                        delay = max(delay, reset_at - time.time())
+                throttled = status_code == 429
+                # a 429 was turned away before doing anything, a 5xx may have done the create
+                may_have_applied = not throttled
+            except (ServiceRequestError, ServiceResponseError) as e:
+                if attempt == self._max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                throttled = False
+                # a request that failed to send never reached the API
+                may_have_applied = not isinstance(e, ServiceRequestError)
+            else:
+                self._bucket.observe(_int_header(headers or {}, "ratelimit-remaining"),
+                                     _int_header(headers or {}, "ratelimit-reset"))
+                self._bucket.speed_up()
+                return deserialized
+
+            if throttled:
+                # every thread sharing the quota waits, not just this one
+                self._bucket.pause_until(time.monotonic() + delay)
+            else:
+                time.sleep(delay)
+
+            if operation_name == "create" and may_have_applied:
+                created = self._find_created(operation_group_name, kwargs.get("body"))
+                if created is not None:
+                    return created
+
+    def _backoff(self, attempt: int) -> float:
+        # full jitter keeps concurrent retries from lining up again
+        return random.uniform(0, min(self._backoff_cap, self._backoff_base * 2 ** attempt))
+
+    def _find_created(self, operation_group_name: str, body: dict):
+        """
+        Returns a create response for the resource body asked for if it exists
+        """
+        resource_types = [
+            resource_type
+            for resource_type, (resource_operation_group_name, _) in RESOURCE_TYPES.items()
+            if resource_operation_group_name == operation_group_name
+        ]
+        if not resource_types or not isinstance(body, dict) or "name" not in body:
+            return None
+
+        for resource in list_all(self, resource_types[0]):
+            if resource.get("name") == body["name"]:
+                return {_CREATED_RESOURCE_KEYS[resource_types[0]]: resource}
+        return None
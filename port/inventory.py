@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pydo
+
+
+_INVENTORY_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+    "port"
+)
+_PER_PAGE = 200
+
+# resource type -> (pydo operation group, key of the resource list in list responses)
+RESOURCE_TYPES = {
+    "projects": ("projects", "projects"),
+    "autoscale_pools": ("autoscalepools", "autoscale_pools"),
+    "load_balancers": ("load_balancers", "load_balancers"),
+    "droplets": ("droplets", "droplets"),
+    "snapshots": ("snapshots", "snapshots"),
+}
+
+# listed with list_all but not indexed by name,
+# listing -> (pydo operation group, list operation, key of the list in list responses)
+LISTINGS = {
+    "project_resources": ("projects", "list_resources", "resources"),
+}
+
+def list_all(pydo_client: pydo.Client, resource_type: str, *list_args, **list_kwargs) -> list[dict]:
+    """
+    Walks every page of a pydo list call of a resource type or one of
+    LISTINGS, list_kwargs filter it (e.g. tag_name)
+    """
+    if resource_type in LISTINGS:
+        operation_group, operation_name, resources_key = LISTINGS[resource_type]
+    else:
+        (operation_group, resources_key), operation_name = RESOURCE_TYPES[resource_type], "list"
+    list_resources = getattr(getattr(pydo_client, operation_group), operation_name)
+
+    resources = []
+    page = 1
+    while True:
+        list_res = list_resources(*list_args, per_page=_PER_PAGE, page=page, **list_kwargs)
+        resources += list_res.get(resources_key) or []
+        if "next" not in (list_res.get("links") or {}).get("pages", {}):
+            return resources
+        page += 1
+
+class Inventory():
+    """
+    Name indexes of DigitalOcean resources shared by a Port and its Fleets.
+    Each resource type is listed once (every page) the first time it's looked
+    up and kept up to date with add/invalidate after create calls.
+
+    With a ttl the indexes are also cached on disk so repeated runs within ttl
+    seconds skip listing altogether.
+    """
+    def __init__(self, pydo_client: pydo.Client, ttl: float=0, cache_file_path: str=None):
+        self.pydo_client = pydo_client
+        self.ttl = ttl
+        if cache_file_path is None:
+            # keep inventories of different accounts apart without writing the token to disk
+            account_hash = hashlib.sha256(os.environ.get("DIGITALOCEAN_TOKEN", "").encode()).hexdigest()[:16]
+            cache_file_path = os.path.join(_INVENTORY_CACHE_DIR, f"inventory-{account_hash}.json")
+        self.cache_file_path = cache_file_path
+
+        # resource type -> {"listed_at": unix time, "resources": [resource...]}
+        self.resources = {}
+        self.indexes = {}
+        # fleets are provisioned from several threads at once
+        self.lock = threading.RLock()
+        if self.ttl > 0:
+            self._load_cache()
+
+    def named(self, resource_type: str, name: str) -> list[dict]:
+        """
+        Returns every resource of resource_type called name
+        """
+        with self.lock:
+            if resource_type not in self.indexes:
+                self.refresh(resource_type)
+            return list(self.indexes[resource_type].get(name, []))
+
+    def by_name(self, resource_type: str) -> dict[str, list[dict]]:
+        with self.lock:
+            if resource_type not in self.indexes:
+                self.refresh(resource_type)
+            return {name: list(resources) for name, resources in self.indexes[resource_type].items()}
+
+    def refresh(self, resource_type: str):
+        with self.lock:
+            self.resources[resource_type] = {
+                "listed_at": time.time(),
+                "resources": list_all(self.pydo_client, resource_type)
+            }
+            self._index(resource_type)
+            self._save_cache()
+
+    def add(self, resource_type: str, resource: dict):
+        """
+        Records a resource that was just created
+        """
+        with self.lock:
+            if resource_type not in self.indexes:
+                # the next lookup lists everything, including this resource
+                return
+            self.resources[resource_type]["resources"].append(resource)
+            self.indexes[resource_type].setdefault(resource["name"], []).append(resource)
+            self._save_cache()
+
+    def invalidate(self, resource_type: str=None):
+        with self.lock:
+            resource_types = [resource_type] if resource_type else list(self.resources)
+            for resource_type in resource_types:
+                self.resources.pop(resource_type, None)
+                self.indexes.pop(resource_type, None)
+            self._save_cache()
+
+    def _index(self, resource_type: str):
+        index = {}
+        for resource in self.resources[resource_type]["resources"]:
+            index.setdefault(resource["name"], []).append(resource)
+        self.indexes[resource_type] = index
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_file_path) as cache_file:
+                cached_resources = json.load(cache_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+
+        for resource_type, listing in cached_resources.items():
+            if resource_type in RESOURCE_TYPES and time.time() - listing["listed_at"] < self.ttl:
+                self.resources[resource_type] = listing
+                self._index(resource_type)
+
+    def _save_cache(self):
+        if self.ttl <= 0:
+            return
+        os.makedirs(os.path.dirname(self.cache_file_path), exist_ok=True)
+        tmp_cache_file_path = f"{self.cache_file_path}.tmp"
+        with open(tmp_cache_file_path, "w") as cache_file:
+            json.dump(self.resources, cache_file)
+        os.replace(tmp_cache_file_path, self.cache_file_path)
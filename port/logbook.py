@@ -0,0 +1,150 @@
+import atexit
+import contextlib
+import json
+import sys
+import threading
+import time
+
+
+PROFILE_FORMATS = ["table", "json", "prometheus"]
+
+class Entry():
+    """
+    One outbound call, filled in by whoever makes it
+    """
+    def __init__(self):
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.retries = 0
+
+class Logbook():
+    """
+    Per operation call counts, wall time, bytes moved and retries of every
+    outbound call (pydo, S3 and subprocesses) made by the process
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.operations = {}
+
+    def record(self, operation: str, seconds: float, entry: Entry, failed: bool=False):
+        with self.lock:
+            stats = self.operations.setdefault(operation, {
+                "calls": 0,
+                "errors": 0,
+                "retries": 0,
+                "bytes_sent": 0,
+                "bytes_received": 0,
+                "durations": [],
+            })
+            stats["calls"] += 1
+            stats["errors"] += int(failed)
+            stats["retries"] += entry.retries
+            stats["bytes_sent"] += entry.bytes_sent
+            stats["bytes_received"] += entry.bytes_received
+            stats["durations"].append(seconds)
+
+    @contextlib.contextmanager
+    def timed(self, operation: str):
+        entry = Entry()
+        started_at = time.perf_counter()
+        try:
+            yield entry
+        except BaseException:
+            self.record(operation, time.perf_counter() - started_at, entry, failed=True)
+            raise
+        self.record(operation, time.perf_counter() - started_at, entry)
+
+    def summary(self) -> dict:
+        with self.lock:
+            summary = {}
+            for operation, stats in self.operations.items():
+                durations = sorted(stats["durations"])
+                summary[operation] = {
+                    **{key: value for key, value in stats.items() if key != "durations"},
+                    "total_s": sum(durations),
+                    "p50_s": durations[len(durations) // 2],
+                    "max_s": durations[-1],
+                }
+            return dict(sorted(summary.items(), key=lambda item: item[1]["total_s"], reverse=True))
+
+    def report(self, profile_format: str="table") -> str:
+        summary = self.summary()
+        if profile_format == "json":
+            return json.dumps(summary, indent=2)
+
+        if profile_format == "prometheus":
+            metrics = [
+                ("calls", "port_outbound_calls_total", "counter"),
+                ("errors", "port_outbound_errors_total", "counter"),
+                ("retries", "port_outbound_retries_total", "counter"),
+                ("bytes_sent", "port_outbound_bytes_sent_total", "counter"),
+                ("bytes_received", "port_outbound_bytes_received_total", "counter"),
+                ("total_s", "port_outbound_seconds_total", "counter"),
+                ("max_s", "port_outbound_seconds_max", "gauge"),
+            ]
+            lines = []
+            for stat, metric, metric_type in metrics:
+                lines.append(f"# TYPE {metric} {metric_type}")
+                for operation, stats in summary.items():
+                    lines.append(f'{metric}{{operation="{operation}"}} {stats[stat]}')
+            return "\n".join(lines)
+
+        header = f"{'operation':<48} {'calls':>6} {'errors':>6} {'retries':>7} {'total s':>9} {'p50 s':>8} {'max s':>8} {'sent':>10} {'received':>10}"
+        lines = [header, "-" * len(header)]
+        for operation, stats in summary.items():
+            lines.append(f"{operation:<48} {stats['calls']:>6} {stats['errors']:>6} {stats['retries']:>7} "
+                         f"{stats['total_s']:>9.3f} {stats['p50_s']:>8.3f} {stats['max_s']:>8.3f} "
+                         f"{_human_bytes(stats['bytes_sent']):>10} {_human_bytes(stats['bytes_received']):>10}")
+        return "\n".join(lines)
+
+    def report_at_exit(self, profile_format: str="table", output=None):
+        """
+        Writes the report to output (stderr by default) when the process exits,
+        including when the command fails
+        """
+        atexit.register(lambda: print(self.report(profile_format), file=output or sys.stderr))
+
+    def on_s3_before_call(self, params, context, model, **kwargs):
+        from botocore.utils import determine_content_length
+
+        entry = Entry()
+        entry.bytes_sent = determine_content_length(params.get("body") or b"") or 0
+        context["port_logbook"] = (f"s3.{model.name}", time.perf_counter(), entry)
+
+    def on_s3_after_call(self, http_response, parsed, model, context, **kwargs):
+        if "port_logbook" not in context:
+            return
+        operation, started_at, entry = context.pop("port_logbook")
+        entry.bytes_received = _response_body_size(http_response, model)
+        entry.retries = parsed.get("ResponseMetadata", {}).get("RetryAttempts", 0)
+        self.record(operation, time.perf_counter() - started_at, entry, failed="Error" in parsed)
+
+    def on_s3_after_call_error(self, context, **kwargs):
+        if "port_logbook" not in context:
+            return
+        operation, started_at, entry = context.pop("port_logbook")
+        self.record(operation, time.perf_counter() - started_at, entry, failed=True)
+
+    def instrument_s3_client(self, s3_client):
+        s3_client.meta.events.register("before-call.s3", self.on_s3_before_call)
+        s3_client.meta.events.register("after-call.s3", self.on_s3_after_call)
+        s3_client.meta.events.register("after-call-error.s3", self.on_s3_after_call_error)
+        return s3_client
+
+def _response_body_size(http_response, model) -> int:
+    # a HEAD response's ContentLength is the object's size, not what was received
+    if model.http.get("method") == "HEAD":
+        return 0
+    # streamed bodies (get_object) aren't read yet, reading them here would consume them
+    if model.has_streaming_output:
+        return int(http_response.headers.get("content-length") or 0)
+    return len(http_response.content or b"")
+
+def _human_bytes(size: int) -> str:
+    for unit in ["B", "KiB", "MiB", "GiB"]:
+        if size < 1024 or unit == "GiB":
+            return f"{size:.0f}{unit}" if unit == "B" else f"{size:.1f}{unit}"
+        size /= 1024
+
+# the process wide logbook every client records into
+LOGBOOK = Logbook()
@@ -0,0 +1,155 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+_ACTION_SYMBOLS = {"create": "+", "update": "~", "delete": "-"}
+
+def differences(desired, actual, path: str="") -> dict:
+    """
+    Compares only fields both sides have, the API fills in extra fields and
+    leaves out some request only ones. Returns {dotted path: (actual, desired)}
+    of every mismatch.
+    """
+    if isinstance(desired, str) and isinstance(actual, dict) and "slug" in actual:
+        # regions, sizes and images are requested by slug but returned as objects
+        actual = actual["slug"]
+    if isinstance(desired, dict) and isinstance(actual, dict):
+        found = {}
+        for key, desired_value in desired.items():
+            if key in actual:
+                found.update(differences(desired_value, actual[key], f"{path}.{key}" if path else key))
+        return found
+    if isinstance(desired, list) and isinstance(actual, list) and len(desired) == len(actual):
+        found = {}
+        for i, (desired_item, actual_item) in enumerate(zip(desired, actual)):
+            found.update(differences(desired_item, actual_item, f"{path}[{i}]"))
+        return found
+    if desired != actual:
+        return {path: (actual, desired)}
+    return {}
+
+def _fleet_prefix(change: "Change") -> str:
+    return f"fleet {change.fleet_name}: " if change.fleet_name else ""
+
+class Change():
+    """
+    One step of a plan. apply performs it and depends_on holds the keys of
+    changes that must be applied first.
+    """
+    def __init__(self,
+                 action: str,
+                 resource_type: str,
+                 name: str,
+                 apply,
+                 depends_on: list[tuple[str, str]]=[],
+                 differences: dict={},
+                 fleet_name: str=None):
+        self.action = action
+        self.resource_type = resource_type
+        self.name = name
+        self.apply = apply
+        self.depends_on = depends_on
+        self.differences = differences
+        self.fleet_name = fleet_name
+
+    @property
+    def key(self) -> tuple[str, str]:
+        return (self.resource_type, self.name)
+
+    def __str__(self):
+        lines = [f"{_ACTION_SYMBOLS[self.action]} {self.resource_type} {self.name}"]
+        for path, (actual, desired) in self.differences.items():
+            lines.append(f"    {path}: {actual!r} -> {desired!r}")
+        return "\n".join(lines)
+
+class Plan():
+    """
+    Changes needed to get from actual to desired state
+    """
+    def __init__(self, changes: list[Change]):
+        self.changes = changes
+        self.timings = {}
+        self.started_at = {}
+
+    def __bool__(self):
+        return len(self.changes) > 0
+
+    def __str__(self):
+        if not self.changes:
+            return "No changes"
+        return "\n".join(str(change) for change in self.changes)
+
+    def fleet_timings(self) -> dict:
+        """
+        {fleet name: seconds from its first change starting to its last one
+        finishing} of the fleets with applied changes
+        """
+        spans = {}
+        for change in self.changes:
+            if change.fleet_name is None or change.key not in self.timings:
+                continue
+            started_at = self.started_at[change.key]
+            finished_at = started_at + self.timings[change.key]
+            first_started_at, last_finished_at = spans.get(change.fleet_name, (started_at, finished_at))
+            spans[change.fleet_name] = (min(first_started_at, started_at), max(last_finished_at, finished_at))
+        return {fleet_name: finished_at - started_at for fleet_name, (started_at, finished_at) in spans.items()}
+
+    def apply(self, concurrency: int):
+        """
+        Applies changes in dependency order, running independent changes on
+        up to concurrency threads. Changes that depend on a failed change are
+        skipped. Errors are raised together once nothing else can run.
+        """
+        changes_by_key = {change.key: change for change in self.changes}
+        # dependencies outside the plan already exist
+        pending = {
+            change.key: {key for key in change.depends_on if key in changes_by_key}
+            for change in self.changes
+        }
+        errors = []
+        failed = set()
+
+        def apply_change(change: Change):
+            started_at = self.started_at[change.key] = time.monotonic()
+            try:
+                change.apply()
+            finally:
+                self.timings[change.key] = time.monotonic() - started_at
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            running = {}
+            while pending or running:
+                for key in [key for key, depends_on in pending.items() if not depends_on]:
+                    del pending[key]
+                    running[executor.submit(apply_change, changes_by_key[key])] = key
+
+                if not running:
+                    # everything left waits on a failed change
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key = running.pop(future)
+                    if future.exception() is not None:
+                        e = future.exception()
+                        e.add_note(f"While applying {_fleet_prefix(changes_by_key[key])}{changes_by_key[key]}")
+                        errors.append(e)
+                        failed.add(key)
+                        continue
+                    for depends_on in pending.values():
+                        depends_on.discard(key)
+
+        for change in self.changes:
+            if change.key in failed:
+                status = "failed"
+            elif change.key in self.timings:
+                status = "ok"
+            else:
+                status = "skipped"
+            timing = f" in {self.timings[change.key]:.2f}s" if change.key in self.timings else ""
+            print(f"{_fleet_prefix(change)}{_ACTION_SYMBOLS[change.action]} {change.resource_type} {change.name}: {status}{timing}")
+        for fleet_name, seconds in self.fleet_timings().items():
+            print(f"fleet {fleet_name}: done in {seconds:.2f}s")
+
+        if errors:
+            raise ExceptionGroup(f"Failed to apply {len(errors)} of {len(self.changes)} changes", errors)
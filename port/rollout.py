@@ -0,0 +1,158 @@
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from port import cargo_loader
+from port.logbook import LOGBOOK
+
+
+DEFAULT_BATCH_SIZE = 1
+# the load balancer health check fails a ship after 2 checks 5 seconds apart
+DEFAULT_DRAIN_SECONDS = 15
+# and only sends it traffic again after 3 passing checks 5 seconds apart
+DEFAULT_REJOIN_SECONDS = 15
+DEFAULT_HEALTH_TIMEOUT = 120
+DEFAULT_HEALTH_POLL_SECONDS = 2
+DEFAULT_COMMAND_TIMEOUT = 600
+DEFAULT_SSH_OPTIONS = ["-o", "BatchMode=yes", "-o", "StrictHostKeyChecking=accept-new", "-o", "ConnectTimeout=10"]
+
+PAN_PAN_COMMAND = "supervisorctl signal SIGUSR1 marine_radio"
+ALL_CLEAR_COMMAND = "supervisorctl signal SIGUSR2 marine_radio"
+# marine_radio isn't restarted, a fresh radio would clear PAN-PAN too early
+RESTART_COMMAND = ("supervisorctl reread && supervisorctl update && "
+                   "supervisorctl status | awk '$1 != \"marine_radio\" {print $1}' | xargs -r supervisorctl restart")
+MARINE_RADIO_CHECK_COMMAND_FORMAT = "curl -fsS -o /dev/null http://127.0.0.1:{frequency}/"
+
+class SSHExecutor():
+    """
+    Runs shell commands on ships over ssh
+    """
+    def __init__(self,
+                 user: str="root",
+                 ssh_options: list[str]=DEFAULT_SSH_OPTIONS,
+                 timeout: float=DEFAULT_COMMAND_TIMEOUT):
+        self.user = user
+        self.ssh_options = ssh_options
+        self.timeout = timeout
+
+    def run(self, address: str, command: str, input: str=None) -> str:
+        with LOGBOOK.timed("subprocess.ssh"):
+            res = subprocess.run(["ssh", *self.ssh_options, f"{self.user}@{address}", command],
+                                 input=input,
+                                 capture_output=True,
+                                 text=True,
+                                 timeout=self.timeout)
+        if res.returncode != 0:
+            raise RuntimeError(f"{command!r} on {address} exited with {res.returncode}: {res.stderr.strip()}")
+        return res.stdout
+
+def ship_address(ship: dict) -> str:
+    for network in (ship.get("networks") or {}).get("v4", []):
+        if network["type"] == "public":
+            return network["ip_address"]
+    raise LookupError(f"Ship {ship['name']} has no public address")
+
+class Rollout():
+    """
+    Loads cargo onto running ships batch_size ships at a time. Every ship in
+    a batch, in parallel:
+    - raises PAN-PAN (SIGUSR1 to marine_radio) so the load balancer stops
+      sending it traffic, then waits drain_seconds for it to drain
+    - writes and runs the cargo loader
+    - restarts every supervisor program but marine_radio
+    - waits for health_check_command (if any) to pass, clears PAN-PAN and
+      waits for the marine radio to answer healthy
+    - waits rejoin_seconds for the load balancer to pass enough health
+      checks to send it traffic again, before the next batch drains
+
+    A ship that fails stays drained and no batch after its batch is started.
+    """
+    def __init__(self,
+                 executor,
+                 cargo_loader_script: str,
+                 marine_radio_frequency: int,
+                 health_check_command: str=None,
+                 batch_size: int=DEFAULT_BATCH_SIZE,
+                 drain_seconds: float=DEFAULT_DRAIN_SECONDS,
+                 health_timeout: float=DEFAULT_HEALTH_TIMEOUT,
+                 health_poll_seconds: float=DEFAULT_HEALTH_POLL_SECONDS,
+                 rejoin_seconds: float=DEFAULT_REJOIN_SECONDS):
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+
+        self.executor = executor
+        self.cargo_loader_script = cargo_loader_script
+        self.marine_radio_check_command = MARINE_RADIO_CHECK_COMMAND_FORMAT.format(frequency=marine_radio_frequency)
+        self.health_check_command = health_check_command
+        self.batch_size = batch_size
+        self.drain_seconds = drain_seconds
+        self.health_timeout = health_timeout
+        self.health_poll_seconds = health_poll_seconds
+        self.rejoin_seconds = rejoin_seconds
+        self.timings = {}
+
+    def _wait_until_healthy(self, address: str, command: str):
+        deadline = time.monotonic() + self.health_timeout
+        while True:
+            try:
+                self.executor.run(address, command)
+                return
+            except (RuntimeError, subprocess.TimeoutExpired) as e:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"{address} not healthy after {self.health_timeout}s") from e
+            time.sleep(self.health_poll_seconds)
+
+    def roll_ship(self, ship: dict):
+        address = ship_address(ship)
+        started_at = time.monotonic()
+
+        self.executor.run(address, PAN_PAN_COMMAND)
+        time.sleep(self.drain_seconds)
+
+        loader_path = cargo_loader.CARGO_LOADER_SCRIPT_PATH
+        self.executor.run(address,
+                          f"cat > {loader_path} && chmod 0755 {loader_path} && {loader_path}",
+                          input=self.cargo_loader_script)
+        self.executor.run(address, RESTART_COMMAND)
+
+        if self.health_check_command is not None:
+            self._wait_until_healthy(address, self.health_check_command)
+        self.executor.run(address, ALL_CLEAR_COMMAND)
+        self._wait_until_healthy(address, self.marine_radio_check_command)
+        # the radio answering healthy doesn't mean the load balancer has seen it yet
+        time.sleep(self.rejoin_seconds)
+
+        self.timings[ship["name"]] = time.monotonic() - started_at
+
+    def roll(self, ships: list[dict]):
+        """
+        Rolls ships in batches, raises the errors of the first batch that fails
+        """
+        errors = []
+        failed = set()
+        ships = sorted(ships, key=lambda ship: ship["name"])
+
+        with ThreadPoolExecutor(max_workers=self.batch_size) as executor:
+            for batch_start in range(0, len(ships), self.batch_size):
+                batch = ships[batch_start:batch_start + self.batch_size]
+                futures = {executor.submit(self.roll_ship, ship): ship for ship in batch}
+                for future, ship in futures.items():
+                    if future.exception() is not None:
+                        e = future.exception()
+                        e.add_note(f"While rolling ship {ship['name']}, it's left drained")
+                        errors.append(e)
+                        failed.add(ship["name"])
+                if errors:
+                    break
+
+        for ship in ships:
+            if ship["name"] in failed:
+                status = "failed"
+            elif ship["name"] in self.timings:
+                status = f"ok in {self.timings[ship['name']]:.2f}s"
+            else:
+                status = "skipped"
+            print(f"ship {ship['name']}: {status}")
+
+        if errors:
+            raise ExceptionGroup(f"Rollout halted, {len(errors)} of {len(ships)} ships failed", errors)
@@ -0,0 +1,120 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from port import cargo_loader, chunking
+
+
+DEFAULT_GRACE_PERIOD = 7 * 24 * 60 * 60
+DEFAULT_KEEP_LAST = 10
+DEFAULT_CONCURRENCY = 4
+# delete_objects takes at most 1000 keys
+DELETE_BATCH_SIZE = 1000
+
+# its presence is what cargo_exists checks, so it goes first
+_CARGO_MARKER_FILE_NAME = "pad_lock_key.sh"
+
+def survey_yard(s3_client, bucket: str, yard_prefix: str) -> tuple[dict, dict]:
+    """
+    Lists the container yard under yard_prefix (every page of it) and returns
+    (cargo, chunks). Cargo is {cargo id: {"keys", "size", "last_modified"}}
+    with last_modified the newest of its objects (unix time), chunks is
+    {chunk sha256: {"key", "size", "last_modified"}}.
+    """
+    cargo = {}
+    chunks = {}
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=f"{yard_prefix}/"):
+        for stored_object in page.get("Contents", []):
+            key = stored_object["Key"]
+            last_modified = stored_object["LastModified"].timestamp()
+            directory, _, name = key[len(yard_prefix) + 1:].rpartition("/")
+            if directory == cargo_loader.CHUNK_DIRECTORY:
+                chunks[name] = {"key": key, "size": stored_object["Size"], "last_modified": last_modified}
+                continue
+
+            stored_cargo = cargo.setdefault(directory, {"keys": [], "size": 0, "last_modified": 0})
+            stored_cargo["keys"].append(key)
+            stored_cargo["size"] += stored_object["Size"]
+            stored_cargo["last_modified"] = max(stored_cargo["last_modified"], last_modified)
+    return cargo, chunks
+
+def referenced_chunks(s3_client, bucket: str, yard_prefix: str, cargo: dict) -> set[str]:
+    """
+    sha256 of every chunk the chunk indexes of cargo list
+    """
+    chunk_index_keys = [
+        key
+        for stored_cargo in cargo.values()
+        for key in stored_cargo["keys"]
+        if key.endswith(f"/{chunking.CHUNK_INDEX_FILE_NAME}")
+    ]
+
+    def read_chunk_index(key: str) -> list[str]:
+        chunk_index = json.load(s3_client.get_object(Bucket=bucket, Key=key)["Body"])
+        return [chunk["sha256"] for chunk in chunk_index["chunks"]]
+
+    with ThreadPoolExecutor(max_workers=DEFAULT_CONCURRENCY) as executor:
+        return {chunk_sha256 for chunk_sha256s in executor.map(read_chunk_index, chunk_index_keys)
+                for chunk_sha256 in chunk_sha256s}
+
+def plan_collection(cargo: dict,
+                    chunks: dict,
+                    referenced_cargo_ids: set[str],
+                    chunks_in_use,
+                    grace_period: float=DEFAULT_GRACE_PERIOD,
+                    keep_last: int=DEFAULT_KEEP_LAST,
+                    now: float=None) -> dict:
+    """
+    Picks what to delete: cargo no manifest references, that isn't among the
+    keep_last most recently stored and wasn't touched within grace_period
+    seconds (it may still be being stored or promoted). Chunks go once no kept
+    cargo uses them, after the same grace period. chunks_in_use is called
+    with the kept cargo and returns the chunks they use.
+
+    Returns {"cargo_ids", "chunks", "keys", "bytes"}
+    """
+    now = time.time() if now is None else now
+    newest_first = sorted(cargo, key=lambda cargo_id: cargo[cargo_id]["last_modified"], reverse=True)
+    kept = set(newest_first[:keep_last]) | (referenced_cargo_ids & set(cargo))
+
+    doomed_cargo_ids = [
+        cargo_id for cargo_id in newest_first
+        if cargo_id not in kept and now - cargo[cargo_id]["last_modified"] >= grace_period
+    ]
+    kept |= set(cargo) - set(doomed_cargo_ids)
+
+    used_chunks = chunks_in_use({cargo_id: cargo[cargo_id] for cargo_id in kept}) if chunks else set()
+    doomed_chunks = [
+        chunk_sha256 for chunk_sha256, chunk in chunks.items()
+        if chunk_sha256 not in used_chunks and now - chunk["last_modified"] >= grace_period
+    ]
+
+    # markers first so a partly collected cargo never looks whole to cargo_exists
+    doomed_keys = sorted(
+        (key for cargo_id in doomed_cargo_ids for key in cargo[cargo_id]["keys"]),
+        key=lambda key: not key.endswith(f"/{_CARGO_MARKER_FILE_NAME}")
+    ) + [chunks[chunk_sha256]["key"] for chunk_sha256 in doomed_chunks]
+
+    return {
+        "cargo_ids": doomed_cargo_ids,
+        "chunks": doomed_chunks,
+        "keys": doomed_keys,
+        "bytes": sum(cargo[cargo_id]["size"] for cargo_id in doomed_cargo_ids)
+                 + sum(chunks[chunk_sha256]["size"] for chunk_sha256 in doomed_chunks),
+    }
+
+def delete_keys(s3_client, bucket: str, keys: list[str]):
+    """
+    Deletes keys with one delete_objects call per DELETE_BATCH_SIZE keys, in
+    order, raises once every batch was tried if any key wasn't deleted
+    """
+    errors = []
+    for batch_start in range(0, len(keys), DELETE_BATCH_SIZE):
+        batch = keys[batch_start:batch_start + DELETE_BATCH_SIZE]
+        delete_res = s3_client.delete_objects(Bucket=bucket,
+                                              Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True})
+        errors += delete_res.get("Errors", [])
+    if errors:
+        raise RuntimeError(f"Failed to delete {len(errors)} of {len(keys)} objects, "
+                           f"first: {errors[0]['Key']} ({errors[0].get('Code')})")
@@ -0,0 +1,166 @@
+import csv
+import math
+import random
+
+
+# a droplet is created and booted before cloud-init starts loading cargo
+DEFAULT_DROPLET_BOOT_SECONDS = 60
+DEFAULT_EVALUATION_SECONDS = 60
+DEFAULT_COOLDOWN_SECONDS = 5 * 60
+DEFAULT_SHIP_CAPACITY = 100
+# share of memory a ship uses with no traffic (runtime, caches)
+DEFAULT_IDLE_MEMORY_UTILIZATION = 0.3
+
+class Ship():
+    """
+    Model of one droplet: requests per second it serves at full CPU, memory
+    it uses idle and how long it takes from create to serving, including
+    cloud-init loading cargo
+    """
+    def __init__(self,
+                 capacity: float=DEFAULT_SHIP_CAPACITY,
+                 idle_memory_utilization: float=DEFAULT_IDLE_MEMORY_UTILIZATION,
+                 boot_seconds: float=DEFAULT_DROPLET_BOOT_SECONDS,
+                 cargo_loading_seconds: float=0):
+        self.capacity = capacity
+        self.idle_memory_utilization = idle_memory_utilization
+        self.boot_seconds = boot_seconds + cargo_loading_seconds
+
+    def utilization(self, requests_per_ship: float) -> dict:
+        # CPU tops out at 1, a busier ship doesn't report more than 100%
+        cpu = min(1, requests_per_ship / self.capacity)
+        return {
+            "target_cpu_utilization": cpu,
+            "target_memory_utilization": self.idle_memory_utilization + (1 - self.idle_memory_utilization) * cpu,
+        }
+
+def load_trace(trace_file) -> list[float]:
+    """
+    Reads "<seconds>,<requests per second>" rows (a header row is skipped)
+    into requests per second for every second, each rate holds until the next
+    row
+    """
+    rows = []
+    for row in csv.reader(trace_file):
+        try:
+            rows.append((float(row[0]), float(row[1])))
+        except (ValueError, IndexError):
+            continue
+    rows.sort()
+    if not rows:
+        raise ValueError("Trace has no <seconds>,<requests per second> rows")
+
+    trace = []
+    for (seconds, rate), (next_seconds, _) in zip(rows, rows[1:] + [(rows[-1][0] + 1, None)]):
+        trace += [rate] * (int(next_seconds) - int(seconds))
+    return trace
+
+def synthetic_trace(hours: float=24,
+                    base_rate: float=200,
+                    peak_rate: float=1000,
+                    spikes: int=3,
+                    spike_rate: float=2000,
+                    spike_seconds: int=600,
+                    seed: int=1566) -> list[float]:
+    """
+    A day shaped trace, base_rate at night up to peak_rate mid day, with
+    spikes sudden jumps to spike_rate and 10% noise
+    """
+    rng = random.Random(seed)
+    seconds = int(hours * 3600)
+    trace = [
+        base_rate + (peak_rate - base_rate) * (1 - math.cos(2 * math.pi * second / 86400)) / 2
+        for second in range(seconds)
+    ]
+    for _ in range(spikes):
+        spike_start = rng.randrange(max(1, seconds - spike_seconds))
+        for second in range(spike_start, min(seconds, spike_start + spike_seconds)):
+            trace[second] = max(trace[second], spike_rate)
+    return [rate * rng.uniform(0.9, 1.1) for rate in trace]
+
+def _percentile(weighted_values: list[tuple[float, float]], percentile: float) -> float:
+    total = sum(weight for _, weight in weighted_values)
+    seen = 0
+    for value, weight in sorted(weighted_values):
+        seen += weight
+        if seen >= total * percentile:
+            return value
+    return 0
+
+def simulate(pool_config: dict,
+             trace: list[float],
+             ship: Ship,
+             evaluation_seconds: float=DEFAULT_EVALUATION_SECONDS,
+             cooldown_seconds: float=DEFAULT_COOLDOWN_SECONDS) -> dict:
+    """
+    Replays trace (requests per second, one per second) against an autoscale
+    pool with pool_config (the "config" of Fleet.autoscale_pool_body). Every
+    evaluation_seconds the pool sizes itself to bring the average utilization
+    of the last evaluation back to its targets, at most once per cooldown.
+    New ships serve after ship.boot_seconds. Requests ships can't serve queue.
+
+    Returns queueing latency percentiles, seconds over capacity, droplet hours
+    and the most ships at once
+    """
+    targets = {
+        key: pool_config[key]
+        for key in ["target_cpu_utilization", "target_memory_utilization"]
+        if key in pool_config
+    }
+    if not targets:
+        raise ValueError("Pool config has no utilization target")
+    min_instances = pool_config["min_instances"]
+    max_instances = pool_config["max_instances"]
+
+    # seconds each ship serves from, the pool starts at min_instances ready ships
+    ships = [0] * min_instances
+    backlog = 0
+    last_scaled_at = -cooldown_seconds
+    window = []
+    latencies = []
+    seconds_over_capacity = 0
+    ship_seconds = 0
+    most_ships = len(ships)
+
+    for second, rate in enumerate(trace):
+        ready = sum(1 for ready_at in ships if ready_at <= second)
+        capacity = ready * ship.capacity
+        if rate > capacity:
+            seconds_over_capacity += 1
+
+        backlog += rate
+        served = min(backlog, capacity)
+        backlog -= served
+        # what arrives now waits behind what's left of the backlog
+        latencies.append((backlog / capacity if capacity else float("inf"), rate))
+        ship_seconds += len(ships)
+
+        window.append(ship.utilization(rate / ready if ready else float("inf")))
+        if (second + 1) % evaluation_seconds == 0:
+            # ships still booting count towards desired, they aren't asked for again
+            desired = len(ships)
+            if ready:
+                desired = max(
+                    math.ceil(ready * sum(utilization[key] for utilization in window) / len(window) / target)
+                    for key, target in targets.items()
+                )
+            elif rate > 0:
+                desired = max(1, desired)
+            desired = min(max_instances, max(min_instances, desired))
+            if desired != len(ships) and second - last_scaled_at >= cooldown_seconds:
+                if desired > len(ships):
+                    ships += [second + ship.boot_seconds] * (desired - len(ships))
+                else:
+                    # booting ships are the cheapest to drop
+                    ships = sorted(ships)[:desired]
+                last_scaled_at = second
+                most_ships = max(most_ships, len(ships))
+            window = []
+
+    return {
+        "p50_queueing_s": round(_percentile(latencies, 0.5), 3),
+        "p99_queueing_s": round(_percentile(latencies, 0.99), 3),
+        "over_capacity_s": seconds_over_capacity,
+        "droplet_hours": round(ship_seconds / 3600, 1),
+        "most_ships": most_ships,
+    }
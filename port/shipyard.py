@@ -0,0 +1,77 @@
+import time
+
+from port import cargo_loader
+
+
+DEFAULT_BAKE_TIMEOUT = 30 * 60
+DEFAULT_BAKE_POLL_SECONDS = 10
+
+# marks cargo loaded, the builder only powers off (and is only snapshotted) once it's there
+_BAKED_MARKER_PATH = "/cargo_bay/.baked"
+
+# a ship booted from a baked snapshot already has its packages, cargo and
+# supervisor programs. It only loads cargo added to its manifests since the
+# snapshot was baked, then starts them.
+BAKED_CLOUD_CONFIG = f"""
+#cloud-config
+write_files:
+{{cargo_loader_write_file}}
+runcmd:
+  - {cargo_loader.CARGO_LOADER_SCRIPT_PATH}
+  - service supervisor start
+  - supervisorctl reread
+  - supervisorctl update
+""".strip()
+
+def render_baked_cloud_config(cargo_loader_script: str) -> str:
+    return BAKED_CLOUD_CONFIG.replace("{cargo_loader_write_file}",
+                                      cargo_loader.render_cargo_loader_write_file(cargo_loader_script))
+
+def render_bake_cloud_config(cloud_config: str, cargo_loader_script_path: str) -> str:
+    """
+    Turns a fleet's cloud-config into one for a builder droplet, which
+    powers off once all cargo is loaded
+    """
+    loader_step = f"  - {cargo_loader_script_path}\n"
+    if loader_step not in cloud_config:
+        raise ValueError("cloud-config doesn't run the cargo loader")
+    return cloud_config.replace(loader_step, f"  - {cargo_loader_script_path} && touch {_BAKED_MARKER_PATH}\n") + f"""
+power_state:
+  mode: poweroff
+  condition: test -f {_BAKED_MARKER_PATH}"""
+
+def _wait_for(check, what: str, timeout: float, poll_seconds: float):
+    deadline = time.monotonic() + timeout
+    while not check():
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"Gave up waiting for {what} after {timeout}s")
+        time.sleep(poll_seconds)
+
+def bake_snapshot(pydo_client,
+                  droplet_body: dict,
+                  snapshot_name: str,
+                  timeout: float=DEFAULT_BAKE_TIMEOUT,
+                  poll_seconds: float=DEFAULT_BAKE_POLL_SECONDS):
+    """
+    Creates a builder droplet from droplet_body (with a bake cloud-config as
+    user_data), waits for it to power itself off, snapshots it as
+    snapshot_name and destroys it, whether baking worked or not.
+    """
+    builder = pydo_client.droplets.create(body=droplet_body)["droplet"]
+    try:
+        def builder_powered_off():
+            droplet = pydo_client.droplets.get(builder["id"])["droplet"]
+            return droplet["status"] == "off"
+        # cargo that fails to load leaves the builder running until timeout
+        _wait_for(builder_powered_off, f"builder {droplet_body['name']} to load cargo and power off", timeout, poll_seconds)
+
+        action = pydo_client.droplet_actions.post(builder["id"], body={"type": "snapshot", "name": snapshot_name})["action"]
+
+        def snapshot_taken():
+            status = pydo_client.droplet_actions.get(builder["id"], action["id"])["action"]["status"]
+            if status == "errored":
+                raise RuntimeError(f"Snapshot {snapshot_name} failed")
+            return status == "completed"
+        _wait_for(snapshot_taken, f"snapshot {snapshot_name}", timeout, poll_seconds)
+    finally:
+        pydo_client.droplets.destroy(builder["id"])
@@ -0,0 +1,157 @@
+import gzip
+import io
+import os
+import queue
+import tarfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+DEFAULT_BLOCK_SIZE = 4 * 1024 * 1024
+DEFAULT_COMPRESSION_THREADS = os.cpu_count() or 1
+DEFAULT_COMPRESS_LEVEL = 6
+
+def _walk(directory: str, items: list[str]=None):
+    """
+    Yields (path, arcname) for items (paths relative to directory, all of it
+    by default) and everything under them in a stable order
+    """
+    if items is None:
+        items = sorted(os.listdir(directory))
+    for item in items:
+        item_path = os.path.join(directory, item)
+        yield item_path, os.path.relpath(item_path, directory)
+        if os.path.isdir(item_path) and not os.path.islink(item_path):
+            for dir_path, dir_names, file_names in os.walk(item_path):
+                dir_names.sort()
+                for name in dir_names + sorted(file_names):
+                    path = os.path.join(dir_path, name)
+                    yield path, os.path.relpath(path, directory)
+
+def _normalize(tar_info: tarfile.TarInfo, mtime: int) -> tarfile.TarInfo:
+    # the same tree always packs to the same bytes, whoever packs it and whenever
+    tar_info.uid = tar_info.gid = 0
+    tar_info.uname = tar_info.gname = ""
+    tar_info.mtime = mtime
+    return tar_info
+
+class _BlockWriter():
+    """
+    File-like sink for tarfile that cuts what's written into blocks
+    """
+    def __init__(self, on_block, block_size: int):
+        self.on_block = on_block
+        self.block_size = block_size
+        self.buffer = bytearray()
+
+    def write(self, data: bytes) -> int:
+        self.buffer += data
+        while len(self.buffer) >= self.block_size:
+            self.on_block(bytes(self.buffer[:self.block_size]))
+            del self.buffer[:self.block_size]
+        return len(data)
+
+    def close(self):
+        if self.buffer:
+            self.on_block(bytes(self.buffer))
+            self.buffer.clear()
+
+class PackedCargo(io.RawIOBase):
+    """
+    Readable stream of a directory packed as a deterministic tar and gzip
+    compressed in independent blocks on several threads. The blocks are
+    concatenated gzip members, which gzip, tar -xz and Python's gzip module
+    read as one stream. Nothing is written to disk and at most about
+    2 * compression_threads blocks are held in memory.
+    """
+    def __init__(self,
+                 directory: str,
+                 items: list[str]=None,
+                 block_size: int=DEFAULT_BLOCK_SIZE,
+                 compression_threads: int=DEFAULT_COMPRESSION_THREADS,
+                 compresslevel: int=DEFAULT_COMPRESS_LEVEL,
+                 mtime: int=None):
+        super().__init__()
+        if not os.path.isdir(directory):
+            raise ValueError(f"{directory} is not a directory")
+
+        self.directory = directory
+        self.items = items
+        self.block_size = block_size
+        self.compresslevel = compresslevel
+        # SOURCE_DATE_EPOCH is the usual way to pin timestamps in reproducible builds
+        self.mtime = int(os.environ.get("SOURCE_DATE_EPOCH", 0)) if mtime is None else mtime
+
+        self._executor = ThreadPoolExecutor(max_workers=compression_threads)
+        # compressed block futures in order, None marks the end
+        self._blocks = queue.Queue(maxsize=2 * compression_threads)
+        self._closing = threading.Event()
+        self._current = memoryview(b"")
+        self._done = False
+
+        self._packer = threading.Thread(target=self._pack, daemon=True)
+        self._packer.start()
+
+    def _put(self, item):
+        while not self._closing.is_set():
+            try:
+                self._blocks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+        raise EOFError("Packed cargo closed before it was fully read")
+
+    def _pack(self):
+        try:
+            writer = _BlockWriter(
+                lambda block: self._put(self._executor.submit(gzip.compress, block, self.compresslevel, mtime=0)),
+                self.block_size
+            )
+            with tarfile.open(fileobj=writer, mode="w|", format=tarfile.PAX_FORMAT) as tar:
+                for path, arcname in _walk(self.directory, self.items):
+                    tar.add(path, arcname, recursive=False, filter=lambda tar_info: _normalize(tar_info, self.mtime))
+            writer.close()
+            self._put(None)
+        except EOFError:
+            pass
+        except BaseException as e:
+            try:
+                self._put(e)
+            except EOFError:
+                pass
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._current and not self._done:
+            block = self._blocks.get()
+            if block is None:
+                self._done = True
+            elif isinstance(block, BaseException):
+                self._done = True
+                raise block
+            else:
+                self._current = memoryview(block.result())
+
+        size = min(len(buffer), len(self._current))
+        buffer[:size] = self._current[:size]
+        self._current = self._current[size:]
+        return size
+
+    def close(self):
+        if not self.closed:
+            self._closing.set()
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        super().close()
+
+def pack_cargo(directory: str, output: io.BufferedIOBase, **packed_cargo_kwargs) -> int:
+    """
+    Packs directory into output, returns bytes written
+    """
+    size = 0
+    with PackedCargo(directory, **packed_cargo_kwargs) as packed_cargo:
+        while chunk := packed_cargo.read(DEFAULT_BLOCK_SIZE):
+            output.write(chunk)
+            size += len(chunk)
+    return size
@@ -1,10 +1,18 @@
+from __future__ import annotations
+
+import functools
 import os
 import subprocess
+import threading
+from typing import TYPE_CHECKING
 
-from dotenv import load_dotenv
+from port.logbook import LOGBOOK
 
-import boto3
-import pydo
+# boto3, pydo and dotenv are imported where they're used so commands that
+# never talk to DigitalOcean don't pay for importing them
+if TYPE_CHECKING:
+    import boto3
+    import pydo
 
 
 _DOT_ENV_FILEPATH = os.path.abspath(
@@ -12,16 +20,49 @@ _DOT_ENV_FILEPATH = os.path.abspath(
         os.path.dirname(__file__), '../.env'
 ))
 
+# large enough for concurrent multipart uploads to each get a connection
+_S3_MAX_POOL_CONNECTIONS = 32
+
+_s3_clients_lock = threading.Lock()
+
+@functools.cache
+def load_dot_env():
+    from dotenv import load_dotenv
+
+    load_dotenv(_DOT_ENV_FILEPATH)
+
+@functools.cache
+def _s3_session() -> boto3.session.Session:
+    import boto3
+
+    return boto3.session.Session()
+
+@functools.cache
+def _create_s3_client(region_name, endpoint_url, access_key, secret_access_key) -> boto3.client:
+    from botocore.config import Config
+
+    s3_client = _s3_session().client('s3',
+                                     region_name=region_name,
+                                     endpoint_url=endpoint_url,
+                                     aws_access_key_id=access_key,
+                                     aws_secret_access_key=secret_access_key,
+                                     config=Config(max_pool_connections=_S3_MAX_POOL_CONNECTIONS,
+                                                   # botocore's adaptive mode backs off with jitter and
+                                                   # rate limits the client once Spaces starts throttling
+                                                   retries={"mode": "adaptive", "max_attempts": 10}))
+    return LOGBOOK.instrument_s3_client(s3_client)
+
 def create_s3_client(region_name, endpoint_url, access_key, secret_access_key) -> boto3.client:
-    s3_session = boto3.session.Session()
-    return s3_session.client('s3',
-                             region_name=region_name,
-                             endpoint_url=endpoint_url,
-                             aws_access_key_id=access_key,
-                             aws_secret_access_key=secret_access_key)
+    """
+    Clients are memoized per endpoint and credentials and share one boto3
+    session, so every Port in the process reuses the same connection pool
+    """
+    # boto3 sessions aren't thread safe, the clients they create are
+    with _s3_clients_lock:
+        return _create_s3_client(region_name, endpoint_url, access_key, secret_access_key)
 
 def create_s3_client_from_dot_env(region_name, endpoint_url) -> boto3.client:
-    load_dotenv(_DOT_ENV_FILEPATH)
+    load_dot_env()
 
     return create_s3_client(
         region_name=region_name,
@@ -31,19 +72,53 @@ def create_s3_client_from_dot_env(region_name, endpoint_url) -> boto3.client:
     )
 
 def create_pydo_client() -> pydo.Client:
-    load_dotenv(_DOT_ENV_FILEPATH)
+    import pydo
+
+    load_dot_env()
+
+    # retries are left to governor.GovernedClient
+    return pydo.Client(os.environ["DIGITALOCEAN_TOKEN"], retry_total=0)
+
+class LazyClient():
+    """
+    Class attribute that builds its client with create_client on first access
+    and reuses it after. Assigning the attribute on the class replaces it.
+    """
+    def __init__(self, create_client):
+        self.create_client = create_client
+        self.client = None
+        self.lock = threading.Lock()
+
+    def __get__(self, instance, owner):
+        if self.client is None:
+            with self.lock:
+                if self.client is None:
+                    self.client = self.create_client()
+        return self.client
 
-    return pydo.Client(os.environ["DIGITALOCEAN_TOKEN"])
+def build_static_go_binary(go_file_path: str, output_file_path: str):
+    """
+    Builds a reproducible, statically linked linux/amd64 binary so the same
+    source always gives the same bytes (and content addressed cargo id)
+    """
+    with LOGBOOK.timed("subprocess.go-build"):
+        subprocess.run(['go', 'build', '-trimpath', '-ldflags=-s -w -buildid=', '-o', output_file_path, go_file_path],
+                       check=True,
+                       env={**os.environ, "CGO_ENABLED": "0", "GOOS": "linux", "GOARCH": "amd64"})
 
+# every fleet with a $LOCAL key asks for it, the answer doesn't change during a run
+@functools.cache
 def get_local_machine_ssh_key_fingerprint():
-    ssh_public_key_ls_cmd = subprocess.check_output(['ls ~/.ssh/*.pub'], shell=True, text=True)
+    with LOGBOOK.timed("subprocess.ls-ssh-keys"):
+        ssh_public_key_ls_cmd = subprocess.check_output(['ls ~/.ssh/*.pub'], shell=True, text=True)
     ssh_public_key_files = ssh_public_key_ls_cmd.splitlines()
     if len(ssh_public_key_files) > 1:
         raise ValueError(f'Multiple public key files {ssh_public_key_files}')
     
     ssh_public_key_file = ssh_public_key_files[0]
 
-    ssh_public_key_fingerprint_cmd = subprocess.check_output([f'ssh-keygen -l -E md5 -f {ssh_public_key_file}'], shell=True, text=True)
+    with LOGBOOK.timed("subprocess.ssh-keygen"):
+        ssh_public_key_fingerprint_cmd = subprocess.check_output([f'ssh-keygen -l -E md5 -f {ssh_public_key_file}'], shell=True, text=True)
     ssh_public_key_fingerprint = ssh_public_key_fingerprint_cmd[8:55]
 
     return ssh_public_key_fingerprint
\ No newline at end of file
@@ -0,0 +1,100 @@
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+# the port package, its CLIs and benchmark.py live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture(scope="session")
+def go_cache():
+    if shutil.which("go") is None:
+        pytest.skip("go is needed to build the marine radio")
+    return subprocess.run(["go", "env", "GOCACHE"], capture_output=True, text=True, check=True).stdout.strip()
+
+@pytest.fixture
+def delays(monkeypatch):
+    """
+    Seconds of every time.sleep, which returns at once
+    """
+    import time
+
+    delays = []
+    monkeypatch.setattr(time, "sleep", delays.append)
+    return delays
+
+@pytest.fixture
+def s3_client():
+    """
+    moto S3 client with the "ports" bucket
+    """
+    pytest.importorskip("moto")
+    import boto3
+    from moto import mock_aws
+
+    import port
+
+    with mock_aws():
+        s3_client = boto3.client("s3", region_name="us-east-1")
+        s3_client.create_bucket(Bucket="ports")
+        # manifests cached by an earlier moto backend
+        port._cargo_manifest_cache.clear()
+        yield s3_client
+
+@pytest.fixture
+def new_port(s3_client):
+    """
+    new_port(replicas) returns a port with only a container yard, on s3_client
+    """
+    import port
+
+    def new_port(replicas: list=[]) -> port.Port:
+        harbor = port.Port.__new__(port.Port)
+        harbor.s3_client = s3_client
+        harbor.port_name = "harbor"
+        harbor.ocean = "nyc3"
+        harbor.sea = "yard"
+        harbor.replicas = replicas
+        return harbor
+    return new_port
+
+@pytest.fixture
+def harbor(monkeypatch, tmp_path, go_cache):
+    """
+    Deploys ports against moto and benchmark.FakeDigitalOcean,
+    harbor.new_port(port_org) returns a deployed port
+    """
+    pytest.importorskip("moto")
+    import types
+
+    import boto3
+    from moto import mock_aws
+
+    import benchmark
+    import port
+
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    monkeypatch.setenv("GOCACHE", go_cache)
+    monkeypatch.setenv("DIGITALOCEAN_TOKEN", "test")
+    # the default cargo index path is read at import, keep moto's cargo out of the real one
+    monkeypatch.setattr(port.CargoIndex.__init__, "__defaults__", (str(tmp_path / "cargo_index.json"), port.CargoIndex.DEFAULT_TTL))
+    with mock_aws():
+        s3_client = boto3.client("s3", region_name="us-east-1")
+        s3_client.create_bucket(Bucket="ports")
+        # manifests cached by an earlier moto backend
+        port._cargo_manifest_cache.clear()
+        digital_ocean = benchmark.FakeDigitalOcean(latency=0, requests_per_minute=100000)
+        monkeypatch.setattr(port.Port, "pydo_client", port.GovernedClient(digital_ocean, requests_per_minute=100000))
+
+        def new_port(port_org: dict=None, **kwargs) -> port.Port:
+            port_org = port_org or benchmark._e2e_port_org(1)
+            return port.Port(port_org["ocean"], port_org["sea"], port_org["port_name"],
+                             cargo_manifests=port_org.get("cargo_manifests", {}),
+                             fleet_orgs=port_org.get("fleets", {}),
+                             inventory=port.Inventory(port.Port.pydo_client, cache_file_path=os.devnull),
+                             s3_client=s3_client,
+                             **kwargs)
+
+        yield types.SimpleNamespace(digital_ocean=digital_ocean, s3_client=s3_client, new_port=new_port)
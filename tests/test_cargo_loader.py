@@ -0,0 +1,136 @@
+import functools
+import http.server
+import io
+import random
+import shutil
+import subprocess
+import threading
+
+import pytest
+
+import port
+from port import cargo_loader, cdn, chunking
+
+
+CDN_URL = "https://yard.nyc3.cdn.digitaloceanspaces.com/ports"
+
+def render_cargo_loader(cargo_ids: list[str], cargo_manifest_names: list[str]=[]) -> str:
+    return cargo_loader.render_cargo_loader("nyc3", "yard", "harbor", cargo_ids, cargo_manifest_names)
+
+def test_rendered_loader_is_valid_sh(tmp_path):
+    loader_path = tmp_path / "cargo_loader.sh"
+    loader_path.write_text(render_cargo_loader(["cargo-1", "cargo 2; rm -rf /"], ["web", "worker"]))
+
+    res = subprocess.run(["sh", "-n", str(loader_path)], capture_output=True, text=True)
+
+    assert res.returncode == 0, res.stderr
+
+def test_rendered_loader_write_file_keeps_the_script_intact():
+    script = render_cargo_loader(["cargo-1"])
+    write_file = cargo_loader.render_cargo_loader_write_file(script)
+
+    assert write_file.startswith(f"  - path: {cargo_loader.CARGO_LOADER_SCRIPT_PATH}\n")
+    content = write_file.split("content: |\n", 1)[1]
+    assert "\n".join(line[len("      "):] for line in content.splitlines()) == script.rstrip("\n")
+
+class _YardHandler(http.server.SimpleHTTPRequestHandler):
+    requests = None
+
+    def log_message(self, format, *args):
+        self.requests.append(self.path)
+
+@pytest.fixture
+def cargo_yard(tmp_path):
+    """
+    Cargo stored by Port.store_cargo (into moto) and served over http from
+    a local directory laid out like the CDN
+    """
+    pytest.importorskip("moto")
+    import boto3
+    from moto import mock_aws
+
+    yard_path = tmp_path / "yard"
+    with mock_aws():
+        s3_client = boto3.client("s3", region_name="us-east-1")
+        s3_client.create_bucket(Bucket="ports")
+        harbor = port.Port.__new__(port.Port)
+        harbor.s3_client = s3_client
+        harbor.port_name = "harbor"
+        harbor.ocean = "nyc3"
+        harbor.sea = "yard"
+        harbor.replicas = []
+
+        def store(cargo: bytes, unloaded_path: str, **kwargs) -> str:
+            pad_lock_key = f"cp cargo {unloaded_path}\n".encode()
+            return harbor.store_cargo(io.BytesIO(cargo), io.BytesIO(pad_lock_key), **kwargs)
+
+        stored = {}
+        compressible = b"".join(b"log line %d of some text\n" % i for i in range(100000))
+        incompressible = random.Random(1566).randbytes(1024 * 1024)
+        stored["gz"] = (store(compressible, tmp_path / "gz"), compressible)
+        stored["whole"] = (store(incompressible, tmp_path / "whole"), incompressible)
+        stored["chunked"] = (store(incompressible + b"edited", tmp_path / "chunked", chunked=True), incompressible + b"edited")
+        harbor.update_cargo_mainfest("web", [stored["whole"][0]])
+
+        for page in s3_client.get_paginator("list_objects_v2").paginate(Bucket="ports"):
+            for stored_object in page["Contents"]:
+                object_path = yard_path / "ports" / stored_object["Key"]
+                object_path.parent.mkdir(parents=True, exist_ok=True)
+                object_path.write_bytes(s3_client.get_object(Bucket="ports", Key=stored_object["Key"])["Body"].read())
+
+    handler = type("YardHandler", (_YardHandler,), {"requests": []})
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(handler, directory=str(yard_path)))
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    try:
+        yield {"url": f"http://127.0.0.1:{server.server_port}/ports", "stored": stored, "requests": handler.requests}
+    finally:
+        server.shutdown()
+        server.server_close()
+
+@pytest.mark.skipif(any(shutil.which(tool) is None for tool in ["curl", "sha256sum", "python3"]),
+                    reason="the loader needs curl, sha256sum and python3")
+def test_loader_loads_whole_gzipped_and_chunked_cargo(cargo_yard, tmp_path):
+    cargo_bay = tmp_path / "cargo_bay"
+    stored = cargo_yard["stored"]
+    script = render_cargo_loader([stored["gz"][0], stored["chunked"][0]], ["web"])
+    loader_path = tmp_path / "cargo_loader.sh"
+    loader_path.write_text(script.replace(CDN_URL, cargo_yard["url"]).replace("/cargo_bay", str(cargo_bay)))
+
+    res = subprocess.run(["sh", str(loader_path)], capture_output=True, text=True, timeout=120)
+
+    assert res.returncode == 0, res.stderr
+    for name, (cargo_id, cargo) in stored.items():
+        assert (tmp_path / name).read_bytes() == cargo
+        assert (cargo_bay / cargo_id / ".loaded").exists()
+    requests = cargo_yard["requests"]
+    gz_cargo_id = stored["gz"][0]
+    assert f"/ports/harbor/container_yard/{gz_cargo_id}/{cdn.PRECOMPRESSED_CARGO_FILE_NAME}" in requests
+    assert f"/ports/harbor/container_yard/{gz_cargo_id}/cargo" not in requests
+    assert f"/ports/harbor/container_yard/{stored['chunked'][0]}/{chunking.CHUNK_INDEX_FILE_NAME}" in requests
+    assert any(request.startswith(f"/ports/harbor/container_yard/{cargo_loader.CHUNK_DIRECTORY}/") for request in requests)
+    assert f"/ports/harbor/container_yard/{stored['whole'][0]}/cargo" in requests
+
+    # loaded cargo isn't fetched again, only the manifests are read
+    requests.clear()
+    res = subprocess.run(["sh", str(loader_path)], capture_output=True, text=True, timeout=120)
+    assert res.returncode == 0, res.stderr
+    assert requests == ["/ports/harbor/cargo_manifests/web/manifest.json"]
+
+@pytest.mark.skipif(any(shutil.which(tool) is None for tool in ["curl", "sha256sum", "python3"]),
+                    reason="the loader needs curl, sha256sum and python3")
+def test_loader_fails_on_corrupt_cargo(cargo_yard, tmp_path):
+    cargo_bay = tmp_path / "cargo_bay"
+    cargo_id = cargo_yard["stored"]["whole"][0]
+    script = render_cargo_loader([cargo_id])
+    loader_path = tmp_path / "cargo_loader.sh"
+    loader_path.write_text(script.replace(CDN_URL, cargo_yard["url"]).replace("/cargo_bay", str(cargo_bay)))
+    served_cargo = tmp_path / "yard" / "ports" / "harbor" / "container_yard" / cargo_id / "cargo"
+    served_cargo.write_bytes(b"tampered" + served_cargo.read_bytes()[8:])
+
+    res = subprocess.run(["sh", str(loader_path)], capture_output=True, text=True, timeout=120)
+
+    assert res.returncode != 0
+    assert f"cargo {cargo_id} failed checksum" in res.stderr
+    assert not (cargo_bay / cargo_id / ".loaded").exists()
+    assert not (tmp_path / "whole").exists()
@@ -0,0 +1,63 @@
+import io
+import random
+
+from port import cdn
+
+
+def yard_objects(s3_client, prefix: str="harbor/") -> dict[str, tuple[str, str]]:
+    """
+    {key: (ContentType, CacheControl)} of every object under prefix
+    """
+    objects = {}
+    for stored_object in s3_client.list_objects_v2(Bucket="ports", Prefix=prefix).get("Contents", []):
+        head = s3_client.head_object(Bucket="ports", Key=stored_object["Key"])
+        objects[stored_object["Key"]] = (head["ContentType"], head["CacheControl"])
+    return objects
+
+def test_stored_cargo_is_laid_out_immutable_with_content_types(s3_client, new_port):
+    cargo_id = new_port().store_cargo(io.BytesIO(b"compressible " * 10000), io.BytesIO(b"true\n"))
+
+    immutable = cdn.IMMUTABLE_CACHE_CONTROL
+    assert yard_objects(s3_client) == {
+        f"harbor/container_yard/{cargo_id}/cargo": ("application/octet-stream", immutable),
+        f"harbor/container_yard/{cargo_id}/cargo.gz": ("application/gzip", immutable),
+        f"harbor/container_yard/{cargo_id}/cargo.sha256": ("text/plain; charset=utf-8", immutable),
+        f"harbor/container_yard/{cargo_id}/pad_lock_key.sh": ("text/x-shellscript; charset=utf-8", immutable),
+    }
+
+def test_incompressible_cargo_has_no_gzipped_variant(s3_client, new_port):
+    cargo_id = new_port().store_cargo(io.BytesIO(random.Random(1).randbytes(4096)), io.BytesIO(b"true\n"))
+
+    assert f"harbor/container_yard/{cargo_id}/cargo.gz" not in yard_objects(s3_client)
+
+def test_chunked_cargo_shares_immutable_chunks(s3_client, new_port):
+    cargo_id = new_port().store_cargo(io.BytesIO(b"chunked cargo"), io.BytesIO(b"true\n"), chunked=True)
+
+    objects = yard_objects(s3_client)
+    chunks = {key: headers for key, headers in objects.items() if key.startswith("harbor/container_yard/chunks/")}
+    assert list(chunks.values()) == [("application/octet-stream", cdn.IMMUTABLE_CACHE_CONTROL)]
+    assert objects[f"harbor/container_yard/{cargo_id}/chunk_index.json"] == ("application/json", cdn.IMMUTABLE_CACHE_CONTROL)
+    assert f"harbor/container_yard/{cargo_id}/cargo" not in objects
+
+def test_manifests_are_cached_briefly(s3_client, new_port):
+    new_port().append_cargo("web", ["cargo"])
+
+    assert yard_objects(s3_client, "harbor/cargo_manifests/") == {
+        "harbor/cargo_manifests/web/manifest.json": (cdn.MANIFEST_CONTENT_TYPE, cdn.MANIFEST_CACHE_CONTROL),
+    }
+
+def test_failed_warm_up_is_reported_on_stderr(s3_client, new_port, monkeypatch, capsys):
+    warmed_urls = []
+    def warm_up(urls: list[str]) -> dict:
+        warmed_urls.extend(urls)
+        return {url: 503 for url in urls}
+    monkeypatch.setattr(cdn, "warm_up", warm_up)
+
+    cargo_id = new_port().store_cargo(io.BytesIO(random.Random(1).randbytes(4096)), io.BytesIO(b"true\n"), warm_cdn=True)
+
+    assert [url.rsplit("/", 2)[1:] for url in warmed_urls] == [
+        [cargo_id, "cargo.sha256"], [cargo_id, "pad_lock_key.sh"], [cargo_id, "cargo"]
+    ]
+    captured = capsys.readouterr()
+    assert captured.out == ""
+    assert f"CDN warm-up failed for 3 of 3 objects, first: {warmed_urls[0]}" in captured.err
@@ -0,0 +1,58 @@
+import io
+import random
+
+import pytest
+
+from port import chunking
+
+
+SMALL_CHUNKS = {"min_size": 1024, "avg_size": 4096, "max_size": 16384}
+
+def reference_cut_point(data: bytes, min_size: int, avg_size: int, max_size: int) -> int:
+    # the byte at a time gear hash chunking._cut_point vectorizes
+    size = len(data)
+    if size <= min_size:
+        return size
+    end = min(size, max_size)
+    normal = min(end, avg_size)
+    mask_small, mask_large = chunking._masks(avg_size)
+    hash = 0
+    for i in range(min_size, end):
+        hash = ((hash << 1) + chunking._GEAR[data[i]]) & 0xFFFFFFFFFFFFFFFF
+        if not hash & (mask_small if i < normal else mask_large):
+            return i + 1
+    return end
+
+def reference_chunks(data: bytes, **chunk_kwargs) -> list[bytes]:
+    chunks = []
+    while data:
+        cut = reference_cut_point(data, **chunk_kwargs)
+        chunks.append(data[:cut])
+        data = data[cut:]
+    return chunks
+
+@pytest.mark.parametrize("data", [
+    random.Random(1).randbytes(200_000),
+    bytes(50_000),
+    b"".join(b"log line %d\n" % i for i in range(20_000)),
+    b"tiny",
+], ids=["random", "zeros", "text", "tiny"])
+def test_chunks_cut_where_the_byte_at_a_time_gear_hash_does(data):
+    assert list(chunking.chunk_cargo(io.BytesIO(data), **SMALL_CHUNKS)) == reference_chunks(data, **SMALL_CHUNKS)
+
+def test_cut_points_span_hash_blocks(monkeypatch):
+    # blocks smaller than the 64 byte hash window still see the bytes before them
+    monkeypatch.setattr(chunking, "_CUT_BLOCK_SIZE", 37)
+    data = random.Random(2).randbytes(100_000)
+
+    assert list(chunking.chunk_cargo(io.BytesIO(data), **SMALL_CHUNKS)) == reference_chunks(data, **SMALL_CHUNKS)
+
+def test_an_edit_only_changes_the_chunks_around_it():
+    data = random.Random(3).randbytes(400_000)
+    edited = data[:200_000] + b"edit" + data[200_000:]
+
+    chunks = list(chunking.chunk_cargo(io.BytesIO(data), **SMALL_CHUNKS))
+    edited_chunks = list(chunking.chunk_cargo(io.BytesIO(edited), **SMALL_CHUNKS))
+
+    assert b"".join(edited_chunks) == edited
+    assert len(set(edited_chunks) - set(chunks)) <= 2
@@ -0,0 +1,81 @@
+import hashlib
+import io
+import random
+
+import pytest
+from botocore.exceptions import ClientError
+
+from port import crane
+
+
+class FlakySpaces():
+    """
+    S3 client whose upload_part fails the next failures[part_number] times
+    for each part, then goes through
+    """
+    def __init__(self, s3_client, failures: dict[int, int]):
+        self.s3_client = s3_client
+        self.failures = dict(failures)
+        self.attempts = []
+
+    def __getattr__(self, name: str):
+        return getattr(self.s3_client, name)
+
+    def upload_part(self, **kwargs):
+        self.attempts.append(kwargs["PartNumber"])
+        if self.failures.get(kwargs["PartNumber"], 0):
+            self.failures[kwargs["PartNumber"]] -= 1
+            raise ClientError({"Error": {"Code": "InternalError", "Message": "part lost"}}, "UploadPart")
+        return self.s3_client.upload_part(**kwargs)
+
+def cargo_of(part_count: float) -> bytes:
+    return random.Random(1).randbytes(int(crane.MIN_PART_SIZE * part_count))
+
+def stored(s3_client, key: str) -> bytes:
+    return s3_client.get_object(Bucket="ports", Key=key)["Body"].read()
+
+def test_cargo_bigger_than_a_part_goes_up_in_parts(s3_client):
+    cargo = cargo_of(2.5)
+
+    hoist_res = crane.hoist_cargo(s3_client, io.BytesIO(cargo), "ports", "cargo",
+                                  part_size=crane.MIN_PART_SIZE, concurrency=2, ContentType="application/octet-stream")
+
+    assert hoist_res == {"size": len(cargo), "parts": 3, "sha256": hashlib.sha256(cargo).hexdigest()}
+    assert stored(s3_client, "cargo") == cargo
+    assert s3_client.head_object(Bucket="ports", Key="cargo")["ContentType"] == "application/octet-stream"
+
+def test_cargo_within_a_part_is_put_whole(s3_client):
+    flaky_spaces = FlakySpaces(s3_client, {})
+
+    hoist_res = crane.hoist_cargo(flaky_spaces, io.BytesIO(b"cargo"), "ports", "cargo", part_size=crane.MIN_PART_SIZE)
+
+    assert hoist_res["parts"] == 1
+    assert flaky_spaces.attempts == []
+    assert stored(s3_client, "cargo") == b"cargo"
+
+def test_failed_parts_are_retried_after_a_growing_jittered_delay(s3_client, delays):
+    cargo = cargo_of(2.5)
+    flaky_spaces = FlakySpaces(s3_client, {2: 2})
+
+    crane.hoist_cargo(flaky_spaces, io.BytesIO(cargo), "ports", "cargo",
+                      part_size=crane.MIN_PART_SIZE, part_retries=2, part_retry_backoff=1)
+
+    assert sorted(flaky_spaces.attempts) == [1, 2, 2, 2, 3]
+    assert len(delays) == 2
+    assert 0 <= delays[0] <= 1 and 0 <= delays[1] <= 2
+    assert stored(s3_client, "cargo") == cargo
+
+def test_a_part_out_of_retries_aborts_the_upload(s3_client, delays):
+    flaky_spaces = FlakySpaces(s3_client, {2: 3})
+
+    with pytest.raises(ClientError):
+        crane.hoist_cargo(flaky_spaces, io.BytesIO(cargo_of(2.5)), "ports", "cargo",
+                          part_size=crane.MIN_PART_SIZE, part_retries=2)
+
+    assert flaky_spaces.attempts.count(2) == 3
+    assert s3_client.list_multipart_uploads(Bucket="ports").get("Uploads", []) == []
+    assert "Contents" not in s3_client.list_objects_v2(Bucket="ports")
+
+def test_part_sizes_below_the_s3_minimum_are_refused(s3_client):
+    with pytest.raises(ValueError):
+        crane.hoist_cargo(s3_client, io.BytesIO(b"cargo"), "ports", "cargo", part_size=crane.MIN_PART_SIZE - 1)
@@ -0,0 +1,120 @@
+import io
+
+import pytest
+
+import port
+from port import ferry
+
+
+class OtherSpaces():
+    """
+    S3 client of Spaces in another ocean: the same moto backend, with the
+    port's bucket stood in for by a bucket of its own
+    """
+    def __init__(self, s3_client, bucket: str):
+        self.s3_client = s3_client
+        self.bucket = bucket
+
+    def __getattr__(self, name: str):
+        operation = getattr(self.s3_client, name)
+        if not callable(operation):
+            return operation
+
+        def call(**kwargs):
+            if kwargs.get("Bucket") == "ports":
+                kwargs["Bucket"] = self.bucket
+            return operation(**kwargs)
+        return call
+
+def replica(s3_client, ocean: str) -> ferry.Sea:
+    s3_client.create_bucket(Bucket=f"ports-{ocean}")
+    return ferry.Sea(ocean, f"yard-{ocean}", OtherSpaces(s3_client, f"ports-{ocean}"))
+
+def keys(s3_client, bucket: str) -> list[str]:
+    return sorted(stored_object["Key"] for stored_object in s3_client.list_objects_v2(Bucket=bucket).get("Contents", []))
+
+def test_manifest_changes_copy_the_cargo_they_add_first(s3_client, new_port):
+    # stored before the port had a replica
+    cargo_id = new_port().store_cargo(io.BytesIO(b"cargo"), io.BytesIO(b"true\n"))
+    ams3 = replica(s3_client, "ams3")
+
+    assert new_port([ams3]).append_cargo("web", [cargo_id, "never-stored"]) == [cargo_id, "never-stored"]
+
+    assert keys(s3_client, "ports-ams3") == keys(s3_client, "ports")
+    manifest = s3_client.get_object(Bucket="ports-ams3", Key="harbor/cargo_manifests/web/manifest.json")
+    assert manifest["Body"].read() == b'["%s", "never-stored"]' % cargo_id.encode()
+
+def test_manifest_isnt_copied_to_a_replica_missing_its_cargo(s3_client, new_port):
+    cargo_id = new_port().store_cargo(io.BytesIO(b"cargo"), io.BytesIO(b"true\n"))
+    unreachable = ferry.Sea("lon1", "yard-lon1", OtherSpaces(s3_client, "missing"))
+
+    with pytest.raises(ferry.ReplicationFailed) as exc_info:
+        new_port([unreachable]).append_cargo("web", [cargo_id])
+
+    # the manifest is written at home, the caller still learns what it lists
+    assert exc_info.value.result == [cargo_id]
+    assert "harbor/cargo_manifests/web/manifest.json" in keys(s3_client, "ports")
+
+class RecordingSpaces(OtherSpaces):
+    def __init__(self, s3_client, bucket: str):
+        super().__init__(s3_client, bucket)
+        self.copy_sources = []
+
+    def __getattr__(self, name: str):
+        if name == "copy_object":
+            def copy_object(**kwargs):
+                self.copy_sources.append(kwargs["CopySource"])
+                return super(RecordingSpaces, self).__getattr__(name)(**kwargs)
+            return copy_object
+        return super().__getattr__(name)
+
+def test_stored_cargo_is_copied_to_every_replica(s3_client, new_port):
+    ams3 = replica(s3_client, "ams3")
+    s3_client.create_bucket(Bucket="ports-nyc3")
+    # a second Spaces in the port's own ocean copies server side, from the port's sea
+    nyc3 = ferry.Sea("nyc3", "yard-nyc3", RecordingSpaces(s3_client, "ports-nyc3"))
+    harbor = new_port([ams3, nyc3])
+    random_cargo = bytes(range(256)) * 4096
+
+    harbor.store_cargo(io.BytesIO(b"x" * 100000), io.BytesIO(b"true\n"))
+    chunked = harbor.store_cargo(io.BytesIO(random_cargo), io.BytesIO(b"true\n"), chunked=True)
+
+    assert keys(s3_client, "ports") == keys(s3_client, "ports-ams3") == keys(s3_client, "ports-nyc3")
+    # moto has no "yard" bucket, the first copies fail and the rest are streamed
+    copy_sources = nyc3.s3_client.copy_sources
+    assert copy_sources
+    assert all(copy_source["Bucket"] == "yard" and copy_source["Key"].startswith("ports/harbor/container_yard/")
+               for copy_source in copy_sources)
+    head = s3_client.head_object(Bucket="ports-ams3", Key=f"harbor/container_yard/{chunked}/chunk_index.json")
+    assert head["ContentType"] == s3_client.head_object(Bucket="ports", Key=f"harbor/container_yard/{chunked}/chunk_index.json")["ContentType"]
+
+def test_replica_that_fails_doesnt_stop_the_others(s3_client, new_port):
+    ams3 = replica(s3_client, "ams3")
+    unreachable = ferry.Sea("lon1", "yard-lon1", OtherSpaces(s3_client, "missing"))
+
+    with pytest.raises(ferry.ReplicationFailed) as exc_info:
+        new_port([unreachable, ams3]).store_cargo(io.BytesIO(b"cargo"), io.BytesIO(b"true\n"))
+
+    cargo_id = exc_info.value.result
+    assert f"harbor/container_yard/{cargo_id}/pad_lock_key.sh" in keys(s3_client, "ports-ams3")
+    assert "While replicating to yard-lon1.lon1" in exc_info.value.exceptions[0].__notes__
+
+def test_replicas_are_stored_with_the_port_and_collected_from(harbor):
+    harbor.s3_client.create_bucket(Bucket="ports-ams3")
+    replica_s3_clients = {"ams3": OtherSpaces(harbor.s3_client, "ports-ams3")}
+    harbor.new_port(replicas=[{"ocean": "ams3", "sea": "yard-ams3"}], replica_s3_clients=replica_s3_clients)
+
+    # the CLIs don't name replicas, they get the deployed ones
+    cli_port = harbor.new_port(replica_s3_clients=replica_s3_clients)
+    assert [(sea.ocean, sea.sea) for sea in cli_port.replicas] == [("ams3", "yard-ams3")]
+    cargo_id = cli_port.store_cargo(io.BytesIO(b"cargo"), io.BytesIO(b"true\n"))
+    assert f"bench/container_yard/{cargo_id}/pad_lock_key.sh" in keys(harbor.s3_client, "ports-ams3")
+
+    collection = cli_port.collect_garbage(grace_period=0, keep_last=0)
+
+    assert collection["cargo_ids"] == [cargo_id]
+    assert not [key for key in keys(harbor.s3_client, "ports-ams3") if cargo_id in key]
+
+    # deploying without replicas stops copying to them
+    assert harbor.new_port(replicas=[]).replicas == []
+    assert harbor.new_port().replicas == []
@@ -0,0 +1,128 @@
+import time
+
+import pytest
+from azure.core.exceptions import HttpResponseError
+
+import benchmark
+from port.governor import GovernedClient, TokenBucket
+
+
+class FlakyDigitalOcean(benchmark.FakeDigitalOcean):
+    """
+    Fake DigitalOcean answering the first requests with the given status codes
+    """
+    def __init__(self, failures: list[int], retry_after: str="0", **kwargs):
+        super().__init__(latency=0, **kwargs)
+        self.failures = list(failures)
+        self.retry_after = retry_after
+
+    def request(self, operation: str) -> dict:
+        if self.failures:
+            status_code = self.failures.pop(0)
+            if status_code == 429:
+                self.throttled += 1
+            raise HttpResponseError(response=benchmark._FakeHttpResponse(status_code, {"retry-after": self.retry_after}))
+        return super().request(operation)
+
+class LostResponseOperationGroup(benchmark._FakeOperationGroup):
+    """
+    Creates the resource, then fails the response like a 5xx from a proxy would
+    """
+    def __init__(self, *args, lost_responses: int=1):
+        super().__init__(*args)
+        self.lost_responses = lost_responses
+
+    def create(self, body: dict, cls=None):
+        created = super().create(body, cls)
+        if self.lost_responses:
+            self.lost_responses -= 1
+            raise HttpResponseError(response=benchmark._FakeHttpResponse(503, {}))
+        return created
+
+def governed(digital_ocean, **kwargs) -> GovernedClient:
+    return GovernedClient(digital_ocean, requests_per_minute=60000, backoff_base=0.001, **kwargs)
+
+def test_429_is_retried_and_slows_the_bucket_down():
+    digital_ocean = FlakyDigitalOcean([429, 429])
+    client = governed(digital_ocean)
+
+    res = client.droplets.list()
+
+    assert res["droplets"] == []
+    assert digital_ocean.throttled == 2
+    assert digital_ocean.calls == {"droplets.list": 1}
+    assert client._bucket.rate == pytest.approx(client._bucket.max_rate / 4, rel=0.1)
+
+def test_429_retry_after_pauses_every_thread():
+    digital_ocean = FlakyDigitalOcean([429], retry_after="1")
+    client = governed(digital_ocean)
+
+    started_at = time.monotonic()
+    client.droplets.list()
+
+    assert time.monotonic() - started_at >= 1
+    assert client._bucket.paused_until >= started_at + 1
+
+def test_non_retryable_errors_are_raised_at_once():
+    digital_ocean = FlakyDigitalOcean([404])
+    client = governed(digital_ocean)
+
+    with pytest.raises(HttpResponseError):
+        client.droplets.list()
+    assert digital_ocean.failures == []
+    assert digital_ocean.calls == {}
+
+def test_retries_give_up_after_max_retries():
+    digital_ocean = FlakyDigitalOcean([503] * 3)
+    client = governed(digital_ocean, max_retries=2)
+
+    with pytest.raises(HttpResponseError):
+        client.droplets.list()
+    assert digital_ocean.calls == {}
+
+def test_bucket_slows_down_to_min_rate_and_recovers():
+    bucket = TokenBucket(rate=100, capacity=10)
+
+    for _ in range(10):
+        bucket.slow_down()
+    assert bucket.rate == bucket.min_rate == 100 / 16
+
+    for _ in range(100):
+        bucket.speed_up()
+    assert bucket.rate == bucket.max_rate == 100
+
+def test_bucket_pauses_when_the_quota_is_used_up():
+    bucket = TokenBucket(rate=100, capacity=10)
+
+    bucket.observe(remaining=0, reset_at=time.time() + 0.2)
+    started_at = time.monotonic()
+    bucket.acquire()
+
+    assert time.monotonic() - started_at >= 0.15
+
+def test_create_retry_finds_the_resource_a_lost_response_created():
+    digital_ocean = benchmark.FakeDigitalOcean(latency=0)
+    digital_ocean.droplets = LostResponseOperationGroup(digital_ocean, "droplets", "droplets", "droplet")
+    client = governed(digital_ocean)
+
+    res = client.droplets.create(body={"name": "ship-1", "size": "s-1vcpu-1gb"})
+
+    assert len(digital_ocean.droplets.resources) == 1
+    assert res["droplet"]["id"] == digital_ocean.droplets.resources[0]["id"]
+    assert digital_ocean.calls == {"droplets.create": 1, "droplets.list": 1}
+
+def test_create_retry_after_429_creates_once():
+    digital_ocean = FlakyDigitalOcean([429])
+    client = governed(digital_ocean)
+
+    client.droplets.create(body={"name": "ship-1", "size": "s-1vcpu-1gb"})
+
+    # a 429 never reached the API, so there is nothing to look up before retrying
+    assert len(digital_ocean.droplets.resources) == 1
+    assert digital_ocean.calls == {"droplets.create": 1}
+
+def test_create_without_a_name_is_retried_without_a_lookup():
+    client = governed(benchmark.FakeDigitalOcean(latency=0))
+
+    assert client._find_created("droplets", {"size": "s-1vcpu-1gb"}) is None
+    assert client._find_created("tags", {"name": "port:web"}) is None
@@ -0,0 +1,95 @@
+import json
+
+import pytest
+from botocore.exceptions import ClientError
+
+import port
+
+
+MANIFEST_KEY = "harbor/cargo_manifests/web/manifest.json"
+
+class RecordingSpaces():
+    """
+    S3 client recording the error code (None when it succeeded) of every
+    get_object and put_object
+    """
+    def __init__(self, s3_client):
+        self.s3_client = s3_client
+        self.calls = []
+
+    def __getattr__(self, name: str):
+        operation = getattr(self.s3_client, name)
+        if name not in ("get_object", "put_object"):
+            return operation
+
+        def call(**kwargs):
+            try:
+                res = operation(**kwargs)
+            except ClientError as e:
+                self.calls.append((name, e.response["Error"]["Code"]))
+                raise
+            self.calls.append((name, None))
+            return res
+        return call
+
+def write_elsewhere(s3_client, cargo_ids: list[str]):
+    # another machine, its write doesn't go through this process' manifest cache
+    s3_client.put_object(Bucket="ports", Key=MANIFEST_KEY, Body=json.dumps(cargo_ids))
+
+def stored_manifest(s3_client) -> list[str]:
+    return json.load(s3_client.get_object(Bucket="ports", Key=MANIFEST_KEY)["Body"])
+
+@pytest.mark.parametrize("before", [None, ["old"]], ids=["new manifest", "existing manifest"])
+def test_a_write_in_between_is_kept_and_modify_applied_again(s3_client, new_port, delays, before):
+    harbor = new_port()
+    if before is not None:
+        harbor.update_cargo_mainfest("web", before)
+    read = []
+    def modify(cargo_ids: list[str]) -> list[str]:
+        read.append(cargo_ids)
+        if len(read) == 1:
+            write_elsewhere(s3_client, (before or []) + ["theirs"])
+        return cargo_ids + ["ours"]
+
+    assert harbor.modify_cargo_manifest("web", modify) == (before or []) + ["theirs", "ours"]
+    assert read == [before or [], (before or []) + ["theirs"]]
+    assert len(delays) == 1
+    assert stored_manifest(s3_client) == (before or []) + ["theirs", "ours"]
+    assert harbor.get_cargo_manifest("web") == (before or []) + ["theirs", "ours"]
+
+def test_conflicts_past_the_retries_are_raised(s3_client, new_port, delays):
+    harbor = new_port()
+    harbor.update_cargo_mainfest("web", ["old"])
+    def modify(cargo_ids: list[str]) -> list[str]:
+        write_elsewhere(s3_client, cargo_ids + ["theirs"])
+        return cargo_ids + ["ours"]
+
+    with pytest.raises(ClientError) as exc_info:
+        harbor.modify_cargo_manifest("web", modify, conflict_retries=2)
+
+    assert exc_info.value.response["Error"]["Code"] == "PreconditionFailed"
+    assert len(delays) == 2
+    assert "ours" not in stored_manifest(s3_client)
+
+def test_unchanged_manifests_are_served_from_the_cache(s3_client, new_port):
+    new_port().update_cargo_mainfest("web", ["cargo"])
+    recording_spaces = RecordingSpaces(s3_client)
+    harbor = new_port()
+    harbor.s3_client = recording_spaces
+
+    assert harbor.get_cargo_manifest("web") == ["cargo"]
+    assert recording_spaces.calls == [("get_object", "304")]
+
+    write_elsewhere(s3_client, ["cargo", "newer"])
+    assert harbor.get_cargo_manifest("web") == ["cargo", "newer"]
+    assert harbor.get_cargo_manifest("web") == ["cargo", "newer"]
+    assert recording_spaces.calls == [("get_object", "304"), ("get_object", None), ("get_object", "304")]
+
+def test_deleted_manifests_drop_out_of_the_cache(s3_client, new_port):
+    harbor = new_port()
+    harbor.update_cargo_mainfest("web", ["cargo"])
+    s3_client.delete_object(Bucket="ports", Key=MANIFEST_KEY)
+
+    with pytest.raises(LookupError):
+        harbor.get_cargo_manifest("web")
+    assert harbor.append_cargo("web", ["new"]) == ["new"]
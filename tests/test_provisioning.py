@@ -0,0 +1,64 @@
+import time
+
+import pytest
+
+import benchmark
+
+
+def port_org(port_name: str, fleets: int) -> dict:
+    port_org = benchmark._e2e_port_org(fleets)
+    port_org["port_name"] = port_name
+    return port_org
+
+def timed_deploy(harbor, port_org: dict, **kwargs) -> float:
+    started_at = time.monotonic()
+    harbor.new_port(port_org, **kwargs)
+    return time.monotonic() - started_at
+
+def test_fleets_are_provisioned_at_once(harbor):
+    harbor.digital_ocean.latency = 0.05
+    # the first deploy also builds the marine radio
+    harbor.new_port(port_org("warm", 1))
+
+    one_fleet = timed_deploy(harbor, port_org("one", 1))
+    four_fleets = timed_deploy(harbor, port_org("four", 4))
+    four_fleets_in_turn = timed_deploy(harbor, port_org("turns", 4), fleet_concurrency=1)
+
+    assert four_fleets < 4 * one_fleet
+    assert four_fleets < four_fleets_in_turn
+    assert len(harbor.digital_ocean.autoscalepools.resources) == 10
+
+def test_fleet_errors_are_collected_and_other_fleets_provisioned(harbor):
+    from azure.core.exceptions import HttpResponseError
+
+    create = harbor.digital_ocean.autoscalepools.create
+    def create_unless_odd_fleet(body: dict, cls=None):
+        if body["name"][-1] in "13":
+            raise HttpResponseError(response=benchmark._FakeHttpResponse(422, {}))
+        return create(body, cls=cls)
+    harbor.digital_ocean.autoscalepools.create = create_unless_odd_fleet
+
+    with pytest.raises(ExceptionGroup) as exc_info:
+        harbor.new_port(port_org("bench", 4))
+
+    assert sorted(e.__notes__[-1] for e in exc_info.value.exceptions) == [
+        "While applying fleet fleet1: + autoscale_pools bench-fleet1",
+        "While applying fleet fleet3: + autoscale_pools bench-fleet3",
+    ]
+    assert sorted(pool["name"] for pool in harbor.digital_ocean.autoscalepools.resources) == ["bench-fleet0", "bench-fleet2"]
+    assert len(harbor.digital_ocean.load_balancers.resources) == 4
+
+def test_each_fleet_reports_its_time(harbor, capsys):
+    harbor.digital_ocean.latency = 0.05
+
+    plan = harbor.new_port(port_org("bench", 2)).plan
+
+    fleet_timings = plan.fleet_timings()
+    assert sorted(fleet_timings) == ["fleet0", "fleet1"]
+    # a fleet's pool and load balancer go up at the same time
+    for fleet_name, seconds in fleet_timings.items():
+        fleet_keys = [change.key for change in plan.changes if change.fleet_name == fleet_name]
+        assert max(plan.timings[key] for key in fleet_keys) <= seconds < sum(plan.timings[key] for key in fleet_keys)
+    out = capsys.readouterr().out
+    assert f"fleet fleet0: done in {fleet_timings['fleet0']:.2f}s" in out
+    assert f"fleet fleet1: done in {fleet_timings['fleet1']:.2f}s" in out
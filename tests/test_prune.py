@@ -0,0 +1,34 @@
+import benchmark
+
+
+def port_org(port_name: str, fleet_names: list[str]) -> dict:
+    fleet_org = benchmark._e2e_port_org(1)["fleets"]["fleet0"]
+    return {
+        "ocean": "nyc3",
+        "sea": "bench",
+        "port_name": port_name,
+        "cargo_manifests": {"web": "$CARGO_IDS"},
+        "fleets": {fleet_name: dict(fleet_org) for fleet_name in fleet_names},
+    }
+
+def test_prune_leaves_other_ports_resources_with_matching_names(harbor):
+    digital_ocean = harbor.digital_ocean
+    # port web's fleet api-x and port web-api's fleet x are both web-api-x
+    harbor.new_port(port_org("web-api", ["x"]))
+
+    harbor.new_port(port_org("web", ["www"]), prune=True)
+
+    pool_names = sorted(pool["name"] for pool in digital_ocean.autoscalepools.resources)
+    load_balancer_names = sorted(load_balancer["name"] for load_balancer in digital_ocean.load_balancers.resources)
+    assert pool_names == load_balancer_names == ["web-api-x", "web-www"]
+    assert [pool["droplet_template"]["tags"] for pool in digital_ocean.autoscalepools.resources
+            if pool["name"] == "web-api-x"] == [["web-api-x", "port:web-api"]]
+
+def test_prune_deletes_removed_fleets(harbor):
+    digital_ocean = harbor.digital_ocean
+    harbor.new_port(port_org("web", ["api", "www"]))
+
+    harbor.new_port(port_org("web", ["www"]), prune=True)
+
+    assert [pool["name"] for pool in digital_ocean.autoscalepools.resources] == ["web-www"]
+    assert [load_balancer["name"] for load_balancer in digital_ocean.load_balancers.resources] == ["web-www"]
@@ -0,0 +1,40 @@
+import benchmark
+
+
+def port_org(reinforcement_strategy: str) -> dict:
+    port_org = benchmark._e2e_port_org(1)
+    port_org["fleets"]["fleet0"]["reinforcement_strategy"] = reinforcement_strategy
+    return port_org
+
+def pool_config(harbor) -> dict:
+    return harbor.digital_ocean.autoscalepools.resources[0]["config"]
+
+def test_switching_reinforcement_strategy_updates_the_pool(harbor):
+    harbor.new_port(port_org("cpu:0.6"))
+
+    plan = harbor.new_port(port_org("memory:0.8"), plan_only=True).plan
+
+    [change] = plan.changes
+    assert (change.action, change.resource_type) == ("update", "autoscale_pools")
+    assert change.differences == {
+        "config.target_cpu_utilization": (0.6, None),
+        "config.target_memory_utilization": (None, 0.8),
+    }
+
+    harbor.new_port(port_org("memory:0.8"))
+    assert "target_cpu_utilization" not in pool_config(harbor)
+    assert pool_config(harbor)["target_memory_utilization"] == 0.8
+    assert not harbor.new_port(port_org("memory:0.8"), plan_only=True).plan
+
+def test_adding_a_second_target_updates_the_pool(harbor):
+    harbor.new_port(port_org("cpu:0.6"))
+
+    plan = harbor.new_port(port_org("cpu:0.6,memory:0.8"), plan_only=True).plan
+
+    [change] = plan.changes
+    assert change.differences == {"config.target_memory_utilization": (None, 0.8)}
+
+def test_unchanged_strategy_plans_nothing(harbor):
+    harbor.new_port(port_org("cpu:0.6,memory:0.8"))
+
+    assert not harbor.new_port(port_org("cpu:0.6,memory:0.8"), plan_only=True).plan
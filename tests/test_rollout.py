@@ -0,0 +1,138 @@
+import threading
+import time
+import types
+
+import pytest
+
+from port import cargo_loader, rollout
+
+
+HEALTH_CHECK_COMMAND = "curl -fsS http://127.0.0.1:8080/health"
+
+class FakeExecutor():
+    """
+    Records the commands run on ships, commands fail on the addresses in fail
+    """
+    def __init__(self, fail: dict=None):
+        self.fail = fail or {}
+        self.runs = []
+        self.lock = threading.Lock()
+
+    def run(self, address: str, command: str, input: str=None) -> str:
+        with self.lock:
+            self.runs.append((time.monotonic(), address, command, input))
+        if any(failing in command for failing in self.fail.get(address, [])):
+            raise RuntimeError(f"{command!r} on {address} exited with 1")
+        return ""
+
+    def commands(self, address: str) -> list[str]:
+        return [command for _, run_address, command, _ in self.runs if run_address == address]
+
+    def addresses(self) -> list[str]:
+        return list(dict.fromkeys(address for _, address, _, _ in self.runs))
+
+def ship(name: str, address: str) -> dict:
+    return {"name": name, "networks": {"v4": [{"type": "private", "ip_address": "10.0.0.1"},
+                                             {"type": "public", "ip_address": address}]}}
+
+SHIPS = [ship("web-d", "192.0.2.4"), ship("web-b", "192.0.2.2"), ship("web-a", "192.0.2.1"), ship("web-c", "192.0.2.3")]
+
+def fleet_rollout(executor: FakeExecutor, **kwargs) -> rollout.Rollout:
+    kwargs = {"health_check_command": HEALTH_CHECK_COMMAND,
+              "drain_seconds": 0,
+              "health_timeout": 0.2,
+              "health_poll_seconds": 0.01,
+              "rejoin_seconds": 0,
+              **kwargs}
+    return rollout.Rollout(executor, "#!/bin/sh\necho loading\n", 8086, **kwargs)
+
+def test_ship_steps_run_in_order():
+    executor = FakeExecutor()
+
+    fleet_rollout(executor).roll([ship("web-a", "192.0.2.1")])
+
+    loader_path = cargo_loader.CARGO_LOADER_SCRIPT_PATH
+    assert executor.commands("192.0.2.1") == [
+        rollout.PAN_PAN_COMMAND,
+        f"cat > {loader_path} && chmod 0755 {loader_path} && {loader_path}",
+        rollout.RESTART_COMMAND,
+        HEALTH_CHECK_COMMAND,
+        rollout.ALL_CLEAR_COMMAND,
+        rollout.MARINE_RADIO_CHECK_COMMAND_FORMAT.format(frequency=8086),
+    ]
+    assert executor.runs[1][3] == "#!/bin/sh\necho loading\n"
+
+def test_batches_roll_one_after_another_in_name_order():
+    executor = FakeExecutor()
+
+    fleet_rollout(executor, batch_size=2).roll(SHIPS)
+
+    assert executor.addresses()[:2] in (["192.0.2.1", "192.0.2.2"], ["192.0.2.2", "192.0.2.1"])
+    first_batch_done_at = max(run_at for run_at, address, _, _ in executor.runs if address in ("192.0.2.1", "192.0.2.2"))
+    second_batch_started_at = min(run_at for run_at, address, _, _ in executor.runs if address in ("192.0.2.3", "192.0.2.4"))
+    assert first_batch_done_at < second_batch_started_at
+
+def test_next_batch_waits_for_the_load_balancer_to_take_ships_back():
+    executor = FakeExecutor()
+
+    fleet_rollout(executor, rejoin_seconds=0.3).roll(SHIPS[1:3])
+
+    radio_checked_at = [run_at for run_at, address, command, _ in executor.runs
+                        if address == "192.0.2.1" and command.startswith("curl") and "8086" in command][-1]
+    next_drained_at = [run_at for run_at, address, command, _ in executor.runs
+                       if address == "192.0.2.2" and command == rollout.PAN_PAN_COMMAND][0]
+    assert next_drained_at - radio_checked_at >= 0.3
+
+def test_unhealthy_ship_halts_the_rollout_and_stays_drained(capsys):
+    executor = FakeExecutor(fail={"192.0.2.1": [HEALTH_CHECK_COMMAND]})
+
+    with pytest.raises(ExceptionGroup) as exc_info:
+        fleet_rollout(executor).roll(SHIPS)
+
+    assert [type(e) for e in exc_info.value.exceptions] == [TimeoutError]
+    assert rollout.ALL_CLEAR_COMMAND not in executor.commands("192.0.2.1")
+    assert executor.addresses() == ["192.0.2.1"]
+    assert "ship web-a: failed" in capsys.readouterr().out
+
+def test_failed_batch_halts_later_batches(capsys):
+    executor = FakeExecutor(fail={"192.0.2.2": ["chmod"]})
+
+    with pytest.raises(ExceptionGroup) as exc_info:
+        fleet_rollout(executor, batch_size=2).roll(SHIPS)
+
+    assert len(exc_info.value.exceptions) == 1
+    assert "web-b" in exc_info.value.exceptions[0].__notes__[0]
+    # the rest of the failed batch finishes, nothing after it starts
+    assert rollout.ALL_CLEAR_COMMAND in executor.commands("192.0.2.1")
+    assert sorted(executor.addresses()) == ["192.0.2.1", "192.0.2.2"]
+    out = capsys.readouterr().out
+    assert "ship web-c: skipped" in out and "ship web-d: skipped" in out
+
+def test_ship_without_a_public_address_fails():
+    executor = FakeExecutor()
+
+    with pytest.raises(ExceptionGroup) as exc_info:
+        fleet_rollout(executor).roll([{"name": "web-a", "networks": {"v4": []}}])
+
+    assert [type(e) for e in exc_info.value.exceptions] == [LookupError]
+    assert executor.runs == []
+
+def test_fleet_rolls_its_own_ships_and_waits_out_the_load_balancer_health_check(harbor, monkeypatch):
+    fleet = harbor.new_port().fleets["fleet0"]
+    harbor.digital_ocean.droplets.resources = [
+        {**ship("bench-fleet0-b", "192.0.2.2"), "id": "2", "tags": [fleet.fleet_call_sign]},
+        {**ship("bench-fleet0-a", "192.0.2.1"), "id": "1", "tags": [fleet.fleet_call_sign]},
+        {**ship("bench-other-a", "192.0.2.9"), "id": "9", "tags": ["bench-other"]},
+    ]
+    sleeps = []
+    monkeypatch.setattr(rollout, "time", types.SimpleNamespace(monotonic=time.monotonic, sleep=sleeps.append))
+    executor = FakeExecutor()
+
+    fleet.roll_out(executor=executor, drain_seconds=1)
+
+    assert executor.addresses() == ["192.0.2.1", "192.0.2.2"]
+    loader_script = executor.runs[1][3]
+    assert all(cargo_id in loader_script for cargo_id in fleet.cargo_ids())
+    health_check = fleet.load_balancer_body()["health_check"]
+    rejoin_seconds = health_check["healthy_threshold"] * health_check["check_interval_seconds"]
+    assert sleeps == [1, rejoin_seconds] * 2
@@ -0,0 +1,54 @@
+import io
+
+import pytest
+
+import port
+from port import utils
+
+
+def stored_cargo_ids(harbor, port_name: str="bench") -> set[str]:
+    cargo, _ = port.scrapyard.survey_yard(harbor.s3_client, "ports", f"{port_name}/container_yard")
+    return set(cargo)
+
+@pytest.fixture
+def yard_port(harbor, monkeypatch):
+    bench_port = harbor.new_port()
+    # gc never builds the marine radio
+    def build_static_go_binary(*args, **kwargs):
+        raise AssertionError("gc built the marine radio")
+    monkeypatch.setattr(utils, "build_static_go_binary", build_static_go_binary)
+    return bench_port
+
+def test_gc_keeps_the_marine_radio_pools_load_even_if_built_elsewhere(harbor, yard_port):
+    deployed_radio = yard_port.marine_radio_cargo_id
+    # another runner (another go version) built and deployed a different radio
+    other_radio = yard_port.store_cargo(io.BytesIO(b"other marine radio"), io.BytesIO(b"true\n"), content_addressed=True)
+    pool = harbor.digital_ocean.autoscalepools.resources[0]
+    pool["droplet_template"]["user_data"] = pool["droplet_template"]["user_data"].replace(deployed_radio, other_radio)
+    unreferenced = yard_port.store_cargo(io.BytesIO(b"unreferenced"), io.BytesIO(b"true\n"))
+
+    collection = yard_port.collect_garbage(grace_period=0, keep_last=0)
+
+    assert sorted(collection["cargo_ids"]) == sorted([deployed_radio, unreferenced])
+    assert stored_cargo_ids(harbor) == {other_radio}
+
+def test_gc_ignores_other_ports_pools(harbor, yard_port):
+    cargo_id = yard_port.store_cargo(io.BytesIO(b"cargo"), io.BytesIO(b"true\n"))
+    harbor.digital_ocean.autoscalepools.resources.append(
+        {"id": "other", "name": "other-web", "droplet_template": {"tags": ["port:other"], "user_data": cargo_id}}
+    )
+
+    collection = yard_port.collect_garbage(grace_period=0, keep_last=0)
+
+    assert cargo_id in collection["cargo_ids"]
+
+def test_gc_keeps_manifest_cargo_and_dry_runs_delete_nothing(harbor, yard_port):
+    listed = yard_port.store_cargo(io.BytesIO(b"listed"), io.BytesIO(b"true\n"))
+    unreferenced = yard_port.store_cargo(io.BytesIO(b"unreferenced"), io.BytesIO(b"true\n"))
+    yard_port.append_cargo("web", [listed])
+    stored = stored_cargo_ids(harbor)
+
+    collection = yard_port.collect_garbage(grace_period=0, keep_last=0, dry_run=True)
+
+    assert collection["cargo_ids"] == [unreferenced]
+    assert stored_cargo_ids(harbor) == stored
@@ -0,0 +1,118 @@
+import itertools
+
+import pytest
+
+import benchmark
+from port import shipyard
+
+
+class FakeDroplets(benchmark._FakeOperationGroup):
+    def get(self, droplet_id: str, cls=None):
+        headers = self._request("get")
+        droplet = next(droplet for droplet in self.resources if droplet["id"] == droplet_id)
+        return self._respond(headers, {"droplet": {**droplet, "status": self.digital_ocean.builder_status}}, cls)
+
+    def destroy(self, droplet_id: str, cls=None):
+        headers = self._request("destroy")
+        self.resources = [droplet for droplet in self.resources if droplet["id"] != droplet_id]
+        return self._respond(headers, None, cls)
+
+class FakeDropletActions(benchmark._FakeOperationGroup):
+    def post(self, droplet_id: str, body: dict, cls=None):
+        headers = self._request("post")
+        action_id = next(self.digital_ocean.ids)
+        # snapshot images have numeric ids
+        self.digital_ocean.snapshots.resources.append({"id": str(next(self.digital_ocean.ids)), "name": body["name"], "tags": []})
+        return self._respond(headers, {"action": {"id": action_id, "status": "in-progress"}}, cls)
+
+    def get(self, droplet_id: str, action_id: int, cls=None):
+        headers = self._request("get")
+        return self._respond(headers, {"action": {"id": action_id, "status": "completed"}}, cls)
+
+class FakeTags(benchmark._FakeOperationGroup):
+    def assign_resources(self, tag_id: str, body: dict, cls=None):
+        for assigned in body["resources"]:
+            for snapshot in self.digital_ocean.snapshots.resources:
+                if assigned["resource_type"] == "image" and snapshot["id"] == assigned["resource_id"]:
+                    snapshot["tags"].append(tag_id)
+        return super().assign_resources(tag_id, body, cls)
+
+@pytest.fixture
+def shipyard_harbor(harbor):
+    digital_ocean = harbor.digital_ocean
+    digital_ocean.builder_status = "off"
+    digital_ocean.ids = itertools.count(1000)
+    digital_ocean.droplets = FakeDroplets(digital_ocean, "droplets", "droplets", "droplet")
+    digital_ocean.droplet_actions = FakeDropletActions(digital_ocean, "droplet_actions", "actions", "action")
+    digital_ocean.tags = FakeTags(digital_ocean, "tags", "tags", "tag")
+    return harbor
+
+def baked_port_org(crew: str="ubuntu-24-04-x64") -> dict:
+    port_org = benchmark._e2e_port_org(1)
+    port_org["fleets"]["fleet0"].update(bake=True, crew=crew)
+    return port_org
+
+def test_bake_key_only_changes_with_what_is_baked(shipyard_harbor):
+    baked_port = shipyard_harbor.new_port(baked_port_org())
+    snapshot_name = baked_port.fleets["fleet0"].snapshot_name
+
+    assert snapshot_name.startswith("bench-fleet0-")
+    assert shipyard_harbor.new_port(baked_port_org(), plan_only=True).fleets["fleet0"].snapshot_name == snapshot_name
+    assert shipyard_harbor.new_port(baked_port_org(crew="debian-12-x64"), plan_only=True).fleets["fleet0"].snapshot_name != snapshot_name
+    baked_port.append_cargo("web", ["cargo-1"])
+    assert shipyard_harbor.new_port(baked_port_org(), plan_only=True).fleets["fleet0"].snapshot_name != snapshot_name
+
+def test_snapshot_is_baked_before_the_pool_boots_from_it(shipyard_harbor):
+    digital_ocean = shipyard_harbor.digital_ocean
+
+    fleet = shipyard_harbor.new_port(baked_port_org()).fleets["fleet0"]
+
+    snapshots = digital_ocean.snapshots.resources
+    assert [(snapshot["name"], snapshot["tags"]) for snapshot in snapshots] == [(fleet.snapshot_name, ["port:bench"])]
+    pool = digital_ocean.autoscalepools.resources[0]
+    assert pool["droplet_template"]["image"] == int(snapshots[0]["id"])
+    # the builder is gone once the snapshot is taken
+    assert digital_ocean.droplets.resources == []
+    assert digital_ocean.calls["droplets.destroy"] == 1
+    operations = list(digital_ocean.calls)
+    assert operations.index("droplet_actions.post") < operations.index("tags.assign_resources") < operations.index("autoscalepools.create")
+
+def test_snapshot_is_planned_before_the_pool(shipyard_harbor):
+    plan = shipyard_harbor.new_port(baked_port_org(), plan_only=True).plan
+
+    snapshot_change = next(change for change in plan.changes if change.resource_type == "snapshots")
+    pool_change = next(change for change in plan.changes if change.resource_type == "autoscale_pools")
+    assert snapshot_change.action == pool_change.action == "create"
+    assert pool_change.depends_on == [snapshot_change.key]
+
+def test_builder_is_destroyed_when_baking_times_out(shipyard_harbor):
+    digital_ocean = shipyard_harbor.digital_ocean
+    digital_ocean.builder_status = "active"
+
+    with pytest.raises(TimeoutError):
+        shipyard.bake_snapshot(digital_ocean, {"name": "bench-fleet0-builder"}, "bench-fleet0-0123456789abcdef",
+                               timeout=0.05, poll_seconds=0.01)
+
+    assert digital_ocean.droplets.resources == []
+    assert digital_ocean.snapshots.resources == []
+
+def test_prune_deletes_only_superseded_snapshots_of_the_port(shipyard_harbor):
+    digital_ocean = shipyard_harbor.digital_ocean
+    old_port = shipyard_harbor.new_port(baked_port_org())
+    old_snapshot_name = old_port.fleets["fleet0"].snapshot_name
+    other_snapshots = [
+        # another port's bake, same naming scheme
+        {"id": "1", "name": "bench-fleet0-aaaaaaaaaaaaaaaa", "tags": ["port:bench-fleet0"]},
+        # not a bake
+        {"id": "2", "name": "bench-golden", "tags": ["port:bench"]},
+    ]
+    digital_ocean.snapshots.resources += other_snapshots
+
+    old_port.append_cargo("web", ["cargo-1"])
+    fleet = shipyard_harbor.new_port(baked_port_org(), prune=True).fleets["fleet0"]
+
+    snapshot_names = [snapshot["name"] for snapshot in digital_ocean.snapshots.resources]
+    assert old_snapshot_name not in snapshot_names
+    assert sorted(snapshot_names) == sorted([fleet.snapshot_name] + [snapshot["name"] for snapshot in other_snapshots])
+    new_snapshot = next(snapshot for snapshot in digital_ocean.snapshots.resources if snapshot["name"] == fleet.snapshot_name)
+    assert digital_ocean.autoscalepools.resources[0]["droplet_template"]["image"] == int(new_snapshot["id"])